@@ -0,0 +1,53 @@
+# backend/chat/access.py - Room access rights and their invalidation
+
+import logging
+from collections import namedtuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .models import ChatRoom, TeamMembership
+
+logger = logging.getLogger(__name__)
+
+RoomRights = namedtuple('RoomRights', ['room_id', 'room_type', 'team_id', 'can_access', 'can_post'])
+
+
+def user_group_name(user_id):
+    """Channel-layer group every chat connection of a user joins"""
+    return f"chat_user_{user_id}"
+
+
+def resolve_room_rights(user, room_id):
+    """
+    Access and posting rights for one room in two queries.
+    Returns None when the room does not exist.
+
+    - company rooms: everyone reads; admins/staff and managers of any team post
+    - team rooms: members and admins/staff read and post
+    """
+    room = ChatRoom.objects.filter(id=room_id).values('id', 'room_type', 'team_id').first()
+    if room is None:
+        return None
+
+    is_admin = user.is_superuser or user.is_staff
+    memberships = dict(TeamMembership.objects.filter(user=user).values_list('team_id', 'role'))
+
+    if room['room_type'] == 'company':
+        can_access = True
+        can_post = is_admin or 'manager' in memberships.values()
+    else:
+        can_access = can_post = is_admin or room['team_id'] in memberships
+
+    return RoomRights(room['id'], room['room_type'], room['team_id'], can_access, can_post)
+
+
+def notify_rights_changed(user_id):
+    """Tell the user's open chat connections to drop their cached room rights"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(user_group_name(user_id), {'type': 'rights.invalidate'})
+    except Exception:
+        logger.exception("Failed to invalidate chat rights for user %s", user_id)
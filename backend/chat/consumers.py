@@ -1,14 +1,36 @@
-import json
+import uuid
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import ChatRoom, Message, TeamMembership
+from users.identity import resolve_identity
+from .access import resolve_room_rights, user_group_name
+from .models import Message
+from .persistence import message_id_for, persister, write_behind_enabled
+from .presence import ConnectionPresence, describe_online, scope_group
+from .read_markers import ReadMarkerBuffer
+from .throttling import ActionRateLimiter, TypingCoalescer
 from django.contrib.auth.models import AnonymousUser
+from django.db import IntegrityError
+from django.utils import timezone
 
 
 class ChatConsumer(AsyncJsonWebsocketConsumer):
     """
     WebSocket consumer for chat rooms.
-    Clients send JSON objects {action: 'join'|'leave'|'send_message'|'typing', payload: {...}}
+    Clients send JSON objects {action: 'join'|'leave'|'send_message'|'typing'|'mark_read'|'who_is_online', payload: {...}}
+
+    Room rights are resolved once per connection and room (on join or first
+    use) and cached in self.room_rights; TeamMembership changes arrive as a
+    'rights.invalidate' event on the user's group and clear the cache.
+
+    With CHAT_WRITE_BEHIND on, messages are broadcast before they are saved
+    and persisted in batches by chat.persistence.persister.
+
+    Every inbound action is rate limited per connection (token buckets,
+    CHAT_RATE_LIMITS), and typing events are coalesced before they reach
+    the room.
+
+    Connections are tracked in chat.presence for their company and each joined
+    room; 'presence_diff' events report who came online or went away.
     """
 
     async def connect(self):
@@ -19,11 +41,55 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         
         await self.accept()
         self.user = user
+        self.read_markers = ReadMarkerBuffer(user)
+        self.room_rights = {}
+        self.joined_rooms = set()
+        self.rate_limiter = ActionRateLimiter()
+        self.typing = TypingCoalescer(self.broadcast_typing)
+        await self.channel_layer.group_add(user_group_name(user.id), self.channel_name)
+        
+        self.presence = ConnectionPresence(user.id, self.channel_name)
+        self.presence.start()
+        self.company_scope = None
+        identity = await database_sync_to_async(resolve_identity)(user)
+        if identity is not None and identity.company_id:
+            self.company_scope = f"company:{identity.company_id}"
+            await self.channel_layer.group_add(scope_group(self.company_scope), self.channel_name)
+            await self.presence.join(self.company_scope)
+
+    async def disconnect(self, code):
+        typing = getattr(self, 'typing', None)
+        if typing is not None:
+            await typing.stop_all()
+        read_markers = getattr(self, 'read_markers', None)
+        if read_markers is not None:
+            await read_markers.flush()
+        if hasattr(self, 'user') and write_behind_enabled():
+            await persister.flush()
+        if hasattr(self, 'user'):
+            await self.presence.stop()
+            # Groups joined at runtime are not in self.groups, so drop them here
+            for room_id in self.joined_rooms:
+                await self.channel_layer.group_discard(f"chat_{room_id}", self.channel_name)
+            if self.company_scope:
+                await self.channel_layer.group_discard(scope_group(self.company_scope), self.channel_name)
+            await self.channel_layer.group_discard(user_group_name(self.user.id), self.channel_name)
 
     async def receive_json(self, content, **kwargs):
         action = content.get('action')
         payload = content.get('payload', {}) or {}
         
+        if not self.rate_limiter.allow(action):
+            # Typing is best effort; drop it quietly
+            if action != 'typing':
+                await self.send_json({
+                    'action': action,
+                    'ok': False,
+                    'error': 'rate_limited',
+                    'retry_after': round(self.rate_limiter.retry_after(action), 2)
+                })
+            return
+        
         if action == 'join':
             await self.join_room(payload.get('room_id'))
         elif action == 'leave':
@@ -32,19 +98,37 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self.handle_send_message(payload)
         elif action == 'typing':
             await self.handle_typing(payload)
+        elif action == 'mark_read':
+            await self.handle_mark_read(payload)
+        elif action == 'who_is_online':
+            await self.handle_who_is_online(payload)
         else:
             await self.send_json({'error': 'unknown_action'})
 
+    async def get_room_rights(self, room_id):
+        """Cached RoomRights for room_id, resolving on first use (None if no such room)"""
+        try:
+            key = str(uuid.UUID(str(room_id)))
+        except ValueError:
+            return None
+        
+        if key not in self.room_rights:
+            self.room_rights[key] = await database_sync_to_async(resolve_room_rights)(self.user, key)
+        return self.room_rights[key]
+
     async def join_room(self, room_id):
-        can = await database_sync_to_async(self._can_access_room)(room_id)
-        if not can:
+        rights = await self.get_room_rights(room_id)
+        if rights is None or not rights.can_access:
             await self.send_json({'action': 'join', 'ok': False, 'error': 'forbidden'})
             return
         
+        room_id = str(rights.room_id)
         self.room_id = room_id
         self.group_name = f"chat_{room_id}"
+        self.joined_rooms.add(room_id)
         
         await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.presence.join(f"chat:{room_id}")
         await self.send_json({'action': 'join', 'ok': True})
         
         await self.channel_layer.group_send(self.group_name, {
@@ -53,6 +137,10 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         })
 
     async def leave_room(self, room_id):
+        await self.read_markers.flush()
+        await self.typing.stop(str(room_id))
+        await self.presence.leave(f"chat:{room_id}")
+        self.joined_rooms.discard(str(room_id))
         group = f"chat_{room_id}"
         await self.channel_layer.group_discard(group, self.channel_name)
         await self.send_json({'action': 'leave', 'ok': True})
@@ -71,37 +159,96 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({'action': 'send_message', 'ok': False, 'error': 'empty'})
             return
         
-        can_post = await database_sync_to_async(self._can_post_to_room)(room_id)
-        if not can_post:
+        rights = await self.get_room_rights(room_id)
+        if rights is None or not rights.can_post:
             await self.send_json({'action': 'send_message', 'ok': False, 'error': 'forbidden'})
             return
         
-        msg = await database_sync_to_async(self._create_message)(room_id, self.user, content, metadata)
-        group = f"chat_{room_id}"
+        # Server-assigned id and timestamp; a client_id makes resends idempotent
+        row = {
+            'id': message_id_for(self.user.id, payload.get('client_id')),
+            'room_id': rights.room_id,
+            'sender_id': self.user.id,
+            'content': content,
+            'metadata': metadata,
+            'created_at': timezone.now(),
+        }
         
-        await self.channel_layer.group_send(group, {
+        await self.typing.stop(str(rights.room_id))
+        
+        if write_behind_enabled():
+            await self.broadcast_message(row)
+            persister.enqueue(row)
+        else:
+            row = await database_sync_to_async(self._create_message)(row)
+            await self.broadcast_message(row)
+        
+        await self.send_json({'action': 'send_message', 'ok': True, 'id': str(row['id'])})
+
+    async def broadcast_message(self, row):
+        await self.channel_layer.group_send(f"chat_{row['room_id']}", {
             'type': 'new_message',
             'message': {
-                'id': str(msg.id),
-                'room': str(msg.room.id),
+                'id': str(row['id']),
+                'room': str(row['room_id']),
                 'sender': {'id': str(self.user.id), 'username': self.user.username},
-                'content': msg.content,
-                'metadata': msg.metadata,
-                'created_at': msg.created_at.isoformat()
+                'content': row['content'],
+                'metadata': row['metadata'],
+                'created_at': row['created_at'].isoformat()
             }
         })
-        
-        await self.send_json({'action': 'send_message', 'ok': True})
 
     async def handle_typing(self, payload):
-        room_id = payload.get('room_id')
-        is_typing = payload.get('is_typing', False)
-        group = f"chat_{room_id}"
+        rights = await self.get_room_rights(payload.get('room_id'))
+        if rights is None or not rights.can_access:
+            return
         
-        await self.channel_layer.group_send(group, {
+        await self.typing.update(str(rights.room_id), bool(payload.get('is_typing', False)))
+
+    async def broadcast_typing(self, room_id, is_typing):
+        await self.channel_layer.group_send(f"chat_{room_id}", {
             'type': 'user_typing',
             'user': {'id': str(self.user.id), 'username': self.user.username},
-            'is_typing': is_typing
+            'is_typing': is_typing,
+            # Receivers should clear the indicator if no refresh arrives by then
+            'expires_in': self.typing.timeout if is_typing else None
+        })
+
+    async def handle_mark_read(self, payload):
+        room_id = payload.get('room_id')
+        if not room_id:
+            await self.send_json({'action': 'mark_read', 'ok': False, 'error': 'room_id required'})
+            return
+        
+        # Buffered: scrolling through a room produces one write, not one per message
+        self.read_markers.add(room_id, payload.get('message_id'))
+        await self.send_json({'action': 'mark_read', 'ok': True})
+
+    async def handle_who_is_online(self, payload):
+        room_id = payload.get('room_id')
+        if room_id:
+            rights = await self.get_room_rights(room_id)
+            if rights is None or not rights.can_access:
+                await self.send_json({'action': 'who_is_online', 'ok': False, 'error': 'forbidden'})
+                return
+            scope = f"chat:{rights.room_id}"
+        elif self.company_scope:
+            scope = self.company_scope
+        else:
+            await self.send_json({'action': 'who_is_online', 'ok': False, 'error': 'no_company'})
+            return
+        
+        users = await database_sync_to_async(describe_online)(scope)
+        await self.send_json({'action': 'who_is_online', 'ok': True, 'payload': {'scope': scope, 'users': users}})
+
+    async def presence_diff(self, event):
+        await self.send_json({
+            'action': 'presence_diff',
+            'payload': {
+                'scope': event.get('scope'),
+                'joined': event.get('joined'),
+                'left': event.get('left')
+            }
         })
 
     async def new_message(self, event):
@@ -113,45 +260,35 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
     async def user_left(self, event):
         await self.send_json({'action': 'user_left', 'payload': event.get('user')})
 
+    async def rights_invalidate(self, event):
+        """Membership changed: drop cached rights and leave rooms no longer accessible"""
+        self.room_rights = {}
+        for room_id in list(self.joined_rooms):
+            rights = await self.get_room_rights(room_id)
+            if rights is None or not rights.can_access:
+                self.joined_rooms.discard(room_id)
+                await self.typing.stop(room_id)
+                await self.presence.leave(f"chat:{room_id}")
+                await self.channel_layer.group_discard(f"chat_{room_id}", self.channel_name)
+                await self.send_json({'action': 'room_revoked', 'payload': {'room_id': room_id}})
+
     async def user_typing(self, event):
         await self.send_json({
             'action': 'user_typing',
             'payload': {
                 'user': event.get('user'),
-                'is_typing': event.get('is_typing')
+                'is_typing': event.get('is_typing'),
+                'expires_in': event.get('expires_in')
             }
         })
 
-    def _can_access_room(self, room_id):
+    def _create_message(self, row):
         try:
-            room = ChatRoom.objects.get(id=room_id)
-        except ChatRoom.DoesNotExist:
-            return False
-        
-        if room.room_type == 'company':
-            return True
-        
-        if self.user.is_superuser or self.user.is_staff:
-            return True
-        
-        return TeamMembership.objects.filter(team=room.team, user=self.user).exists()
-
-    def _can_post_to_room(self, room_id):
-        try:
-            room = ChatRoom.objects.get(id=room_id)
-        except ChatRoom.DoesNotExist:
-            return False
-        
-        if room.room_type == 'company':
-            if self.user.is_superuser or self.user.is_staff:
-                return True
-            return TeamMembership.objects.filter(user=self.user, role='manager').exists()
-        
-        if self.user.is_superuser or self.user.is_staff:
-            return True
-        
-            return TeamMembership.objects.filter(team=room.team, user=self.user).exists()
-
-    def _create_message(self, room_id, user, content, metadata):
-        room = ChatRoom.objects.get(id=room_id)
-        return Message.objects.create(room=room, sender=user, content=content, metadata=metadata)
+            Message.objects.create(**row)
+        except IntegrityError:
+            # Replayed client_id: answer with the message already stored
+            existing = Message.objects.filter(id=row['id']).values('content', 'metadata', 'created_at').first()
+            if existing is None:
+                raise
+            row = {**row, **existing}
+        return row
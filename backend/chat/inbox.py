@@ -0,0 +1,73 @@
+# backend/chat/inbox.py - Set-based room listing with previews and unread counts
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import ChatReadMarker, ChatRoom, Message, TeamMembership
+
+# Rooms without a read marker count everything as unread
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def accessible_rooms(user):
+    """Company rooms plus the team rooms the user is a member of, as one queryset"""
+    member_teams = TeamMembership.objects.filter(user=user).values('team_id')
+    return ChatRoom.objects.filter(
+        Q(room_type='company') | Q(room_type='team', team_id__in=Subquery(member_teams))
+    )
+
+
+def unread_count_expression(user):
+    """
+    Per-room unread count for `user` as an annotation on a ChatRoom queryset:
+    messages from others after the user's read marker (all of them if none)
+    """
+    last_read_at = ChatReadMarker.objects.filter(
+        room=OuterRef(OuterRef('pk')), user=user
+    ).values('last_read_at')[:1]
+
+    unread = (
+        Message.objects.filter(
+            room=OuterRef('pk'),
+            created_at__gt=Coalesce(Subquery(last_read_at), Value(EPOCH)),
+        )
+        .exclude(sender=user)
+        .order_by()
+        .values('room')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    return Coalesce(Subquery(unread, output_field=IntegerField()), 0)
+
+
+def unread_counts(user, room_ids=None):
+    """{room_id: unread} for every accessible room (or just room_ids), in one query"""
+    rooms = accessible_rooms(user)
+    if room_ids is not None:
+        rooms = rooms.filter(id__in=room_ids)
+    return dict(rooms.annotate(unread_count=unread_count_expression(user)).values_list('id', 'unread_count'))
+
+
+def room_inbox(user):
+    """
+    Accessible rooms annotated with the last message, last activity and the
+    user's unread count, newest activity first. Evaluates as a single query;
+    the correlated subqueries use the (room, created_at, id) message index.
+    """
+    last_message = Message.objects.filter(room=OuterRef('pk')).order_by('-created_at', '-id')
+
+    return (
+        accessible_rooms(user)
+        .annotate(
+            last_message_id=Subquery(last_message.values('id')[:1]),
+            last_message_content=Subquery(last_message.values('content')[:1]),
+            last_message_sender_id=Subquery(last_message.values('sender_id')[:1]),
+            last_message_sender_username=Subquery(last_message.values('sender__username')[:1]),
+            last_message_at=Subquery(last_message.values('created_at')[:1]),
+            unread_count=unread_count_expression(user),
+        )
+        .annotate(last_activity=Coalesce('last_message_at', 'created_at'))
+        .order_by('-last_activity', '-id')
+    )
@@ -59,6 +59,30 @@ class Message(models.Model):
 
     class Meta:
         ordering = ('created_at',)
+        indexes = [
+            # Keyset pagination of room history on (created_at, id)
+            models.Index(fields=['room', 'created_at', 'id'], name='chat_msg_room_created_idx'),
+        ]
 
     def __str__(self):
         return f"msg {self.id} in {self.room.name}"
+
+
+class ChatReadMarker(models.Model):
+    """How far a user has read in a room; messages after last_read_at are unread"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    room = models.ForeignKey(ChatRoom, on_delete=models.CASCADE, related_name='read_markers')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_read_markers')
+    last_read_message = models.ForeignKey(Message, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    last_read_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('room', 'user')
+        indexes = [
+            # All of a user's markers at once for bulk unread counts
+            models.Index(fields=['user', 'room', 'last_read_at'], name='chat_marker_user_room_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} read {self.room.name} to {self.last_read_at}"
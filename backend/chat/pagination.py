@@ -0,0 +1,64 @@
+# backend/chat/pagination.py - Keyset pagination for room history
+
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(message):
+    """Opaque cursor for the (created_at, id) position of a message"""
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, message_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(message_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def paginate_messages(queryset, before=None, after=None, limit=50):
+    """
+    Keyset pagination over (created_at, id) in either direction.
+
+    - before: page of messages older than the cursor (scrollback)
+    - after: page of messages newer than the cursor (catch-up)
+    - neither: the latest page
+
+    Returns (messages in chronological order, has_more) where has_more means
+    further messages exist in the direction that was paged.
+    """
+    if before and after:
+        raise InvalidCursor('Use either before or after, not both')
+
+    if after:
+        created_at, message_id = decode_cursor(after)
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+        ).order_by('created_at', 'id')
+    else:
+        if before:
+            created_at, message_id = decode_cursor(before)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+            )
+        queryset = queryset.order_by('-created_at', '-id')
+
+    # Fetch one extra row to know whether another page exists
+    messages = list(queryset[:limit + 1])
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not after:
+        messages.reverse()
+    return messages, has_more
@@ -0,0 +1,147 @@
+# backend/chat/persistence.py - Write-behind persistence for websocket messages
+
+import asyncio
+import atexit
+import logging
+import threading
+import uuid
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from .models import ChatRoom, Message
+
+logger = logging.getLogger(__name__)
+
+# Namespace for ids derived from a client's own message id
+CLIENT_MESSAGE_NAMESPACE = uuid.UUID('6f1c2a57-2d0e-4c47-9d53-3f5b0c8e7a11')
+
+MAX_RETRY_DELAY = 30.0
+
+
+def write_behind_enabled():
+    return getattr(settings, 'CHAT_WRITE_BEHIND', False)
+
+
+def message_id_for(sender_id, client_message_id=None):
+    """
+    Server-side message id. When the client supplies its own id, the server id
+    is derived from it, so a replayed send maps to the same row.
+    """
+    if client_message_id:
+        return uuid.uuid5(CLIENT_MESSAGE_NAMESPACE, f"{sender_id}:{client_message_id}")
+    return uuid.uuid4()
+
+
+def write_messages(rows):
+    """
+    Insert message rows, skipping ids that already exist (replays).
+    Rows for rooms deleted since the message was sent are dropped, and a batch
+    that still fails on integrity is retried row by row so one bad row does
+    not hold back the rest. Returns the rows dropped.
+    """
+    live_rooms = set(
+        ChatRoom.objects.filter(id__in={row['room_id'] for row in rows}).values_list('id', flat=True)
+    )
+    messages, dropped = [], []
+    for row in rows:
+        message = Message(**row)
+        room_id = uuid.UUID(str(message.room_id))
+        (messages if room_id in live_rooms else dropped).append(message)
+
+    try:
+        with transaction.atomic():
+            Message.objects.bulk_create(messages, ignore_conflicts=True)
+    except IntegrityError:
+        for message in messages:
+            try:
+                with transaction.atomic():
+                    Message.objects.bulk_create([message], ignore_conflicts=True)
+            except IntegrityError:
+                dropped.append(message)
+
+    for message in dropped:
+        logger.warning("Dropping chat message %s for room %s", message.id, message.room_id)
+    return dropped
+
+
+class WriteBehindPersister:
+    """
+    Buffers message rows from consumers and writes them with bulk_create every
+    CHAT_WRITE_BEHIND_BATCH_SIZE messages or CHAT_WRITE_BEHIND_FLUSH_MS,
+    whichever comes first.
+
+    Delivery is at-least-once: a failed batch goes back to the front of the
+    queue and is retried with backoff, and rows carry fixed ids so a retried or
+    replayed row is inserted once. Rows still queued at interpreter exit are
+    written synchronously.
+    """
+
+    def __init__(self, batch_size=None, flush_ms=None):
+        self.batch_size = batch_size or getattr(settings, 'CHAT_WRITE_BEHIND_BATCH_SIZE', 100)
+        self.flush_interval = (flush_ms or getattr(settings, 'CHAT_WRITE_BEHIND_FLUSH_MS', 200)) / 1000
+        self.pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._flushing = None
+        self._retry_delay = 0.0
+
+    def enqueue(self, row):
+        with self._lock:
+            self.pending.append(row)
+            size = len(self.pending)
+
+        if size >= self.batch_size:
+            self._schedule(0)
+        else:
+            self._schedule(self.flush_interval)
+
+    def _schedule(self, delay):
+        loop = asyncio.get_running_loop()
+        if delay == 0 and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._timer is None:
+            self._timer = loop.call_later(max(delay, self._retry_delay), self._start_flush)
+
+    def _start_flush(self):
+        self._timer = None
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Write everything queued so far; safe to await from consumers"""
+        while True:
+            with self._lock:
+                batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+            if not batch:
+                return
+
+            try:
+                await database_sync_to_async(write_messages)(batch)
+            except Exception:
+                with self._lock:
+                    self.pending[:0] = batch
+                self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), MAX_RETRY_DELAY)
+                logger.exception("Chat write-behind flush failed, retrying in %.1fs", self._retry_delay)
+                self._schedule(self._retry_delay)
+                return
+            self._retry_delay = 0.0
+
+    def drain(self):
+        """Synchronous flush for shutdown, outside any event loop"""
+        with self._lock:
+            rows, self.pending = self.pending, []
+        if not rows:
+            return
+        close_old_connections()
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                write_messages(rows[start:start + self.batch_size])
+        except Exception:
+            logger.exception("Lost %d chat message(s) at shutdown", len(rows))
+
+
+persister = WriteBehindPersister()
+atexit.register(persister.drain)
@@ -0,0 +1,304 @@
+# backend/chat/presence.py - Who is connected, per chat room, whiteboard and company
+
+import asyncio
+import logging
+import threading
+import time
+
+import redis
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import User
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_KEY = 'presence:{scope}'
+SNAPSHOT_KEY = 'presence:snapshot:{scope}'
+SCOPES_KEY = 'presence:scopes'
+
+# Scope prefix -> channel-layer group that receives its presence diffs
+SCOPE_GROUPS = {
+    'chat': 'chat_{id}',
+    'whiteboard': 'whiteboard_{id}',
+    'company': 'presence_company_{id}',
+}
+
+
+def scope_group(scope):
+    kind, _, scope_id = scope.partition(':')
+    return SCOPE_GROUPS[kind].format(id=scope_id)
+
+
+def _ttl():
+    return getattr(settings, 'PRESENCE_TTL_SECONDS', 60)
+
+
+def _member(user_id, channel_name):
+    # One entry per connection, so a user with two tabs stays online until both close
+    return f"{user_id}|{channel_name}"
+
+
+def _user_of(member):
+    return member.split('|', 1)[0]
+
+
+# ============================================
+# STORES
+# ============================================
+
+class RedisPresenceStore:
+    """
+    One sorted set per scope: member = user|channel, score = expiry time.
+    Heartbeats push the score forward; expired members are pruned on read,
+    so crashed processes age out after PRESENCE_TTL_SECONDS.
+    """
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def touch(self, scopes, member, ttl):
+        expires = time.time() + ttl
+        pipe = self.client.pipeline(transaction=False)
+        for scope in scopes:
+            key = PRESENCE_KEY.format(scope=scope)
+            pipe.zadd(key, {member: expires})
+            pipe.expire(key, int(ttl * 2))
+            pipe.sadd(SCOPES_KEY, scope)
+        pipe.execute()
+
+    def remove(self, scopes, member):
+        pipe = self.client.pipeline(transaction=False)
+        for scope in scopes:
+            pipe.zrem(PRESENCE_KEY.format(scope=scope), member)
+        pipe.execute()
+
+    def online(self, scopes):
+        now = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        for scope in scopes:
+            key = PRESENCE_KEY.format(scope=scope)
+            pipe.zremrangebyscore(key, '-inf', now)
+            pipe.zrangebyscore(key, now, '+inf')
+        results = pipe.execute()
+        return {
+            scope: {_user_of(member) for member in results[i * 2 + 1]}
+            for i, scope in enumerate(scopes)
+        }
+
+    def swap_snapshot(self, scope, users):
+        key = SNAPSHOT_KEY.format(scope=scope)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.smembers(key)
+        pipe.delete(key)
+        if users:
+            pipe.sadd(key, *users)
+            pipe.expire(key, int(_ttl() * 10))
+        else:
+            pipe.srem(SCOPES_KEY, scope)
+        return set(pipe.execute()[0])
+
+    def scopes(self):
+        return set(self.client.smembers(SCOPES_KEY))
+
+
+class MemoryPresenceStore:
+    """Process-local store with the same semantics, for tests and single-process dev"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._members = {}
+        self._snapshots = {}
+
+    def touch(self, scopes, member, ttl):
+        expires = time.time() + ttl
+        with self._lock:
+            for scope in scopes:
+                self._members.setdefault(scope, {})[member] = expires
+
+    def remove(self, scopes, member):
+        with self._lock:
+            for scope in scopes:
+                self._members.get(scope, {}).pop(member, None)
+
+    def online(self, scopes):
+        now = time.time()
+        result = {}
+        with self._lock:
+            for scope in scopes:
+                members = self._members.get(scope, {})
+                for member in [m for m, expires in members.items() if expires <= now]:
+                    del members[member]
+                result[scope] = {_user_of(member) for member in members}
+        return result
+
+    def swap_snapshot(self, scope, users):
+        with self._lock:
+            previous = self._snapshots.pop(scope, set())
+            if users:
+                self._snapshots[scope] = set(users)
+            elif not self._members.get(scope):
+                self._members.pop(scope, None)
+            return previous
+
+    def scopes(self):
+        with self._lock:
+            return set(self._members) | set(self._snapshots)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_presence_store():
+    """Store selected by PRESENCE_BACKEND ('redis' or 'memory')"""
+    backend = getattr(settings, 'PRESENCE_BACKEND', 'redis')
+    with _stores_lock:
+        if backend not in _stores:
+            if backend == 'memory':
+                _stores[backend] = MemoryPresenceStore()
+            else:
+                _stores[backend] = RedisPresenceStore(
+                    getattr(settings, 'PRESENCE_REDIS_URL', 'redis://127.0.0.1:6379/1')
+                )
+        return _stores[backend]
+
+
+# ============================================
+# QUERIES AND DIFFS
+# ============================================
+
+def online_users(scope):
+    """User ids (as strings) with a live connection in the scope"""
+    return get_presence_store().online([scope])[scope]
+
+
+def describe_online(scope):
+    """Live users of a scope as [{'id', 'username'}], one users query"""
+    user_ids = online_users(scope)
+    if not user_ids:
+        return []
+    return [
+        {'id': str(user['id']), 'username': user['username']}
+        for user in User.objects.filter(id__in=user_ids).values('id', 'username').order_by('username')
+    ]
+
+
+def publish_diffs(scopes):
+    """
+    Compare each scope's live users with the last broadcast snapshot and send
+    one 'presence.diff' event per changed scope. Returns {scope: (joined, left)}.
+    """
+    scopes = list(scopes)
+    if not scopes:
+        return {}
+
+    store = get_presence_store()
+    current = store.online(scopes)
+    channel_layer = get_channel_layer()
+    diffs = {}
+    for scope in scopes:
+        previous = store.swap_snapshot(scope, current[scope])
+        joined, left = current[scope] - previous, previous - current[scope]
+        if not (joined or left):
+            continue
+        diffs[scope] = (joined, left)
+        if channel_layer is None:
+            continue
+        try:
+            async_to_sync(channel_layer.group_send)(scope_group(scope), {
+                'type': 'presence.diff',
+                'scope': scope,
+                'joined': sorted(joined),
+                'left': sorted(left),
+            })
+        except Exception:
+            logger.exception("Failed to publish presence diff for %s", scope)
+    return diffs
+
+
+def sweep_presence():
+    """Publish diffs for every known scope, catching connections that expired"""
+    return publish_diffs(get_presence_store().scopes())
+
+
+class PresenceDiffBatcher:
+    """
+    Collects scopes touched by joins and leaves in this process and publishes
+    their diffs together every PRESENCE_DIFF_INTERVAL_SECONDS, so a burst of
+    connects in one room becomes one broadcast.
+    """
+
+    def __init__(self):
+        self.dirty = set()
+        self._handle = None
+
+    def mark(self, scope):
+        self.dirty.add(scope)
+        if self._handle is None:
+            loop = asyncio.get_running_loop()
+            self._handle = loop.call_later(
+                getattr(settings, 'PRESENCE_DIFF_INTERVAL_SECONDS', 1.0),
+                lambda: asyncio.ensure_future(self.flush()),
+            )
+
+    async def flush(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        scopes, self.dirty = self.dirty, set()
+        if scopes:
+            await sync_to_async(publish_diffs)(scopes)
+
+
+diff_batcher = PresenceDiffBatcher()
+
+
+class ConnectionPresence:
+    """
+    Presence of one websocket connection across its scopes, kept alive by a
+    heartbeat every PRESENCE_HEARTBEAT_SECONDS until stop()
+    """
+
+    def __init__(self, user_id, channel_name):
+        self.member = _member(user_id, channel_name)
+        self.scopes = set()
+        self._heartbeat = None
+
+    def start(self):
+        self._heartbeat = asyncio.ensure_future(self._beat())
+
+    async def _beat(self):
+        interval = getattr(settings, 'PRESENCE_HEARTBEAT_SECONDS', 20)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.heartbeat()
+            except Exception:
+                logger.exception("Presence heartbeat failed for %s", self.member)
+
+    async def heartbeat(self):
+        if self.scopes:
+            await sync_to_async(get_presence_store().touch)(list(self.scopes), self.member, _ttl())
+
+    async def join(self, scope):
+        self.scopes.add(scope)
+        await sync_to_async(get_presence_store().touch)([scope], self.member, _ttl())
+        diff_batcher.mark(scope)
+
+    async def leave(self, scope):
+        if scope not in self.scopes:
+            return
+        self.scopes.discard(scope)
+        await sync_to_async(get_presence_store().remove)([scope], self.member)
+        diff_batcher.mark(scope)
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        scopes, self.scopes = list(self.scopes), set()
+        if scopes:
+            await sync_to_async(get_presence_store().remove)(scopes, self.member)
+            for scope in scopes:
+                diff_batcher.mark(scope)
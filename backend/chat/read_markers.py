@@ -0,0 +1,118 @@
+# backend/chat/read_markers.py - Read positions per user and room
+
+import asyncio
+import logging
+import uuid
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .inbox import accessible_rooms
+from .models import ChatReadMarker, Message
+
+logger = logging.getLogger(__name__)
+
+
+def _uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def mark_read_many(user, marks):
+    """
+    Move the user's read markers forward. `marks` maps room_id to the id of the
+    last message read, or None for "everything so far". Markers never move
+    backwards and rooms the user cannot access are ignored.
+    Returns the room ids whose marker changed.
+    """
+    marks = {
+        _uuid(room_id): _uuid(message_id) if message_id else None
+        for room_id, message_id in marks.items()
+    }
+    marks.pop(None, None)
+    if not marks:
+        return []
+
+    room_ids = set(accessible_rooms(user).filter(id__in=list(marks)).values_list('id', flat=True))
+    message_ids = [message_id for room_id, message_id in marks.items() if message_id and room_id in room_ids]
+    messages = {
+        message.id: message
+        for message in Message.objects.filter(id__in=message_ids, room_id__in=room_ids).only('id', 'room_id', 'created_at')
+    }
+
+    updated = []
+    for room_id, message_id in marks.items():
+        if room_id not in room_ids:
+            continue
+        if message_id:
+            message = messages.get(message_id)
+            if message is None or message.room_id != room_id:
+                continue
+        else:
+            message = Message.objects.filter(room_id=room_id).order_by('-created_at', '-id').only('id', 'created_at').first()
+            if message is None:
+                continue
+
+        changed = ChatReadMarker.objects.filter(
+            room_id=room_id, user=user, last_read_at__lt=message.created_at
+        ).update(last_read_message=message, last_read_at=message.created_at)
+        if not changed:
+            try:
+                with transaction.atomic():
+                    _, changed = ChatReadMarker.objects.get_or_create(
+                        room_id=room_id, user=user,
+                        defaults={'last_read_message': message, 'last_read_at': message.created_at},
+                    )
+            except IntegrityError:
+                # Created concurrently; that write wins
+                changed = False
+        if changed:
+            updated.append(room_id)
+    return updated
+
+
+def mark_read(user, room_id, message_id=None):
+    return bool(mark_read_many(user, {room_id: message_id}))
+
+
+class ReadMarkerBuffer:
+    """
+    Coalesces read-marker updates from one websocket connection.
+    Only the newest message per room is kept, and pending markers are written
+    at most once per CHAT_READ_MARKER_FLUSH_SECONDS (and on flush()).
+    """
+
+    def __init__(self, user, delay=None):
+        self.user = user
+        self.delay = delay if delay is not None else getattr(settings, 'CHAT_READ_MARKER_FLUSH_SECONDS', 2.0)
+        self.pending = {}
+        self._task = None
+
+    def add(self, room_id, message_id=None):
+        self.pending[room_id] = message_id
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            return
+        self._task = None
+        await self.flush()
+
+    async def flush(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return []
+        try:
+            return await database_sync_to_async(mark_read_many)(self.user, pending)
+        except Exception:
+            logger.exception("Failed to write read markers for user %s", self.user.pk)
+            return []
@@ -12,9 +12,55 @@ class RoomSerializer(serializers.ModelSerializer):
         model = ChatRoom
         fields = ('id', 'room_type', 'team', 'name', 'created_by', 'created_at')
 
+class RoomInboxSerializer(serializers.ModelSerializer):
+    """Reads the annotations added by chat.inbox.room_inbox"""
+    last_message = serializers.SerializerMethodField()
+    last_activity = serializers.DateTimeField(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ChatRoom
+        fields = ('id', 'room_type', 'team', 'name', 'created_by', 'created_at',
+                  'last_message', 'last_activity', 'unread_count')
+
+    def get_last_message(self, obj):
+        if obj.last_message_id is None:
+            return None
+        return {
+            'id': str(obj.last_message_id),
+            'content': obj.last_message_content,
+            'sender': {
+                'id': obj.last_message_sender_id,
+                'username': obj.last_message_sender_username,
+            } if obj.last_message_sender_id is not None else None,
+            'created_at': serializers.DateTimeField().to_representation(obj.last_message_at),
+        }
+
+
 class MessageSerializer(serializers.ModelSerializer):
     sender = UserLiteSerializer(read_only=True)
 
     class Meta:
         model = Message
         fields = ('id', 'room', 'sender', 'content', 'metadata', 'created_at')
+
+
+class MessageCompactSerializer(serializers.ModelSerializer):
+    """History rows reference their sender by id; senders are sent once per page"""
+    sender_id = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Message
+        fields = ('id', 'room', 'sender_id', 'content', 'metadata', 'created_at')
+
+    def get_sender_id(self, obj):
+        return str(obj.sender_id) if obj.sender_id is not None else None
+
+
+def build_sender_map(messages):
+    """Deduplicated sender dicts for a page, keyed by user id (needs select_related('sender'))"""
+    senders = {}
+    for message in messages:
+        if message.sender_id is not None and str(message.sender_id) not in senders:
+            senders[str(message.sender_id)] = UserLiteSerializer(message.sender).data
+    return senders
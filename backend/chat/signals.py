@@ -0,0 +1,16 @@
+# backend/chat/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .access import notify_rights_changed
+from .models import TeamMembership
+
+
+@receiver(post_save, sender=TeamMembership)
+@receiver(post_delete, sender=TeamMembership)
+def invalidate_chat_rights(sender, instance, **kwargs):
+    # Role or membership changed: connected consumers re-check on next use
+    user_id = instance.user_id
+    transaction.on_commit(lambda: notify_rights_changed(user_id))
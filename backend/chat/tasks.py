@@ -0,0 +1,10 @@
+# backend/chat/tasks.py - Celery tasks for chat presence
+
+from celery import shared_task
+
+from .presence import sweep_presence
+
+
+@shared_task(name='chat.sweep_presence', ignore_result=True)
+def sweep_presence_task():
+    sweep_presence()
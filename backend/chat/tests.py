@@ -1,3 +1,377 @@
-from django.test import TestCase
+import asyncio
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import ChatReadMarker, ChatRoom, Message, Team, TeamMembership
+from .access import resolve_room_rights
+from .consumers import ChatConsumer
+from .inbox import unread_counts
+from .pagination import encode_cursor, paginate_messages
+from .presence import ConnectionPresence, MemoryPresenceStore, get_presence_store, publish_diffs
+from .persistence import WriteBehindPersister, message_id_for, write_messages
+from .read_markers import ReadMarkerBuffer, mark_read
+from .throttling import ActionRateLimiter, TokenBucket, TypingCoalescer
+
+
+class RoomHistoryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'user{i}', password='x') for i in range(5)]
+        cls.room = ChatRoom.objects.create(room_type='company', name='General')
+        now = timezone.now()
+        for i in range(30):
+            # Pairs of messages share a timestamp so the id tiebreaker matters
+            Message.objects.create(
+                room=cls.room,
+                sender=cls.users[i % 5],
+                content=f'Message {i}',
+                created_at=now - timedelta(minutes=30 - i // 2),
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+        self.url = f'/api/chat/rooms/{self.room.id}/history/'
+
+    def test_scrolls_back_through_all_messages(self):
+        seen = []
+        params = {'limit': 7}
+        while True:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            seen = [m['id'] for m in response.data['messages']] + seen
+            if not response.data['has_more_before']:
+                break
+            params = {'limit': 7, 'before': response.data['before_cursor']}
+
+        expected = [
+            str(pk) for pk in
+            Message.objects.filter(room=self.room).order_by('created_at', 'id').values_list('id', flat=True)
+        ]
+        self.assertEqual(seen, expected)
+
+    def test_after_cursor_returns_newer_messages(self):
+        messages = list(Message.objects.filter(room=self.room).order_by('created_at', 'id'))
+
+        page, has_more = paginate_messages(Message.objects.filter(room=self.room), limit=5)
+        self.assertEqual([m.id for m in page], [m.id for m in messages[-5:]])
+        self.assertTrue(has_more)
+
+        response = self.client.get(self.url, {'limit': 10, 'after': encode_cursor(messages[0])})
+        self.assertEqual([m['id'] for m in response.data['messages']], [str(m.id) for m in messages[1:11]])
+        self.assertTrue(response.data['has_more_after'])
+
+    def test_constant_queries_and_deduplicated_senders(self):
+        # room lookup + one message query with senders joined, plus the savepoint pair
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {'limit': 30})
+        self.assertEqual(len(response.data['messages']), 30)
+        self.assertEqual(len(response.data['senders']), 5)
+        self.assertIn(response.data['messages'][0]['sender_id'], response.data['senders'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'before': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RoomInboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='member', password='x')
+        cls.other = User.objects.create_user(username='other', password='x')
+        now = timezone.now()
+
+        cls.general = ChatRoom.objects.create(room_type='company', name='General', created_at=now - timedelta(days=3))
+        cls.teams = [Team.objects.create(name=f'Team {i}') for i in range(4)]
+        cls.team_rooms = []
+        for i, team in enumerate(cls.teams):
+            if i < 3:
+                TeamMembership.objects.create(team=team, user=cls.user)
+            cls.team_rooms.append(ChatRoom.objects.create(
+                room_type='team', team=team, name=team.name, created_at=now - timedelta(days=2)
+            ))
+
+        # General: 3 from other, 1 own; Team 0: 2 from other after the read marker
+        for i in range(3):
+            Message.objects.create(room=cls.general, sender=cls.other, content=f'g{i}',
+                                   created_at=now - timedelta(hours=5 - i))
+        Message.objects.create(room=cls.general, sender=cls.user, content='mine',
+                               created_at=now - timedelta(hours=1))
+        Message.objects.create(room=cls.team_rooms[0], sender=cls.other, content='old',
+                               created_at=now - timedelta(hours=10))
+        ChatReadMarker.objects.create(room=cls.team_rooms[0], user=cls.user,
+                                      last_read_at=now - timedelta(hours=9))
+        for i in range(2):
+            Message.objects.create(room=cls.team_rooms[0], sender=cls.other, content=f't{i}',
+                                   created_at=now - timedelta(minutes=30 - i))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_single_query_with_previews_and_unread(self):
+        # one inbox query, plus the ATOMIC_REQUESTS savepoint pair
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/chat/rooms/inbox/')
+        self.assertEqual(response.status_code, 200)
+
+        rooms = {room['id']: room for room in response.data}
+        self.assertNotIn(str(self.team_rooms[3].id), rooms)
+        self.assertEqual(len(rooms), 4)
+        self.assertEqual(response.data[0]['id'], str(self.team_rooms[0].id))
+
+        self.assertEqual(rooms[str(self.general.id)]['unread_count'], 3)
+        self.assertEqual(rooms[str(self.general.id)]['last_message']['content'], 'mine')
+        self.assertEqual(rooms[str(self.team_rooms[0].id)]['unread_count'], 2)
+        self.assertIsNone(rooms[str(self.team_rooms[1].id)]['last_message'])
+        self.assertEqual(rooms[str(self.team_rooms[1].id)]['unread_count'], 0)
+
+    def test_rooms_list_is_set_based(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/chat/rooms/')
+        self.assertEqual(len(response.data), 4)
+
+
+class ReadMarkerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='x')
+        cls.other = User.objects.create_user(username='writer', password='x')
+        cls.room = ChatRoom.objects.create(room_type='company', name='General')
+        cls.hidden = ChatRoom.objects.create(room_type='team', team=Team.objects.create(name='Hidden'), name='Hidden')
+        now = timezone.now()
+        cls.messages = [
+            Message.objects.create(room=cls.room, sender=cls.other, content=f'm{i}',
+                                   created_at=now - timedelta(minutes=10 - i))
+            for i in range(6)
+        ]
+
+    def test_marker_only_moves_forward(self):
+        self.assertTrue(mark_read(self.user, self.room.id, self.messages[3].id))
+        self.assertEqual(unread_counts(self.user), {self.room.id: 2})
+
+        self.assertFalse(mark_read(self.user, self.room.id, self.messages[1].id))
+        marker = ChatReadMarker.objects.get(room=self.room, user=self.user)
+        self.assertEqual(marker.last_read_message_id, self.messages[3].id)
+
+        self.assertTrue(mark_read(self.user, self.room.id))
+        self.assertEqual(unread_counts(self.user), {self.room.id: 0})
+
+    def test_inaccessible_room_ignored(self):
+        self.assertFalse(mark_read(self.user, self.hidden.id))
+        self.assertFalse(ChatReadMarker.objects.filter(room=self.hidden).exists())
+
+    def test_buffer_coalesces_to_latest(self):
+        buffer = ReadMarkerBuffer(self.user, delay=60)
+
+        async def scroll():
+            for message in self.messages[:5]:
+                buffer.add(str(self.room.id), str(message.id))
+            pending = len(buffer.pending)
+            return pending, await buffer.flush()
+
+        pending, updated = async_to_sync(scroll)()
+        self.assertEqual(pending, 1)
+        self.assertEqual(updated, [self.room.id])
+        marker = ChatReadMarker.objects.get(room=self.room, user=self.user)
+        self.assertEqual(marker.last_read_message_id, self.messages[4].id)
+
+
+class RoomRightsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user(username='member', password='x')
+        cls.manager = User.objects.create_user(username='manager', password='x')
+        cls.outsider = User.objects.create_user(username='outsider', password='x')
+        cls.team = Team.objects.create(name='Team')
+        TeamMembership.objects.create(team=cls.team, user=cls.member)
+        TeamMembership.objects.create(team=cls.team, user=cls.manager, role='manager')
+        cls.company_room = ChatRoom.objects.create(room_type='company', name='General')
+        cls.team_room = ChatRoom.objects.create(room_type='team', team=cls.team, name='Team')
+
+    def test_team_room(self):
+        rights = resolve_room_rights(self.member, self.team_room.id)
+        self.assertTrue(rights.can_access)
+        self.assertTrue(rights.can_post)
+        rights = resolve_room_rights(self.outsider, self.team_room.id)
+        self.assertFalse(rights.can_access)
+        self.assertFalse(rights.can_post)
+
+    def test_company_room_posting_needs_manager(self):
+        self.assertFalse(resolve_room_rights(self.member, self.company_room.id).can_post)
+        self.assertTrue(resolve_room_rights(self.manager, self.company_room.id).can_post)
+        self.assertTrue(resolve_room_rights(self.outsider, self.company_room.id).can_access)
+
+    def test_missing_room(self):
+        self.assertIsNone(resolve_room_rights(self.member, uuid.uuid4()))
+
+
+class WriteBehindPersistenceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='sender', password='x')
+        cls.room = ChatRoom.objects.create(room_type='company', name='General')
+
+    def _row(self, i, client_id=None):
+        return {
+            'id': message_id_for(self.user.id, client_id or f'c{i}'),
+            'room_id': self.room.id,
+            'sender_id': self.user.id,
+            'content': f'Message {i}',
+            'metadata': {},
+            'created_at': timezone.now(),
+        }
+
+    def test_batched_flush_is_idempotent(self):
+        persister = WriteBehindPersister(batch_size=3, flush_ms=60000)
+        rows = [self._row(i) for i in range(7)]
+
+        async def send(rows):
+            for row in rows:
+                persister.enqueue(row)
+            await persister.flush()
+
+        async_to_sync(send)(rows)
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 7)
+
+        # A replayed batch (same client ids) inserts nothing new
+        async_to_sync(send)([self._row(i) for i in range(7)])
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 7)
+        self.assertEqual(persister.pending, [])
+
+    def test_bad_row_does_not_block_batch(self):
+        bad = {**self._row(0), 'room_id': uuid.uuid4()}
+        dropped = write_messages([bad, self._row(1), self._row(2)])
+        self.assertEqual([message.id for message in dropped], [bad['id']])
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 2)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ThrottlingTests(SimpleTestCase):
+
+    def test_token_bucket_refills(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+        self.assertEqual([bucket.allow() for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(bucket.retry_after(), 0.5)
+        clock.now = 0.5
+        self.assertTrue(bucket.allow())
+        self.assertFalse(bucket.allow())
+
+    def test_limits_are_per_action(self):
+        limiter = ActionRateLimiter({'send_message': (1, 1)}, clock=FakeClock())
+        self.assertTrue(limiter.allow('send_message'))
+        self.assertFalse(limiter.allow('send_message'))
+        self.assertTrue(limiter.allow('join'))
+
+    @override_settings(CHAT_RATE_LIMITS={'default': (1, 2), 'typing': (1, 1)})
+    def test_limits_come_from_settings_per_key(self):
+        limiter = ActionRateLimiter({'send_message': (1, 3)}, clock=FakeClock())
+        self.assertEqual([limiter.allow('send_message') for _ in range(4)], [True, True, True, False])
+        self.assertEqual([limiter.allow('typing') for _ in range(2)], [True, False])
+        self.assertEqual([limiter.allow('join') for _ in range(3)], [True, True, False])
+
+    @override_settings(CHAT_RATE_LIMITS={'typing': (1, 1)})
+    def test_default_limit_required(self):
+        with self.assertRaisesMessage(ValueError, "'default'"):
+            ActionRateLimiter()
+
+    def test_typing_coalesced_and_expires(self):
+        clock = FakeClock()
+        sent = []
+
+        async def broadcast(room_id, is_typing):
+            sent.append((room_id, is_typing))
+
+        async def scenario():
+            typing = TypingCoalescer(broadcast, refresh=3, timeout=0.05, clock=clock)
+            for i in range(20):
+                clock.now = i * 0.2  # keystrokes over four seconds
+                await typing.update('room', True)
+            await typing.stop('room')
+            await typing.stop('room')
+
+            await typing.update('other', True)
+            await asyncio.sleep(0.1)
+            return typing.rooms
+
+        rooms = async_to_sync(scenario)()
+        # start, one refresh after 3s, stop; then start and automatic expiry
+        self.assertEqual(sent, [
+            ('room', True), ('room', True), ('room', False),
+            ('other', True), ('other', False),
+        ])
+        self.assertEqual(rooms, {})
+
+
+@override_settings(PRESENCE_BACKEND='memory')
+class PresenceTests(SimpleTestCase):
+
+    def setUp(self):
+        self.store = get_presence_store()
+        self.assertIsInstance(self.store, MemoryPresenceStore)
+        self.store.__init__()
+
+    def test_diffs_report_users_not_connections(self):
+        self.store.touch(['chat:r1'], '1|chan-a', 60)
+        self.store.touch(['chat:r1'], '1|chan-b', 60)
+        self.store.touch(['chat:r1'], '2|chan-c', 60)
+        self.assertEqual(publish_diffs(['chat:r1']), {'chat:r1': ({'1', '2'}, set())})
+
+        # Closing one of two tabs is not a departure
+        self.store.remove(['chat:r1'], '1|chan-a')
+        self.assertEqual(publish_diffs(['chat:r1']), {})
+
+        self.store.remove(['chat:r1'], '1|chan-b')
+        self.assertEqual(publish_diffs(['chat:r1']), {'chat:r1': (set(), {'1'})})
+
+    def test_revoked_room_leaves_presence(self):
+        consumer = ChatConsumer()
+        consumer.channel_name = 'chan-e'
+        consumer.channel_layer = InMemoryChannelLayer()
+        consumer.joined_rooms = {'r1', 'r2'}
+        consumer.presence = ConnectionPresence(4, 'chan-e')
+        consumer.typing = TypingCoalescer(mock.AsyncMock())
+        consumer.send_json = mock.AsyncMock()
+        consumer.get_room_rights = mock.AsyncMock(
+            side_effect=lambda room_id: None if room_id == 'r1' else SimpleNamespace(can_access=True)
+        )
+
+        async def revoke():
+            await consumer.presence.join('chat:r1')
+            await consumer.presence.join('chat:r2')
+            await consumer.rights_invalidate({})
+
+        async_to_sync(revoke)()
+        self.assertEqual(consumer.joined_rooms, {'r2'})
+        self.assertEqual(self.store.online(['chat:r1', 'chat:r2']), {'chat:r1': set(), 'chat:r2': {'4'}})
+
+    def test_expired_connections_leave(self):
+        self.store.touch(['company:c1'], '3|chan-d', 60)
+        publish_diffs(['company:c1'])
+        self.store.touch(['company:c1'], '3|chan-d', -1)  # heartbeat stopped long ago
+        self.assertEqual(self.store.online(['company:c1']), {'company:c1': set()})
+        self.assertEqual(publish_diffs(self.store.scopes()), {'company:c1': (set(), {'3'})})
+        self.assertEqual(self.store.scopes(), set())
@@ -0,0 +1,117 @@
+# backend/chat/throttling.py - Per-connection rate limits and typing coalescing
+
+import asyncio
+import time
+
+from django.conf import settings
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def allow(self, cost=1.0):
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def retry_after(self, cost=1.0):
+        """Seconds until `cost` tokens are available"""
+        self._refill()
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+
+class ActionRateLimiter:
+    """
+    One token bucket per inbound action for a single connection.
+    Limits are (tokens per second, burst) per action, from CHAT_RATE_LIMITS
+    with `limits` overriding individual keys; actions without an entry use
+    the 'default' one.
+    """
+
+    def __init__(self, limits=None, clock=time.monotonic):
+        self.limits = {**getattr(settings, 'CHAT_RATE_LIMITS', {}), **(limits or {})}
+        if 'default' not in self.limits:
+            raise ValueError("CHAT_RATE_LIMITS must define a 'default' limit")
+        self.clock = clock
+        self.buckets = {}
+
+    def _bucket(self, action):
+        key = action if action in self.limits else 'default'
+        if key not in self.buckets:
+            rate, burst = self.limits[key]
+            self.buckets[key] = TokenBucket(rate, burst, clock=self.clock)
+        return self.buckets[key]
+
+    def allow(self, action):
+        return self._bucket(action).allow()
+
+    def retry_after(self, action):
+        return self._bucket(action).retry_after()
+
+
+class TypingCoalescer:
+    """
+    Typing state of one connection's user, per room.
+
+    Clients may report typing on every keystroke; only these reach the room:
+    - a start when the user begins typing,
+    - a refresh at most once per CHAT_TYPING_REFRESH_SECONDS while typing,
+    - a stop when the user stops, sends, leaves, or goes quiet for
+      CHAT_TYPING_TIMEOUT_SECONDS (automatic expiry).
+
+    `broadcast(room_id, is_typing)` is the coroutine that does the group_send.
+    """
+
+    def __init__(self, broadcast, refresh=None, timeout=None, clock=time.monotonic):
+        self.broadcast = broadcast
+        self.refresh = refresh if refresh is not None else getattr(settings, 'CHAT_TYPING_REFRESH_SECONDS', 3.0)
+        self.timeout = timeout if timeout is not None else getattr(settings, 'CHAT_TYPING_TIMEOUT_SECONDS', 6.0)
+        self.clock = clock
+        # room_id -> (last broadcast time, expiry handle)
+        self.rooms = {}
+
+    async def update(self, room_id, is_typing):
+        if not is_typing:
+            await self.stop(room_id)
+            return
+
+        state = self.rooms.get(room_id)
+        now = self.clock()
+        if state is not None:
+            last_sent, expiry = state
+            expiry.cancel()
+            if now - last_sent < self.refresh:
+                self.rooms[room_id] = (last_sent, self._expire_later(room_id))
+                return
+
+        self.rooms[room_id] = (now, self._expire_later(room_id))
+        await self.broadcast(room_id, True)
+
+    async def stop(self, room_id):
+        state = self.rooms.pop(room_id, None)
+        if state is None:
+            return
+        state[1].cancel()
+        await self.broadcast(room_id, False)
+
+    async def stop_all(self):
+        for room_id in list(self.rooms):
+            await self.stop(room_id)
+
+    def _expire_later(self, room_id):
+        loop = asyncio.get_running_loop()
+        return loop.call_later(self.timeout, lambda: asyncio.ensure_future(self.stop(room_id)))
@@ -3,6 +3,12 @@ from . import views
 
 urlpatterns = [
     path('rooms/', views.rooms_list, name='chat-rooms'),
+    path('rooms/inbox/', views.rooms_inbox, name='chat-rooms-inbox'),
+    path('rooms/unread/', views.rooms_unread, name='chat-rooms-unread'),
+    path('online/', views.company_online, name='chat-company-online'),
+    path('rooms/<uuid:room_id>/online/', views.room_online, name='chat-room-online'),
     path('rooms/<uuid:room_id>/messages/', views.room_messages, name='chat-room-messages'),
+    path('rooms/<uuid:room_id>/history/', views.room_history, name='chat-room-history'),
+    path('rooms/<uuid:room_id>/read/', views.room_mark_read, name='chat-room-mark-read'),
     path('rooms/<uuid:room_id>/messages/post/', views.post_message, name='chat-post-message'),
 ]
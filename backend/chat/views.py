@@ -1,10 +1,25 @@
+import logging
+
 from rest_framework import permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from .inbox import accessible_rooms, room_inbox, unread_counts
 from .models import ChatRoom, Message, TeamMembership, Team
-from .serializers import RoomSerializer, MessageSerializer
+from .pagination import InvalidCursor, encode_cursor, paginate_messages
+from .presence import describe_online
+from .read_markers import mark_read
+from .serializers import (
+    RoomSerializer,
+    RoomInboxSerializer,
+    MessageSerializer,
+    MessageCompactSerializer,
+    build_sender_map,
+)
 from django.contrib.auth.models import User
+from users.identity import get_request_identity
+
+logger = logging.getLogger(__name__)
 
 
 def user_is_admin(user):
@@ -23,33 +38,7 @@ def user_is_team_member(user, team: Team):
 @permission_classes([permissions.IsAuthenticated])
 def rooms_list(request):
     try:
-        user = request.user
-        print(f"DEBUG: Fetching rooms for user {user}")
-        
-        # Get all company rooms (accessible to all authenticated users)
-        company_rooms = ChatRoom.objects.filter(room_type='company')
-        print(f"DEBUG: Company rooms: {company_rooms.count()}")
-        
-        # Get user's team memberships
-        team_memberships = TeamMembership.objects.filter(user=user)
-        print(f"DEBUG: User team memberships: {team_memberships.count()}")
-        
-        # Get team IDs
-        team_ids = team_memberships.values_list('team_id', flat=True)
-        print(f"DEBUG: Team IDs: {list(team_ids)}")
-        
-        # Get team rooms
-        if team_ids:
-            team_rooms = ChatRoom.objects.filter(room_type='team', team_id__in=list(team_ids))
-        else:
-            team_rooms = ChatRoom.objects.none()
-        
-        print(f"DEBUG: Team rooms: {team_rooms.count()}")
-        
-        # Combine using union
-        rooms = list(company_rooms) + list(team_rooms)
-        rooms = sorted(set(rooms), key=lambda x: x.created_at)
-        
+        rooms = accessible_rooms(request.user).order_by('created_at')
         serializer = RoomSerializer(rooms, many=True)
         return Response(serializer.data)
         
@@ -60,6 +49,75 @@ def rooms_list(request):
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def rooms_inbox(request):
+    """Sidebar listing: rooms with last message preview and unread count, in one query"""
+    try:
+        rooms = room_inbox(request.user)
+        serializer = RoomInboxSerializer(rooms, many=True)
+        return Response(serializer.data)
+
+    except Exception as e:
+        logger.exception("Failed to load the chat inbox")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def rooms_unread(request):
+    """Unread count for every accessible room: {room_id: count}"""
+    try:
+        counts = unread_counts(request.user)
+        return Response({str(room_id): count for room_id, count in counts.items()})
+
+    except Exception as e:
+        logger.exception("Failed to load chat unread counts")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def room_mark_read(request, room_id):
+    """Move the read marker to message_id (default: the latest message)"""
+    try:
+        room = get_object_or_404(accessible_rooms(request.user), id=room_id)
+        changed = mark_read(request.user, room.id, request.data.get('message_id'))
+        return Response({'ok': True, 'changed': changed})
+
+    except Exception as e:
+        logger.exception("Failed to mark chat room %s read", room_id)
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def room_online(request, room_id):
+    """Users with a live websocket connection in the room"""
+    try:
+        room = get_object_or_404(accessible_rooms(request.user), id=room_id)
+        return Response({'room': str(room.id), 'users': describe_online(f"chat:{room.id}")})
+
+    except Exception as e:
+        logger.exception("Failed to list who is online in chat room %s", room_id)
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def company_online(request):
+    """Users of the requester's company connected to chat"""
+    try:
+        identity = get_request_identity(request)
+        if identity is None or not identity.company_id:
+            return Response({'detail': 'no company'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'users': describe_online(f"company:{identity.company_id}")})
+
+    except Exception as e:
+        logger.exception("Failed to list who is online in the company")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def room_messages(request, room_id):
@@ -76,7 +134,7 @@ def room_messages(request, room_id):
             if not (user_is_team_member(user, room.team) or user_is_admin(user)):
                 return Response({'detail': 'forbidden'}, status=status.HTTP_403_FORBIDDEN)
         
-        qs = Message.objects.filter(room=room)
+        qs = Message.objects.filter(room=room).select_related('sender')
         if before:
             qs = qs.filter(created_at__lt=before)
         
@@ -93,6 +151,56 @@ def room_messages(request, room_id):
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def room_history(request, room_id):
+    """
+    Room history with (created_at, id) keyset cursors.
+    ?before=<cursor> pages back, ?after=<cursor> pages forward, neither gives
+    the latest page. Each message carries sender_id; sender details are in
+    'senders', once per user per page.
+    """
+    try:
+        user = request.user
+        limit = max(1, min(int(request.GET.get('limit', 50)), 200))
+
+        room = get_object_or_404(ChatRoom, id=room_id)
+
+        if room.room_type != 'company':
+            if not (user_is_team_member(user, room.team) or user_is_admin(user)):
+                return Response({'detail': 'forbidden'}, status=status.HTTP_403_FORBIDDEN)
+
+        qs = Message.objects.filter(room=room).select_related('sender').only(
+            'id', 'room', 'content', 'metadata', 'created_at',
+            'sender__id', 'sender__username', 'sender__first_name', 'sender__last_name',
+        )
+        before = request.GET.get('before')
+        after = request.GET.get('after')
+        msgs, has_more = paginate_messages(qs, before=before, after=after, limit=limit)
+
+        if after:
+            has_more_before, has_more_after = True, has_more
+        else:
+            has_more_before, has_more_after = has_more, bool(before)
+
+        return Response({
+            'messages': MessageCompactSerializer(msgs, many=True).data,
+            'senders': build_sender_map(msgs),
+            # Cursor of the oldest message, for the next page back
+            'before_cursor': encode_cursor(msgs[0]) if msgs and has_more_before else None,
+            # Cursor of the newest message, for polling / catching up
+            'after_cursor': encode_cursor(msgs[-1]) if msgs else after,
+            'has_more_before': has_more_before,
+            'has_more_after': has_more_after,
+        })
+
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.exception("Failed to load history of chat room %s", room_id)
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def post_message(request, room_id):
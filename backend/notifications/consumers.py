@@ -0,0 +1,61 @@
+# backend/notifications/consumers.py
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.contrib.auth.models import AnonymousUser
+
+from users.identity import resolve_identity
+from .realtime import get_unread_counts, user_group_name
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Per-user notification stream (ws/notifications/).
+    Authenticated by JwtAuthMiddleware. Server pushes:
+      {action: 'notification', payload: [...], unread_count: N}
+      {action: 'unread_count', unread_count: N}
+    Clients may send {action: 'unread_count'} to resync.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user', None)
+        if user is None or user == AnonymousUser():
+            await self.close(code=4001)
+            return
+
+        identity = await database_sync_to_async(resolve_identity)(user)
+        if identity is None or identity.app_user_id is None:
+            # Only public.users members receive notifications
+            await self.close(code=4004)
+            return
+
+        self.user_id = identity.app_user_id
+        self.group_name = user_group_name(self.user_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_unread_count()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action')
+        if action == 'unread_count':
+            await self.send_unread_count()
+        else:
+            await self.send_json({'error': 'unknown_action'})
+
+    async def send_unread_count(self):
+        counts = await database_sync_to_async(get_unread_counts)([self.user_id])
+        await self.send_json({'action': 'unread_count', 'unread_count': counts[self.user_id]})
+
+    async def notification_created(self, event):
+        await self.send_json({
+            'action': 'notification',
+            'payload': event['notifications'],
+            'unread_count': event['unread_count'],
+        })
+
+    async def notification_unread_count(self, event):
+        await self.send_json({'action': 'unread_count', 'unread_count': event['unread_count']})
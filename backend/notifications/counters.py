@@ -0,0 +1,167 @@
+# backend/notifications/counters.py - Materialized per-user notification counts
+
+import logging
+import uuid
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+
+from .models import Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+
+def _uuid(value):
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+def _count_live(user_ids):
+    """Real (total, unread) per user from the notifications table, one grouped query"""
+    rows = (
+        Notification.objects.filter(user_id__in=user_ids, deleted_at__isnull=True)
+        .values('user_id')
+        .annotate(total=Count('id'), unread=Count('id', filter=Q(read=False)))
+    )
+    counts = {user_id: (0, 0) for user_id in user_ids}
+    counts.update({row['user_id']: (row['total'], row['unread']) for row in rows})
+    return counts
+
+
+def _store(counts):
+    NotificationCounter.objects.bulk_create(
+        [
+            NotificationCounter(user_id=user_id, total_count=total, unread_count=unread)
+            for user_id, (total, unread) in counts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['user_id'],
+        update_fields=['total_count', 'unread_count', 'updated_at'],
+    )
+
+
+def recount(user_ids):
+    """Rebuild counters for these users from the notifications table"""
+    user_ids = [_uuid(user_id) for user_id in user_ids]
+    if not user_ids:
+        return {}
+    counts = _count_live(user_ids)
+    _store(counts)
+    return counts
+
+
+def get_counts(user_ids):
+    """(total, unread) per user, keyed by UUID. Users without a counter row are seeded."""
+    user_ids = [_uuid(user_id) for user_id in user_ids]
+    counts = {
+        user_id: (total, unread)
+        for user_id, total, unread in NotificationCounter.objects.filter(
+            user_id__in=user_ids
+        ).values_list('user_id', 'total_count', 'unread_count')
+    }
+    missing = [user_id for user_id in user_ids if user_id not in counts]
+    if missing:
+        counts.update(recount(missing))
+    return counts
+
+
+def get_unread_count(user_id):
+    return get_counts([user_id])[_uuid(user_id)][1]
+
+
+def _apply(deltas):
+    """
+    Apply {user_id: (total_delta, unread_delta)} to the counters.
+    One lookup for which rows exist, one UPDATE per distinct delta (fan-outs
+    usually share one), and one recount for users without a counter row.
+    Call after the notification rows have been written, in the same transaction.
+    """
+    deltas = {_uuid(user_id): delta for user_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    existing = set(
+        NotificationCounter.objects.filter(user_id__in=deltas).values_list('user_id', flat=True)
+    )
+    by_delta = {}
+    for user_id in existing:
+        by_delta.setdefault(deltas[user_id], []).append(user_id)
+    for (total, unread), user_ids in by_delta.items():
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(
+            total_count=Greatest(F('total_count') + total, 0),
+            unread_count=Greatest(F('unread_count') + unread, 0),
+        )
+
+    # Seeding from the table already includes the rows just written
+    missing = [user_id for user_id in deltas if user_id not in existing]
+    if missing:
+        recount(missing)
+
+
+def adjust(user_ids, total=0, unread=0):
+    """Apply the same delta to several users' counters"""
+    _apply({user_id: (total, unread) for user_id in user_ids})
+
+
+def record_created(notifications):
+    """Count freshly inserted (unread) notifications against their recipients"""
+    per_user = {}
+    for notification in notifications:
+        user_id = _uuid(notification.user_id)
+        per_user[user_id] = per_user.get(user_id, 0) + 1
+    _apply({user_id: (n, n) for user_id, n in per_user.items()})
+
+
+def record_removed(notifications):
+    """
+    Count notifications physically removed from the hot table (e.g. archived).
+    Accepts model instances or dicts with user_id, read and deleted_at.
+    Soft-deleted rows were already uncounted.
+    """
+    deltas = {}
+    for notification in notifications:
+        if isinstance(notification, dict):
+            user_id, read, deleted_at = notification['user_id'], notification['read'], notification['deleted_at']
+        else:
+            user_id, read, deleted_at = notification.user_id, notification.read, notification.deleted_at
+        if deleted_at is not None:
+            continue
+        total, unread = deltas.get(_uuid(user_id), (0, 0))
+        deltas[_uuid(user_id)] = (total - 1, unread - (0 if read else 1))
+    _apply(deltas)
+
+
+def reconcile(user_ids=None, batch_size=1000):
+    """
+    Compare counters with the notifications table and fix any drift.
+    Covers every user with notifications or a counter row unless user_ids is given.
+    Each batch locks its counter rows before counting, so a delta applied
+    concurrently either lands before the count (and is seen by it) or waits
+    and applies on top of the corrected value.
+    Returns the number of counters corrected.
+    """
+    if user_ids is None:
+        user_ids = set(Notification.objects.values_list('user_id', flat=True).distinct())
+        user_ids.update(NotificationCounter.objects.values_list('user_id', flat=True))
+    user_ids = sorted(_uuid(user_id) for user_id in user_ids)
+
+    corrected = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        with transaction.atomic():
+            stored = {
+                user_id: (total, unread)
+                for user_id, total, unread in NotificationCounter.objects.select_for_update()
+                .filter(user_id__in=batch)
+                .order_by('user_id')
+                .values_list('user_id', 'total_count', 'unread_count')
+            }
+            actual = _count_live(batch)
+            drifted = {user_id: counts for user_id, counts in actual.items() if stored.get(user_id) != counts}
+            if drifted:
+                _store(drifted)
+                corrected += len(drifted)
+
+    if corrected:
+        logger.info("Reconciled %d notification counter(s)", corrected)
+    return corrected
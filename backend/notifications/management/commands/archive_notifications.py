@@ -0,0 +1,34 @@
+# backend/notifications/management/commands/archive_notifications.py
+
+from django.core.management.base import BaseCommand
+
+from notifications.retention import archivable, archive_notifications, ensure_archive_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Move read and soft-deleted notifications older than the retention window "
+        "into notifications_archive, in chunked transactions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--read-days', type=int, help='Archive read notifications older than this (default: NOTIFICATION_RETENTION_READ_DAYS)')
+        parser.add_argument('--deleted-days', type=int, help='Archive soft-deleted notifications older than this (default: NOTIFICATION_RETENTION_DELETED_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Rows moved per transaction (default: NOTIFICATION_ARCHIVE_BATCH_SIZE)')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would be archived')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable(options['read_days'], options['deleted_days']).count()
+            self.stdout.write(f"{count} notification(s) would be archived")
+            return
+
+        ensure_archive_partitions()
+        moved = archive_notifications(
+            read_days=options['read_days'],
+            deleted_days=options['deleted_days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{moved} notification(s) archived"))
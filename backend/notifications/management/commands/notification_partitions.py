@@ -0,0 +1,48 @@
+# backend/notifications/management/commands/notification_partitions.py
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from notifications.retention import (
+    archive_is_partitioned,
+    drop_archive_partitions,
+    ensure_archive_partitions,
+    partition_archive_table,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage monthly range partitions of notifications_archive on created_at "
+        "(PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Convert the archive table to a partitioned table')
+        parser.add_argument('--months-ahead', type=int, help='Future monthly partitions to keep ready (default: NOTIFICATION_ARCHIVE_PARTITIONS_AHEAD)')
+        parser.add_argument('--drop-before', help='Drop archive partitions for months before YYYY-MM')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning is only supported on PostgreSQL")
+
+        if options['convert']:
+            created = partition_archive_table(options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS(f"Archive table partitioned ({len(created)} monthly partitions)"))
+        elif not archive_is_partitioned():
+            raise CommandError("notifications_archive is not partitioned; run with --convert first")
+        else:
+            created = ensure_archive_partitions(options['months_ahead'])
+            self.stdout.write(f"{len(created)} monthly partition(s) present")
+
+        if options['drop_before']:
+            try:
+                before = timezone.make_aware(datetime.strptime(options['drop_before'], '%Y-%m'))
+            except ValueError:
+                raise CommandError("--drop-before must be YYYY-MM")
+            dropped = drop_archive_partitions(before)
+            for name in dropped:
+                self.stdout.write(f"Dropped {name}")
@@ -0,0 +1,26 @@
+# backend/notifications/management/commands/reconcile_notification_counters.py
+
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recount notification_counters from the notifications table and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', action='append', dest='user_ids', help='Only reconcile this user (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users recounted per grouped query')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if user_ids:
+            try:
+                user_ids = [uuid.UUID(user_id) for user_id in user_ids]
+            except ValueError:
+                raise CommandError("--user-id must be a UUID")
+
+        corrected = reconcile(user_ids=user_ids, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{corrected} counter(s) corrected"))
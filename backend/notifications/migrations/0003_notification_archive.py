@@ -0,0 +1,38 @@
+# Generated by Django 4.2.8 on 2026-10-17 06:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_notification_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('user_id', models.UUIDField()),
+                ('company_id', models.UUIDField()),
+                ('type', models.CharField(choices=[('task_assigned', 'Task Assigned'), ('status_changed', 'Status Changed'), ('timeline_updated', 'Timeline Updated'), ('priority_updated', 'Priority Updated'), ('comment_added', 'Comment Added')], max_length=50)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('related_task_id', models.UUIDField(blank=True, null=True)),
+                ('related_task_title', models.CharField(blank=True, max_length=255, null=True)),
+                ('triggered_by', models.UUIDField(blank=True, null=True)),
+                ('read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'notifications_archive',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user_id', '-created_at'], name='notif_archive_user_idx')],
+            },
+        ),
+    ]
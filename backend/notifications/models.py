@@ -73,4 +73,53 @@ class Notification(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.get_type_display()} - {self.title}"
\ No newline at end of file
+        return f"{self.get_type_display()} - {self.title}"
+
+
+class NotificationCounter(models.Model):
+    """
+    Materialized per-user notification counts (excluding soft-deleted rows)
+    Kept in step by notifications.counters; reconciled periodically
+    """
+    user_id = models.UUIDField(primary_key=True)
+    total_count = models.IntegerField(default=0)
+    unread_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'notification_counters'
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread_count}/{self.total_count} unread"
+
+
+class ArchivedNotification(models.Model):
+    """
+    Cold storage for read / soft-deleted notifications moved out of the hot table
+    See notifications.retention; on PostgreSQL the table can be range partitioned
+    by month on created_at (manage.py notification_partitions)
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    user_id = models.UUIDField()
+    company_id = models.UUIDField()
+    type = models.CharField(max_length=50, choices=Notification.TYPE_CHOICES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    related_task_id = models.UUIDField(null=True, blank=True)
+    related_task_title = models.CharField(max_length=255, null=True, blank=True)
+    triggered_by = models.UUIDField(null=True, blank=True)
+    read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'notifications_archive'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user_id', '-created_at'], name='notif_archive_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_type_display()} - {self.title} (archived)"
@@ -0,0 +1,68 @@
+# backend/notifications/realtime.py - Push notifications over Channels
+
+import json
+import logging
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from .counters import get_counts
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def user_group_name(user_id):
+    """Channel-layer group for one public.users member"""
+    return f"notifications_{user_id}"
+
+
+def get_unread_counts(user_ids):
+    """Unread counts for several users from their materialized counters, keyed by UUID"""
+    return {user_id: unread for user_id, (total, unread) in get_counts(user_ids).items()}
+
+
+def _group_send(user_id, event):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(user_group_name(user_id), event)
+    except Exception:
+        # Push is best effort; clients can always fall back to the REST endpoints
+        logger.exception("Failed to push notification event to user %s", user_id)
+
+
+def push_new_notifications(notifications):
+    """Send freshly created notifications and the new unread count to each recipient"""
+    by_user = {}
+    for notification in notifications:
+        by_user.setdefault(uuid.UUID(str(notification.user_id)), []).append(notification)
+    if not by_user:
+        return
+
+    unread_counts = get_unread_counts(list(by_user))
+    for user_id, rows in by_user.items():
+        payload = json.loads(json.dumps(NotificationSerializer(rows, many=True).data, cls=JSONEncoder))
+        _group_send(user_id, {
+            'type': 'notification.created',
+            'notifications': payload,
+            'unread_count': unread_counts[user_id],
+        })
+
+
+def push_unread_count(user_id, unread_count):
+    _group_send(user_id, {
+        'type': 'notification.unread_count',
+        'unread_count': unread_count,
+    })
+
+
+def push_unread_count_on_commit(user_id):
+    """Push the current unread count once the request transaction has committed"""
+    def push():
+        push_unread_count(user_id, get_unread_counts([user_id])[user_id])
+    transaction.on_commit(push)
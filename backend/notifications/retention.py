@@ -0,0 +1,214 @@
+# backend/notifications/retention.py - Move old notifications out of the hot table
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .counters import record_removed
+from .models import ArchivedNotification, Notification
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = [
+    'id', 'user_id', 'company_id', 'type', 'title', 'message', 'related_task_id',
+    'related_task_title', 'triggered_by', 'read', 'created_at', 'read_at', 'deleted_at',
+]
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def archivable(read_days=None, deleted_days=None, now=None):
+    """
+    Notifications eligible for archiving:
+    read ones created more than read_days ago, and soft-deleted ones
+    deleted more than deleted_days ago
+    """
+    now = now or timezone.now()
+    if read_days is None:
+        read_days = _setting('NOTIFICATION_RETENTION_READ_DAYS', 90)
+    if deleted_days is None:
+        deleted_days = _setting('NOTIFICATION_RETENTION_DELETED_DAYS', 30)
+
+    return Notification.objects.filter(
+        Q(read=True, created_at__lt=now - timedelta(days=read_days))
+        | Q(deleted_at__lt=now - timedelta(days=deleted_days))
+    )
+
+
+def archive_batch(queryset, batch_size):
+    """
+    Copy one chunk into notifications_archive and delete it from the hot
+    table in a single transaction. Returns the number of rows moved.
+    """
+    with transaction.atomic():
+        # skip_locked lets several workers archive concurrently on PostgreSQL;
+        # backends without SELECT ... FOR UPDATE ignore it
+        rows = list(
+            queryset.order_by('created_at')
+            .select_for_update(skip_locked=True)
+            .values(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        now = timezone.now()
+        ArchivedNotification.objects.bulk_create(
+            [ArchivedNotification(archived_at=now, **row) for row in rows],
+            ignore_conflicts=True,
+        )
+        Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        record_removed(rows)
+    return len(rows)
+
+
+def archive_notifications(read_days=None, deleted_days=None, batch_size=None, max_batches=None):
+    """
+    Move every archivable notification in chunks of batch_size.
+    Each chunk commits on its own so locks stay short.
+    Returns the total number of rows moved.
+    """
+    if batch_size is None:
+        batch_size = _setting('NOTIFICATION_ARCHIVE_BATCH_SIZE', 1000)
+    queryset = archivable(read_days, deleted_days)
+
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(queryset, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+
+    if moved:
+        logger.info("Archived %d notification(s) in %d batch(es)", moved, batches)
+    return moved
+
+
+# ============================================
+# PostgreSQL monthly partitions (optional)
+# ============================================
+
+ARCHIVE_TABLE = ArchivedNotification._meta.db_table
+
+
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value):
+    return (_month_start(value) + timedelta(days=32)).replace(day=1)
+
+
+def _partition_name(month):
+    return f"{ARCHIVE_TABLE}_y{month:%Y}m{month:%m}"
+
+
+def archive_is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s",
+            [ARCHIVE_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def ensure_archive_partitions(months_ahead=None, start=None):
+    """
+    Create monthly partitions of notifications_archive from start (default:
+    this month) to months_ahead months from now. No-op unless the table is
+    partitioned. Returns the names of partitions created.
+    """
+    if not archive_is_partitioned():
+        return []
+    if months_ahead is None:
+        months_ahead = _setting('NOTIFICATION_ARCHIVE_PARTITIONS_AHEAD', 3)
+
+    now = timezone.now()
+    month = _month_start(start or now)
+    end = _month_start(now)
+    for _ in range(months_ahead):
+        end = _next_month(end)
+
+    created = []
+    with connection.cursor() as cursor:
+        while month <= end:
+            name = _partition_name(month)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{ARCHIVE_TABLE}" '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month, _next_month(month)],
+            )
+            created.append(name)
+            month = _next_month(month)
+    return created
+
+
+def partition_archive_table(months_ahead=None):
+    """
+    Convert notifications_archive into a table range partitioned by month on
+    created_at (PostgreSQL only). Existing rows are copied into the new
+    partitions; rows outside any month land in a default partition.
+    """
+    if connection.vendor != 'postgresql':
+        raise ValueError('Partitioning is only supported on PostgreSQL')
+    if archive_is_partitioned():
+        return ensure_archive_partitions(months_ahead)
+
+    legacy = f"{ARCHIVE_TABLE}_legacy"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{ARCHIVE_TABLE}" RENAME TO "{legacy}"')
+        cursor.execute(
+            f'CREATE TABLE "{ARCHIVE_TABLE}" (LIKE "{legacy}" INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f'CREATE TABLE "{ARCHIVE_TABLE}_default" PARTITION OF "{ARCHIVE_TABLE}" DEFAULT')
+        cursor.execute(f'SELECT MIN(created_at) FROM "{legacy}"')
+        oldest = cursor.fetchone()[0]
+
+        created = ensure_archive_partitions(months_ahead, start=oldest)
+        cursor.execute(f'INSERT INTO "{ARCHIVE_TABLE}" SELECT * FROM "{legacy}"')
+        # Dropping the old table frees its constraint and index names for reuse
+        cursor.execute(f'DROP TABLE "{legacy}"')
+
+        # The partition key must be part of the primary key
+        cursor.execute(
+            f'ALTER TABLE "{ARCHIVE_TABLE}" ADD CONSTRAINT "{ARCHIVE_TABLE}_pkey" '
+            f'PRIMARY KEY (id, created_at)'
+        )
+        cursor.execute(
+            f'CREATE INDEX "notif_archive_user_idx" ON "{ARCHIVE_TABLE}" (user_id, created_at DESC)'
+        )
+    return created
+
+
+def drop_archive_partitions(before):
+    """Drop whole archive months older than `before` (PostgreSQL partitions only)"""
+    if not archive_is_partitioned():
+        return []
+
+    dropped = []
+    month = _month_start(before)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [ARCHIVE_TABLE],
+        )
+        for (name,) in cursor.fetchall():
+            if name.endswith('_default') or name >= _partition_name(month):
+                continue
+            cursor.execute(f'DROP TABLE "{name}"')
+            dropped.append(name)
+    return dropped
@@ -0,0 +1,23 @@
+# backend/notifications/tasks.py - Celery tasks for notification delivery, counters and retention
+
+from celery import shared_task
+
+from .counters import reconcile
+from .retention import archive_notifications, ensure_archive_partitions
+from .utils import deliver_notifications
+
+
+@shared_task(name='notifications.deliver_notifications', ignore_result=True)
+def deliver_notifications_task(events):
+    deliver_notifications(events)
+
+
+@shared_task(name='notifications.reconcile_counters', ignore_result=True)
+def reconcile_counters_task():
+    reconcile()
+
+
+@shared_task(name='notifications.archive_notifications', ignore_result=True)
+def archive_notifications_task():
+    ensure_archive_partitions()
+    archive_notifications()
@@ -1,3 +1,277 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from types import SimpleNamespace
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User as DjangoUser
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from notifications import counters
+from notifications.models import ArchivedNotification, Notification, NotificationCounter
+from notifications.retention import archive_notifications, partition_archive_table
+from notifications.utils import NotificationService
+from users.identity import identity_cache
+from users.models import User
+from users.testing import UsersTableTestCase
+from workos.jwt_auth_middleware import JwtAuthMiddlewareStack
+from workos.routing import websocket_urlpatterns
+
+
+@override_settings(NOTIFICATION_BACKEND='sync')
+class NotificationFanOutTests(UsersTableTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company_id = uuid.uuid4()
+        cls.manager = User.objects.create(
+            id=uuid.uuid4(), email='manager@example.com', name='Manager', company_id=cls.company_id
+        )
+        cls.employees = [
+            User.objects.create(
+                id=uuid.uuid4(), email=f'e{i}@example.com', name=f'Employee {i}', company_id=cls.company_id
+            )
+            for i in range(20)
+        ]
+
+    def _task(self, assignee):
+        return SimpleNamespace(
+            id=uuid.uuid4(), title='Task', assigned_to=assignee.id, assigned_by=self.manager.id
+        )
+
+    def test_nothing_written_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            NotificationService.create_task_assigned_notification(
+                self._task(self.employees[0]), self.employees[0].id, self.manager.id, self.company_id
+            )
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_fan_out_is_one_lookup_and_one_insert(self):
+        tasks = [self._task(employee) for employee in self.employees]
+        # names lookup + bulk insert + counter seed (lookup, recount, upsert)
+        # + counter read for the push, plus the savepoint pair
+        with self.assertNumQueries(8):
+            with self.captureOnCommitCallbacks(execute=True):
+                NotificationService.create_task_assigned_notifications(tasks, self.manager.id, self.company_id)
+
+        self.assertEqual(Notification.objects.filter(user_id=self.manager.id).count(), 20)
+        self.assertEqual(NotificationCounter.objects.get(user_id=self.manager.id).unread_count, 20)
+        notification = Notification.objects.get(user_id=self.employees[3].id)
+        self.assertEqual(notification.message, 'Manager assigned you the task "Task"')
+
+    def test_status_change_skips_actor(self):
+        task = self._task(self.employees[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.create_status_changed_notification(
+                task, 'pending', 'in_progress', self.employees[0].id, self.company_id
+            )
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.user_id, self.manager.id)
+        self.assertIn('from Pending to In Progress', notification.message)
+
+
+@override_settings(NOTIFICATION_BACKEND='sync')
+class NotificationCounterTests(UsersTableTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company_id = uuid.uuid4()
+        cls.auth_user = DjangoUser.objects.create_user(
+            username='employee@example.com', email='employee@example.com', password='x'
+        )
+        cls.user = User.objects.create(
+            id=uuid.uuid4(), email='employee@example.com', name='Employee', company_id=cls.company_id
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.auth_user)
+        self.notifications = [
+            Notification.objects.create(
+                user_id=self.user.id, company_id=self.company_id, type='comment_added',
+                title='Comment Added', message=f'Comment {i}'
+            )
+            for i in range(5)
+        ]
+        counters.recount([self.user.id])
+
+    def _counts(self):
+        return counters.get_counts([self.user.id])[self.user.id]
+
+    def test_counts_read_from_counter(self):
+        self.client.get('/api/notifications/unread_count/')  # warm identity cache
+        # counter lookup inside the ATOMIC_REQUESTS savepoint pair
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/notifications/unread_count/')
+        self.assertEqual(response.data['unread_count'], 5)
+
+    def test_mark_read_and_delete(self):
+        self.client.put(f'/api/notifications/{self.notifications[0].id}/mark-read/')
+        self.client.put(f'/api/notifications/{self.notifications[0].id}/mark-read/')
+        self.assertEqual(self._counts(), (5, 4))
+
+        self.client.delete(f'/api/notifications/{self.notifications[0].id}/')
+        self.client.delete(f'/api/notifications/{self.notifications[1].id}/')
+        self.assertEqual(self._counts(), (3, 3))
+
+        self.client.put('/api/notifications/mark-all-read/')
+        self.assertEqual(self._counts(), (3, 0))
+
+    def test_reconcile_fixes_drift(self):
+        NotificationCounter.objects.filter(user_id=self.user.id).update(total_count=99, unread_count=42)
+        self.assertEqual(counters.reconcile(), 1)
+        self.assertEqual(self._counts(), (5, 5))
+        self.assertEqual(counters.reconcile(), 0)
+
+
+@override_settings(
+    NOTIFICATION_BACKEND='sync',
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+class NotificationConsumerTests(UsersTableTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company_id = uuid.uuid4()
+        cls.auth_user = DjangoUser.objects.create_user(
+            username='employee@example.com', email='employee@example.com', password='x'
+        )
+        cls.user = User.objects.create(
+            id=uuid.uuid4(), email='employee@example.com', name='Employee', company_id=cls.company_id
+        )
+        cls.manager = User.objects.create(
+            id=uuid.uuid4(), email='manager@example.com', name='Manager', company_id=cls.company_id
+        )
+        Notification.objects.create(
+            user_id=cls.user.id, company_id=cls.company_id, type='comment_added',
+            title='Comment Added', message='Comment'
+        )
+        counters.recount([cls.user.id])
+
+    def setUp(self):
+        identity_cache.clear()
+
+    def _communicator(self, auth_user=None):
+        path = '/ws/notifications/'
+        if auth_user is not None:
+            path += f'?token={AccessToken.for_user(auth_user)}'
+        return WebsocketCommunicator(JwtAuthMiddlewareStack(URLRouter(websocket_urlpatterns)), path)
+
+    def test_rejects_unauthenticated_and_unknown_users(self):
+        outsider = DjangoUser.objects.create_user(username='outsider', email='outsider@example.com')
+
+        async def scenario():
+            closes = []
+            for auth_user in (None, outsider):
+                communicator = self._communicator(auth_user)
+                connected, code = await communicator.connect()
+                closes.append((connected, code))
+            return closes
+
+        self.assertEqual(async_to_sync(scenario)(), [(False, 4001), (False, 4004)])
+
+    def test_unread_count_on_connect_and_resync(self):
+        async def scenario():
+            communicator = self._communicator(self.auth_user)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            frames = [await communicator.receive_json_from()]
+            await communicator.send_json_to({'action': 'unread_count'})
+            frames.append(await communicator.receive_json_from())
+            await communicator.send_json_to({'action': 'mark_read'})
+            frames.append(await communicator.receive_json_from())
+            await communicator.disconnect()
+            return frames
+
+        self.assertEqual(async_to_sync(scenario)(), [
+            {'action': 'unread_count', 'unread_count': 1},
+            {'action': 'unread_count', 'unread_count': 1},
+            {'error': 'unknown_action'},
+        ])
+
+    def test_push_arrives_after_commit(self):
+        task = SimpleNamespace(id=uuid.uuid4(), title='Task', assigned_to=self.user.id, assigned_by=self.manager.id)
+
+        def assign():
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                NotificationService.create_task_assigned_notification(
+                    task, self.user.id, self.manager.id, self.company_id
+                )
+            return callbacks
+
+        def commit(callbacks):
+            for callback in callbacks:
+                callback()
+
+        async def scenario():
+            communicator = self._communicator(self.auth_user)
+            await communicator.connect()
+            await communicator.receive_json_from()
+            callbacks = await database_sync_to_async(assign)()
+            nothing_before_commit = await communicator.receive_nothing()
+            await database_sync_to_async(commit)(callbacks)
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return nothing_before_commit, frame
+
+        nothing_before_commit, frame = async_to_sync(scenario)()
+        self.assertTrue(nothing_before_commit)
+        self.assertEqual(frame['action'], 'notification')
+        self.assertEqual(frame['unread_count'], 2)
+        self.assertEqual([n['type'] for n in frame['payload']], ['task_assigned'])
+
+
+class NotificationRetentionTests(TestCase):
+
+    def setUp(self):
+        self.user_id = uuid.uuid4()
+        self.company_id = uuid.uuid4()
+        old = timezone.now() - timedelta(days=120)
+
+        def make(created_at, **fields):
+            notification = Notification.objects.create(
+                user_id=self.user_id, company_id=self.company_id, type='comment_added',
+                title='Comment Added', message='Comment', **fields
+            )
+            Notification.objects.filter(id=notification.id).update(created_at=created_at)
+            return notification
+
+        self.old_read = [make(old, read=True) for _ in range(5)]
+        self.old_deleted = make(old, deleted_at=old)
+        self.old_unread = make(old)
+        self.recent_read = make(timezone.now(), read=True)
+        counters.recount([self.user_id])
+
+    def test_moves_old_read_and_deleted_in_batches(self):
+        moved = archive_notifications(read_days=90, deleted_days=30, batch_size=2)
+        self.assertEqual(moved, 6)
+
+        remaining = set(Notification.objects.values_list('id', flat=True))
+        self.assertEqual(remaining, {self.old_unread.id, self.recent_read.id})
+        archived = ArchivedNotification.objects.get(id=self.old_deleted.id)
+        self.assertIsNotNone(archived.deleted_at)
+        self.assertEqual(ArchivedNotification.objects.count(), 6)
+
+        # Only live rows were counted, so the counter drops by the five read ones
+        self.assertEqual(counters.get_counts([self.user_id])[self.user_id], (2, 1))
+        self.assertEqual(counters.reconcile([self.user_id]), 0)
+
+    def test_max_batches(self):
+        self.assertEqual(archive_notifications(read_days=90, deleted_days=30, batch_size=2, max_batches=1), 2)
+        self.assertEqual(Notification.objects.count(), 6)
+
+    def test_partitioning_needs_postgres(self):
+        with self.assertRaisesMessage(ValueError, 'only supported on PostgreSQL'):
+            partition_archive_table()
+        with self.assertRaisesMessage(CommandError, 'only supported on PostgreSQL'):
+            call_command('notification_partitions', '--convert')
@@ -1,221 +1,347 @@
 # FILE 9B: backend/notifications/utils.py - NotificationService
 
+import logging
+import threading
 import uuid
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, models, transaction
+
+from .counters import record_created
 from .models import Notification
+from .realtime import push_new_notifications
 from users.models import User
 
+logger = logging.getLogger(__name__)
+
+STATUS_DISPLAY = {
+    'pending': 'Pending',
+    'in_progress': 'In Progress',
+    'under_review': 'Under Review',
+    'completed': 'Completed',
+}
+
+PRIORITY_DISPLAY = {
+    'low': 'Low',
+    'medium': 'Medium',
+    'high': 'High',
+    'urgent': 'Urgent',
+}
+
+_uuid_field = models.UUIDField()
+
+
+def _id(value):
+    """Normalise a user/task/company id to a UUID string (JSON-safe for Celery)"""
+    if value is None:
+        return None
+    return str(_uuid_field.to_python(value))
+
+
+def _task_snapshot(task):
+    return {
+        'id': _id(task.id),
+        'title': task.title,
+        'assigned_to': _id(task.assigned_to),
+        'assigned_by': _id(task.assigned_by),
+    }
+
+
+# ============================================
+# ROW BUILDERS (run on the worker)
+# ============================================
+
+def _row(task, recipient_id, company_id, type, title, message, triggered_by):
+    return Notification(
+        id=uuid.uuid4(),
+        user_id=recipient_id,
+        company_id=company_id,
+        type=type,
+        title=title,
+        message=message,
+        related_task_id=task['id'],
+        related_task_title=task['title'],
+        triggered_by=triggered_by,
+    )
+
+
+def _build_task_assigned(task, company_id, names, assignee_id, assigner_id):
+    if assigner_id not in names or assignee_id not in names:
+        return []
+    return [
+        # Notification for assignee
+        _row(task, assignee_id, company_id, 'task_assigned', 'New Task Assigned',
+             f'{names[assigner_id]} assigned you the task "{task["title"]}"', assigner_id),
+        # Notification for assigner
+        _row(task, assigner_id, company_id, 'task_assigned', 'Task Assigned',
+             f'You assigned the task "{task["title"]}" to {names[assignee_id]}', assigner_id),
+    ]
+
+
+def _build_status_changed(task, company_id, names, old_status, new_status, changed_by_id):
+    if changed_by_id not in names:
+        return []
+    old_status_display = STATUS_DISPLAY.get(old_status, old_status)
+    new_status_display = STATUS_DISPLAY.get(new_status, new_status)
+    rows = []
+
+    # Notification for assigner (who needs to know status changed)
+    if task['assigned_by'] != changed_by_id:
+        rows.append(_row(
+            task, task['assigned_by'], company_id, 'status_changed', 'Task Status Updated',
+            f'Task "{task["title"]}" status changed from {old_status_display} to {new_status_display} by {names[changed_by_id]}',
+            changed_by_id,
+        ))
+
+    # Notification for assignee if not the one who changed it
+    if task['assigned_to'] != changed_by_id:
+        rows.append(_row(
+            task, task['assigned_to'], company_id, 'status_changed', 'Your Task Status Changed',
+            f'Task "{task["title"]}" status changed to {new_status_display} by {names[changed_by_id]}',
+            changed_by_id,
+        ))
+    return rows
+
+
+def _build_timeline_updated(task, company_id, names, old_due_date, new_due_date, updated_by_id):
+    if updated_by_id not in names:
+        return []
+    rows = [
+        # Notification for assignee
+        _row(task, task['assigned_to'], company_id, 'timeline_updated', 'Task Deadline Updated',
+             f'Task "{task["title"]}" deadline changed from {old_due_date} to {new_due_date} by {names[updated_by_id]}',
+             updated_by_id),
+    ]
+
+    # Notification for assigner if not the one who updated
+    if task['assigned_by'] != updated_by_id:
+        rows.append(_row(
+            task, task['assigned_by'], company_id, 'timeline_updated', 'Task Deadline Updated',
+            f'Task "{task["title"]}" deadline changed from {old_due_date} to {new_due_date}',
+            updated_by_id,
+        ))
+    return rows
+
+
+def _build_priority_updated(task, company_id, names, old_priority, new_priority, updated_by_id):
+    if updated_by_id not in names:
+        return []
+    old_priority_display = PRIORITY_DISPLAY.get(old_priority, old_priority)
+    new_priority_display = PRIORITY_DISPLAY.get(new_priority, new_priority)
+    rows = [
+        # Notification for assignee
+        _row(task, task['assigned_to'], company_id, 'priority_updated', 'Task Priority Updated',
+             f'Task "{task["title"]}" priority changed from {old_priority_display} to {new_priority_display} by {names[updated_by_id]}',
+             updated_by_id),
+    ]
+
+    # Notification for assigner if not the one who updated
+    if task['assigned_by'] != updated_by_id:
+        rows.append(_row(
+            task, task['assigned_by'], company_id, 'priority_updated', 'Task Priority Updated',
+            f'Task "{task["title"]}" priority changed to {new_priority_display}',
+            updated_by_id,
+        ))
+    return rows
+
+
+def _build_comment_added(task, company_id, names, comment_id, commented_by_id):
+    if commented_by_id not in names:
+        return []
+    message = f'{names[commented_by_id]} commented on task "{task["title"]}"'
+    rows = []
+
+    # Notification for assignee if not the commenter
+    if task['assigned_to'] != commented_by_id:
+        rows.append(_row(task, task['assigned_to'], company_id, 'comment_added', 'Comment Added',
+                         message, commented_by_id))
+
+    # Notification for assigner if not the commenter
+    if task['assigned_by'] != commented_by_id:
+        rows.append(_row(task, task['assigned_by'], company_id, 'comment_added', 'Comment Added',
+                         message, commented_by_id))
+    return rows
+
+
+BUILDERS = {
+    'task_assigned': _build_task_assigned,
+    'status_changed': _build_status_changed,
+    'timeline_updated': _build_timeline_updated,
+    'priority_updated': _build_priority_updated,
+    'comment_added': _build_comment_added,
+}
+
+
+def deliver_notifications(events):
+    """
+    Build every recipient row for a batch of events and write them at once:
+    one users query for all actor names, one bulk_create for all rows.
+    Recipients' unread counters are bumped in the same transaction.
+    """
+    user_ids = set()
+    for event in events:
+        user_ids.update(
+            value for key, value in event['kwargs'].items()
+            if key.endswith('_id') and key != 'comment_id' and value
+        )
+
+    names = {
+        str(user_id): name
+        for user_id, name in User.objects.filter(id__in=user_ids).values_list('id', 'name')
+    }
+
+    rows = []
+    for event in events:
+        builder = BUILDERS[event['type']]
+        rows.extend(builder(event['task'], event['company_id'], names, **event['kwargs']))
+
+    if rows:
+        with transaction.atomic():
+            Notification.objects.bulk_create(rows)
+            record_created(rows)
+        push_new_notifications(rows)
+    return rows
+
+
+# ============================================
+# DISPATCH
+# ============================================
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'NOTIFICATION_THREAD_WORKERS', 2),
+                thread_name_prefix='notifications',
+            )
+        return _executor
+
+
+def _deliver_in_thread(events):
+    close_old_connections()
+    try:
+        deliver_notifications(events)
+    except Exception:
+        logger.exception("Error delivering %d notification event(s)", len(events))
+    finally:
+        close_old_connections()
+
+
+def _submit(events):
+    backend = getattr(settings, 'NOTIFICATION_BACKEND', 'thread')
+
+    if backend == 'celery':
+        try:
+            from .tasks import deliver_notifications_task
+            deliver_notifications_task.delay(events)
+            return
+        except Exception:
+            logger.exception("Celery unavailable, delivering notifications in-process")
+        backend = 'thread'
+
+    if backend == 'thread':
+        _get_executor().submit(_deliver_in_thread, events)
+        return
+
+    # 'sync': deliver inline (tests, management commands)
+    try:
+        deliver_notifications(events)
+    except Exception:
+        logger.exception("Error delivering %d notification event(s)", len(events))
+
+
+def enqueue_notifications(events):
+    """Deliver events on a background worker once the current transaction commits"""
+    if events:
+        transaction.on_commit(lambda: _submit(events))
+
+
+def _event(type, task, company_id, **kwargs):
+    return {
+        'type': type,
+        'task': _task_snapshot(task),
+        'company_id': _id(company_id),
+        'kwargs': {
+            key: _id(value) if key.endswith('_id') else value
+            for key, value in kwargs.items()
+        },
+    }
+
 
 class NotificationService:
     """
     Service class to handle all notification creation
-    Called from task views when events occur
+    Called from task views when events occur.
+    Rows are built and written after commit on a background worker
+    (NOTIFICATION_BACKEND: 'celery', 'thread' or 'sync').
     """
-    
+
     @staticmethod
     def create_task_assigned_notification(task, assignee_id: uuid.UUID, assigner_id: uuid.UUID, company_id: uuid.UUID):
         """
         Create notification when task is assigned
         Sends to: assignee and assigner
         """
-        try:
-            assigner = User.objects.get(id=assigner_id)
-            assignee = User.objects.get(id=assignee_id)
-            
-            # Notification for assignee
-            Notification.objects.create(
-                id=uuid.uuid4(),
-                user_id=assignee_id,
-                company_id=company_id,
-                type='task_assigned',
-                title=f'New Task Assigned',
-                message=f'{assigner.name} assigned you the task "{task.title}"',
-                related_task_id=task.id,
-                related_task_title=task.title,
-                triggered_by=assigner_id
-            )
-            
-            # Notification for assigner
-            Notification.objects.create(
-                id=uuid.uuid4(),
-                user_id=assigner_id,
-                company_id=company_id,
-                type='task_assigned',
-                title=f'Task Assigned',
-                message=f'You assigned the task "{task.title}" to {assignee.name}',
-                related_task_id=task.id,
-                related_task_title=task.title,
-                triggered_by=assigner_id
-            )
-        except User.DoesNotExist:
-            pass
-        except Exception as e:
-            print(f"Error creating task assigned notification: {e}")
-    
+        enqueue_notifications([
+            _event('task_assigned', task, company_id, assignee_id=assignee_id, assigner_id=assigner_id)
+        ])
+
+    @staticmethod
+    def create_task_assigned_notifications(tasks, assigner_id: uuid.UUID, company_id: uuid.UUID):
+        """
+        Batch version for bulk task creation
+        All tasks are delivered in one worker job
+        """
+        enqueue_notifications([
+            _event('task_assigned', task, company_id, assignee_id=task.assigned_to, assigner_id=assigner_id)
+            for task in tasks
+        ])
+
     @staticmethod
     def create_status_changed_notification(task, old_status: str, new_status: str, changed_by_id: uuid.UUID, company_id: uuid.UUID):
         """
         Create notification when task status changes
         Sends to: assignee and assigner
         """
-        try:
-            changed_by = User.objects.get(id=changed_by_id)
-            
-            old_status_display = dict(task.STATUS_CHOICES).get(old_status, old_status)
-            new_status_display = dict(task.STATUS_CHOICES).get(new_status, new_status)
-            
-            # Notification for assigner (who needs to know status changed)
-            if task.assigned_by != changed_by_id:
-                Notification.objects.create(
-                    id=uuid.uuid4(),
-                    user_id=task.assigned_by,
-                    company_id=company_id,
-                    type='status_changed',
-                    title=f'Task Status Updated',
-                    message=f'Task "{task.title}" status changed from {old_status_display} to {new_status_display} by {changed_by.name}',
-                    related_task_id=task.id,
-                    related_task_title=task.title,
-                    triggered_by=changed_by_id
-                )
-            
-            # Notification for assignee if not the one who changed it
-            if task.assigned_to != changed_by_id:
-                Notification.objects.create(
-                    id=uuid.uuid4(),
-                    user_id=task.assigned_to,
-                    company_id=company_id,
-                    type='status_changed',
-                    title=f'Your Task Status Changed',
-                    message=f'Task "{task.title}" status changed to {new_status_display} by {changed_by.name}',
-                    related_task_id=task.id,
-                    related_task_title=task.title,
-                    triggered_by=changed_by_id
-                )
-        except User.DoesNotExist:
-            pass
-        except Exception as e:
-            print(f"Error creating status changed notification: {e}")
-    
+        enqueue_notifications([
+            _event('status_changed', task, company_id,
+                   old_status=old_status, new_status=new_status, changed_by_id=changed_by_id)
+        ])
+
     @staticmethod
     def create_timeline_updated_notification(task, old_due_date: str, new_due_date: str, updated_by_id: uuid.UUID, company_id: uuid.UUID):
         """
         Create notification when task timeline/due_date changes
         Sends to: assignee and assigner
         """
-        try:
-            updated_by = User.objects.get(id=updated_by_id)
-            
-            # Notification for assignee
-            Notification.objects.create(
-                id=uuid.uuid4(),
-                user_id=task.assigned_to,
-                company_id=company_id,
-                type='timeline_updated',
-                title=f'Task Deadline Updated',
-                message=f'Task "{task.title}" deadline changed from {old_due_date} to {new_due_date} by {updated_by.name}',
-                related_task_id=task.id,
-                related_task_title=task.title,
-                triggered_by=updated_by_id
-            )
-            
-            # Notification for assigner if not the one who updated
-            if task.assigned_by != updated_by_id:
-                Notification.objects.create(
-                    id=uuid.uuid4(),
-                    user_id=task.assigned_by,
-                    company_id=company_id,
-                    type='timeline_updated',
-                    title=f'Task Deadline Updated',
-                    message=f'Task "{task.title}" deadline changed from {old_due_date} to {new_due_date}',
-                    related_task_id=task.id,
-                    related_task_title=task.title,
-                    triggered_by=updated_by_id
-                )
-        except User.DoesNotExist:
-            pass
-        except Exception as e:
-            print(f"Error creating timeline updated notification: {e}")
-    
+        enqueue_notifications([
+            _event('timeline_updated', task, company_id,
+                   old_due_date=str(old_due_date), new_due_date=str(new_due_date), updated_by_id=updated_by_id)
+        ])
+
     @staticmethod
     def create_priority_updated_notification(task, old_priority: str, new_priority: str, updated_by_id: uuid.UUID, company_id: uuid.UUID):
         """
         Create notification when task priority changes
         Sends to: assignee and assigner
         """
-        try:
-            updated_by = User.objects.get(id=updated_by_id)
-            
-            old_priority_display = dict(task.PRIORITY_CHOICES).get(old_priority, old_priority)
-            new_priority_display = dict(task.PRIORITY_CHOICES).get(new_priority, new_priority)
-            
-            # Notification for assignee
-            Notification.objects.create(
-                id=uuid.uuid4(),
-                user_id=task.assigned_to,
-                company_id=company_id,
-                type='priority_updated',
-                title=f'Task Priority Updated',
-                message=f'Task "{task.title}" priority changed from {old_priority_display} to {new_priority_display} by {updated_by.name}',
-                related_task_id=task.id,
-                related_task_title=task.title,
-                triggered_by=updated_by_id
-            )
-            
-            # Notification for assigner if not the one who updated
-            if task.assigned_by != updated_by_id:
-                Notification.objects.create(
-                    id=uuid.uuid4(),
-                    user_id=task.assigned_by,
-                    company_id=company_id,
-                    type='priority_updated',
-                    title=f'Task Priority Updated',
-                    message=f'Task "{task.title}" priority changed to {new_priority_display}',
-                    related_task_id=task.id,
-                    related_task_title=task.title,
-                    triggered_by=updated_by_id
-                )
-        except User.DoesNotExist:
-            pass
-        except Exception as e:
-            print(f"Error creating priority updated notification: {e}")
-    
+        enqueue_notifications([
+            _event('priority_updated', task, company_id,
+                   old_priority=old_priority, new_priority=new_priority, updated_by_id=updated_by_id)
+        ])
+
     @staticmethod
     def create_comment_added_notification(task, comment_id: uuid.UUID, commented_by_id: uuid.UUID, company_id: uuid.UUID):
         """
         Create notification when comment is added to task
-        Sends to: assignee, assigner, and other commenters (except commenter)
+        Sends to: assignee and assigner (except commenter)
         """
-        try:
-            commented_by = User.objects.get(id=commented_by_id)
-            
-            # Notification for assignee if not the commenter
-            if task.assigned_to != commented_by_id:
-                Notification.objects.create(
-                    id=uuid.uuid4(),
-                    user_id=task.assigned_to,
-                    company_id=company_id,
-                    type='comment_added',
-                    title=f'Comment Added',
-                    message=f'{commented_by.name} commented on task "{task.title}"',
-                    related_task_id=task.id,
-                    related_task_title=task.title,
-                    triggered_by=commented_by_id
-                )
-            
-            # Notification for assigner if not the commenter
-            if task.assigned_by != commented_by_id:
-                Notification.objects.create(
-                    id=uuid.uuid4(),
-                    user_id=task.assigned_by,
-                    company_id=company_id,
-                    type='comment_added',
-                    title=f'Comment Added',
-                    message=f'{commented_by.name} commented on task "{task.title}"',
-                    related_task_id=task.id,
-                    related_task_title=task.title,
-                    triggered_by=commented_by_id
-                )
-        except User.DoesNotExist:
-            pass
-        except Exception as e:
-            print(f"Error creating comment added notification: {e}")
\ No newline at end of file
+        enqueue_notifications([
+            _event('comment_added', task, company_id, comment_id=comment_id, commented_by_id=commented_by_id)
+        ])
@@ -5,9 +5,23 @@ from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
 from django.db.models import Q
 
+from notifications import counters
 from notifications.models import Notification
 from notifications.serializers import NotificationSerializer
+from notifications.realtime import push_unread_count_on_commit
 from users.models import User
+from users.identity import get_request_identity
+
+
+def get_notification_user(request):
+    """
+    Resolve the requesting public.users member from the cached request identity,
+    whatever the caller's role: a company admin with a users row gets that row.
+    """
+    user = get_request_identity(request, prefer_app_user=True)
+    if user is None or user.app_user_id is None:
+        raise User.DoesNotExist
+    return user
 
 
 class NotificationListView(APIView):
@@ -16,11 +30,11 @@ class NotificationListView(APIView):
 
     def get(self, request):
         try:
-            user = User.objects.get(email=request.user.email)
+            user = get_notification_user(request)
             
             # Get all notifications for user, excluding deleted
             notifications = Notification.objects.filter(
-                user=user,
+                user_id=user.id,
                 deleted_at__isnull=True
             ).order_by('-created_at')
             
@@ -33,15 +47,16 @@ class NotificationListView(APIView):
             
             paginated_notifications = notifications[start_idx:end_idx]
             serializer = NotificationSerializer(paginated_notifications, many=True)
+            total_count, unread_count = counters.get_counts([user.id])[user.id]
             
             return Response(
                 {
                     'success': True,
                     'data': serializer.data,
-                    'count': notifications.count(),
+                    'count': total_count,
                     'page': page,
                     'page_size': page_size,
-                    'unread_count': notifications.filter(read=False).count()
+                    'unread_count': unread_count
                 },
                 status=status.HTTP_200_OK
             )
@@ -64,16 +79,24 @@ class NotificationMarkReadView(APIView):
 
     def put(self, request, pk):
         try:
-            user = User.objects.get(email=request.user.email)
+            user = get_notification_user(request)
             
             notification = Notification.objects.get(
                 id=pk,
-                user=user
+                user_id=user.id
             )
             
-            notification.read = True
-            notification.read_at = timezone.now()
-            notification.save()
+            if not notification.read:
+                notification.read = True
+                notification.read_at = timezone.now()
+                # Conditional update so concurrent requests decrement only once
+                marked = Notification.objects.filter(id=notification.id, read=False).update(
+                    read=True,
+                    read_at=notification.read_at
+                )
+                if marked and notification.deleted_at is None:
+                    counters.adjust([user.id], unread=-1)
+                    push_unread_count_on_commit(user.id)
             
             serializer = NotificationSerializer(notification)
             return Response(
@@ -104,20 +127,21 @@ class NotificationMarkAllReadView(APIView):
 
     def put(self, request):
         try:
-            user = User.objects.get(email=request.user.email)
+            user = get_notification_user(request)
             
             unread_notifications = Notification.objects.filter(
-                user=user,
+                user_id=user.id,
                 read=False,
                 deleted_at__isnull=True
             )
             
-            unread_notifications.update(
+            count = unread_notifications.update(
                 read=True,
                 read_at=timezone.now()
             )
-            
-            count = unread_notifications.count()
+            if count:
+                counters.adjust([user.id], unread=-count)
+                push_unread_count_on_commit(user.id)
             
             return Response(
                 {
@@ -145,15 +169,19 @@ class NotificationDeleteView(APIView):
 
     def delete(self, request, pk):
         try:
-            user = User.objects.get(email=request.user.email)
+            user = get_notification_user(request)
             
             notification = Notification.objects.get(
                 id=pk,
-                user=user
+                user_id=user.id
             )
             
-            notification.deleted_at = timezone.now()
-            notification.save()
+            deleted = Notification.objects.filter(id=notification.id, deleted_at__isnull=True).update(
+                deleted_at=timezone.now()
+            )
+            if deleted:
+                counters.adjust([user.id], total=-1, unread=0 if notification.read else -1)
+                push_unread_count_on_commit(user.id)
             
             return Response(
                 {'success': True, 'message': 'Notification deleted'},
@@ -183,13 +211,9 @@ class NotificationUnreadCountView(APIView):
 
     def get(self, request):
         try:
-            user = User.objects.get(email=request.user.email)
+            user = get_notification_user(request)
             
-            unread_count = Notification.objects.filter(
-                user=user,
-                read=False,
-                deleted_at__isnull=True
-            ).count()
+            unread_count = counters.get_unread_count(user.id)
             
             return Response(
                 {'success': True, 'unread_count': unread_count},
@@ -214,7 +238,7 @@ class NotificationByTypeView(APIView):
 
     def get(self, request):
         try:
-            user = User.objects.get(email=request.user.email)
+            user = get_notification_user(request)
             notification_type = request.query_params.get('type')
             
             if not notification_type:
@@ -224,7 +248,7 @@ class NotificationByTypeView(APIView):
                 )
             
             notifications = Notification.objects.filter(
-                user=user,
+                user_id=user.id,
                 type=notification_type,
                 deleted_at__isnull=True
             ).order_by('-created_at')
@@ -236,7 +260,7 @@ class NotificationByTypeView(APIView):
                     'success': True,
                     'type': notification_type,
                     'data': serializer.data,
-                    'count': notifications.count()
+                    'count': len(serializer.data)
                 },
                 status=status.HTTP_200_OK
             )
@@ -259,10 +283,10 @@ class NotificationUnreadView(APIView):
 
     def get(self, request):
         try:
-            user = User.objects.get(email=request.user.email)
+            user = get_notification_user(request)
             
             notifications = Notification.objects.filter(
-                user=user,
+                user_id=user.id,
                 read=False,
                 deleted_at__isnull=True
             ).order_by('-created_at')
@@ -273,7 +297,7 @@ class NotificationUnreadView(APIView):
                 {
                     'success': True,
                     'data': serializer.data,
-                    'count': notifications.count()
+                    'count': len(serializer.data)
                 },
                 status=status.HTTP_200_OK
             )
@@ -0,0 +1,110 @@
+# backend/tasks/cache.py - Per-company TaskIntegrationSettings cache
+
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import TaskIntegrationSettings
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_CACHE_KEY = 'tasks:integration_settings:{company_id}'
+
+# Stored when a company has no settings row, so misses are cached too
+_NO_SETTINGS = '__none__'
+
+
+class CacheStats:
+    """
+    Process-local hit/miss counters for a cache. Every `log_every` lookups
+    (0 disables it) the totals so far are logged, so each worker's hit
+    ratio shows up in its logs.
+    """
+
+    def __init__(self, name, log_every=0):
+        self.name = name
+        self.log_every = log_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+            total = self.hits + self.misses
+        self._maybe_log(total)
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+            total = self.hits + self.misses
+        self._maybe_log(total)
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            'name': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def _maybe_log(self, total):
+        if self.log_every and total % self.log_every == 0:
+            logger.info("Cache %(name)s: %(hits)d hits, %(misses)d misses (hit ratio %(hit_ratio).2f)", self.as_dict())
+
+
+settings_cache_stats = CacheStats(
+    'task_integration_settings', log_every=getattr(settings, 'TASK_SETTINGS_CACHE_LOG_EVERY', 1000),
+)
+
+
+def _cache():
+    return caches[getattr(settings, 'TASK_SETTINGS_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'TASK_SETTINGS_CACHE_TIMEOUT', 300)
+
+
+def _key(company_id):
+    return SETTINGS_CACHE_KEY.format(company_id=company_id)
+
+
+def get_integration_settings(company_id) -> TaskIntegrationSettings:
+    """
+    Cached replacement for TaskIntegrationSettings.objects.get(company_id=...).
+    Raises TaskIntegrationSettings.DoesNotExist like the ORM call does.
+    """
+    cached = _cache().get(_key(company_id))
+    if cached is not None:
+        settings_cache_stats.hit()
+        if cached == _NO_SETTINGS:
+            raise TaskIntegrationSettings.DoesNotExist
+        return cached
+
+    settings_cache_stats.miss()
+    try:
+        obj = TaskIntegrationSettings.objects.get(company_id=company_id)
+    except TaskIntegrationSettings.DoesNotExist:
+        _cache().set(_key(company_id), _NO_SETTINGS, _timeout())
+        raise
+
+    _cache().set(_key(company_id), obj, _timeout())
+    return obj
+
+
+def cache_integration_settings(obj: TaskIntegrationSettings):
+    """Write-through: store freshly saved settings for their company"""
+    _cache().set(_key(obj.company_id), obj, _timeout())
+
+
+def invalidate_integration_settings(company_id):
+    _cache().delete(_key(company_id))
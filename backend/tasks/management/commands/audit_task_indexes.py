@@ -0,0 +1,116 @@
+# backend/tasks/management/commands/audit_task_indexes.py
+
+import re
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tasks.models import Task, TaskAttachment, TaskChecklist, TaskComment
+from tasks.utils import TaskPermissionValidator
+from users.identity import UserIdentity
+
+ROLES = ['company_admin', 'manager', 'team_lead', 'employee']
+
+# Plan lines that indicate a full table scan, per backend
+# (SQLite before 3.36 prints 'SCAN TABLE x'; 'SCAN x USING INDEX' walks an index)
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'SCAN (?:TABLE )?(\w+)\b(?! USING)'),
+}
+
+
+def find_seq_scans(plan, vendor):
+    """Sorted names of the tables an EXPLAIN plan from vendor scans sequentially"""
+    return sorted(set(SEQ_SCAN_PATTERNS[vendor].findall(plan)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the task queries TaskPermissionValidator.get_filtered_tasks "
+        "builds for each role and report sequential scans."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company-id', help='Company to plan against (default: company with most tasks)')
+        parser.add_argument('--user-id', help='User id used for the per-user roles (default: random)')
+        parser.add_argument('--department-id', help='Department id used for team_lead (default: random)')
+        parser.add_argument('--analyze', action='store_true', help='Use EXPLAIN ANALYZE (PostgreSQL only)')
+        parser.add_argument('--fail-on-seq-scan', action='store_true', help='Exit non-zero if any sequential scan is found')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in SEQ_SCAN_PATTERNS:
+            raise CommandError(f"Unsupported database backend: {vendor}")
+
+        company_id = options['company_id'] or self._busiest_company()
+        user_id = options['user_id'] or uuid.uuid4()
+        department_id = options['department_id'] or uuid.uuid4()
+
+        explain_options = {}
+        if options['analyze']:
+            if vendor != 'postgresql':
+                raise CommandError('--analyze is only supported on PostgreSQL')
+            explain_options['analyze'] = True
+
+        findings = []
+        for label, queryset in self._queries(company_id, user_id, department_id):
+            try:
+                plan = queryset.explain(**explain_options)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{label}] could not plan query: {e}"))
+                continue
+
+            seq_scans = find_seq_scans(plan, vendor)
+            if seq_scans:
+                findings.append((label, seq_scans))
+                self.stdout.write(self.style.WARNING(f"[{label}] sequential scan on: {', '.join(seq_scans)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"[{label}] index only"))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        self.stdout.write(f"\n{len(findings)} quer{'y' if len(findings) == 1 else 'ies'} with sequential scans")
+        if findings and options['fail_on_seq_scan']:
+            raise CommandError('Sequential scans found')
+
+    def _busiest_company(self):
+        from django.db.models import Count
+
+        row = (
+            Task.objects.filter(deleted_at__isnull=True)
+            .values('company_id')
+            .annotate(n=Count('id'))
+            .order_by('-n')
+            .first()
+        )
+        if row is None:
+            raise CommandError('No tasks found; pass --company-id')
+        return row['company_id']
+
+    def _queries(self, company_id, user_id, department_id):
+        task_id = uuid.uuid4()
+
+        for role in ROLES:
+            user = UserIdentity(
+                id=user_id,
+                auth_user_id=None,
+                email='audit@example.com',
+                name='Index audit',
+                role=role,
+                company_id=company_id,
+                department_id=department_id,
+            )
+            # Mirror TaskListView: first page in both pagination modes
+            try:
+                tasks = TaskPermissionValidator.get_filtered_tasks(user)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"[{role}] could not build queryset: {e}"))
+                continue
+            yield f"{role} page", tasks[:20]
+            yield f"{role} cursor", tasks.order_by('-created_at', '-id')[:21]
+            yield f"{role} count", tasks.values('id')
+
+        yield 'task comments', TaskComment.objects.filter(task_id=task_id)
+        yield 'task checklist', TaskChecklist.objects.filter(task_id=task_id)
+        yield 'task attachments', TaskAttachment.objects.filter(task_id=task_id)
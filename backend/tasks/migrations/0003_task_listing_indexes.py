@@ -0,0 +1,25 @@
+# Generated by Django 4.2.8 on 2026-10-17 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_alter_taskattachment_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['company_id', '-created_at', '-id'], name='tasks_company_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['assigned_to', 'company_id', '-created_at'], name='tasks_assignee_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_by', 'company_id'], name='tasks_assigner_company_idx'),
+        ),
+    ]
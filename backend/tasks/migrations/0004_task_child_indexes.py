@@ -0,0 +1,21 @@
+# Generated by Django 4.2.8 on 2026-10-17 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_task_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taskattachment',
+            index=models.Index(fields=['task_id', '-created_at'], name='task_attachments_task_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcomment',
+            index=models.Index(fields=['task_id', '-created_at'], name='task_comments_task_idx'),
+        ),
+    ]
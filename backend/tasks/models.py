@@ -54,6 +54,22 @@ class Task(models.Model):
     class Meta:
         db_table = 'tasks'
         ordering = ['-created_at']
+        indexes = [
+            # Company-wide listing (admin/manager), live tasks only
+            models.Index(
+                fields=['company_id', '-created_at', '-id'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='tasks_company_live_idx',
+            ),
+            # "My tasks" listing (employee)
+            models.Index(
+                fields=['assigned_to', 'company_id', '-created_at'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='tasks_assignee_live_idx',
+            ),
+            # Tasks created by a user (team lead)
+            models.Index(fields=['assigned_by', 'company_id'], name='tasks_assigner_company_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.status})"
@@ -85,6 +101,9 @@ class TaskComment(models.Model):
     class Meta:
         db_table = 'task_comments'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['task_id', '-created_at'], name='task_comments_task_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user_id} on task {self.task_id}"
@@ -112,6 +131,7 @@ class TaskChecklist(models.Model):
     class Meta:
         db_table = 'task_checklist'
         ordering = ['order_index']
+        # Also serves task_id lookups (leading column)
         unique_together = ('task_id', 'order_index')
 
     def __str__(self):
@@ -138,6 +158,9 @@ class TaskAttachment(models.Model):
     class Meta:
         db_table = 'task_attachments'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['task_id', '-created_at'], name='task_attachments_task_idx'),
+        ]
 
     def __str__(self):
         return f"{self.file_name}"
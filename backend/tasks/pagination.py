@@ -0,0 +1,100 @@
+# backend/tasks/pagination.py - Keyset pagination and cached task counts
+
+import base64
+import binascii
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+COUNT_VERSION_KEY = 'tasks:count_version:{company_id}'
+COUNT_KEY = 'tasks:count:{company_id}:{version}:{scope}'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# ============================================
+# Cursor encoding
+# ============================================
+
+def encode_cursor(task):
+    """Opaque cursor for the (created_at, id) position of a task"""
+    raw = f"{task.created_at.isoformat()}|{task.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, task_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(task_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def paginate_by_cursor(queryset, cursor, page_size):
+    """
+    Keyset pagination over (-created_at, -id).
+    Returns (tasks, next_cursor); next_cursor is None on the last page.
+    Tasks without created_at cannot be positioned and are skipped.
+    """
+    queryset = queryset.filter(created_at__isnull=False).order_by('-created_at', '-id')
+
+    if cursor:
+        created_at, task_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=task_id)
+        )
+
+    # Fetch one extra row to know whether another page exists
+    tasks = list(queryset[:page_size + 1])
+    if len(tasks) > page_size:
+        tasks = tasks[:page_size]
+        return tasks, encode_cursor(tasks[-1])
+    return tasks, None
+
+
+# ============================================
+# Approximate counts
+# ============================================
+
+def _count_scope(user):
+    # Admin/manager see the whole company; other roles see a per-user subset
+    if user.role in ['company_admin', 'manager']:
+        return user.role
+    return f"{user.role}:{user.id}"
+
+
+def get_approximate_count(user, queryset):
+    """
+    Task count for the user's role-filtered queryset, cached per company and
+    role (per user for team leads/employees). Entries expire after
+    TASK_COUNT_CACHE_TIMEOUT and are dropped when the company's tasks change.
+    """
+    version = cache.get_or_set(COUNT_VERSION_KEY.format(company_id=user.company_id), _new_version, None)
+    key = COUNT_KEY.format(company_id=user.company_id, version=version, scope=_count_scope(user))
+
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, getattr(settings, 'TASK_COUNT_CACHE_TIMEOUT', 60))
+    return count
+
+
+def _new_version():
+    # Time-based so a version key evicted from the cache never reuses old entries
+    return time.time_ns()
+
+
+def invalidate_task_counts(company_id):
+    key = COUNT_VERSION_KEY.format(company_id=company_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
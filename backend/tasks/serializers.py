@@ -10,6 +10,42 @@ from .models import (
 )
 
 
+def build_user_name_map(tasks):
+    """
+    Resolve assigned_to/assigned_by names for a page of tasks in one query.
+    Returns {user_id: name}; pass it to task serializers as context['user_names'].
+    """
+    from users.models import User
+
+    user_ids = set()
+    for task in tasks:
+        user_ids.add(task.assigned_to)
+        user_ids.add(task.assigned_by)
+    user_ids.discard(None)
+
+    if not user_ids:
+        return {}
+    return dict(User.objects.filter(id__in=user_ids).values_list('id', 'name'))
+
+
+class UserNameResolverMixin:
+    """
+    Looks up user names from context['user_names'] instead of one query per field.
+    If the caller did not provide the map, it is built once from the root
+    instance (the whole page for many=True) and stored in the shared context.
+    """
+
+    def resolve_user_name(self, user_id):
+        user_names = self.context.get('user_names')
+        if user_names is None:
+            instance = self.root.instance
+            if isinstance(instance, Task):
+                instance = [instance]
+            user_names = build_user_name_map(instance or [])
+            self.context['user_names'] = user_names
+        return user_names.get(user_id, "Unknown")
+
+
 class TaskIntegrationSettingsSerializer(serializers.ModelSerializer):
     """Serializer for Integration Page settings"""
     class Meta:
@@ -77,7 +113,7 @@ class TaskCommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class TaskListSerializer(serializers.ModelSerializer):
+class TaskListSerializer(UserNameResolverMixin, serializers.ModelSerializer):
     """Simplified serializer for task lists (Kanban, etc.)"""
     assigned_to_name = serializers.SerializerMethodField()
     assigned_by_name = serializers.SerializerMethodField()
@@ -85,22 +121,12 @@ class TaskListSerializer(serializers.ModelSerializer):
     priority_display = serializers.CharField(source='get_priority_display', read_only=True)
     
     def get_assigned_to_name(self, obj):
-        """Get assignee name from users table"""
-        from users.models import User
-        try:
-            user = User.objects.get(id=obj.assigned_to)
-            return user.name
-        except User.DoesNotExist:
-            return "Unknown"
+        """Get assignee name from the batched user-name map"""
+        return self.resolve_user_name(obj.assigned_to)
     
     def get_assigned_by_name(self, obj):
-        """Get creator name from users table"""
-        from users.models import User
-        try:
-            user = User.objects.get(id=obj.assigned_by)
-            return user.name
-        except User.DoesNotExist:
-            return "Unknown"
+        """Get creator name from the batched user-name map"""
+        return self.resolve_user_name(obj.assigned_by)
     
     class Meta:
         model = Task
@@ -123,7 +149,7 @@ class TaskListSerializer(serializers.ModelSerializer):
         ]
 
 
-class TaskDetailSerializer(serializers.ModelSerializer):
+class TaskDetailSerializer(UserNameResolverMixin, serializers.ModelSerializer):
     """Detailed serializer for single task view with related data"""
     assigned_to_name = serializers.SerializerMethodField()
     assigned_by_name = serializers.SerializerMethodField()
@@ -134,20 +160,10 @@ class TaskDetailSerializer(serializers.ModelSerializer):
     attachments = TaskAttachmentSerializer(many=True, read_only=True, source='taskattachment_set')
     
     def get_assigned_to_name(self, obj):
-        from users.models import User
-        try:
-            user = User.objects.get(id=obj.assigned_to)
-            return user.name
-        except User.DoesNotExist:
-            return "Unknown"
+        return self.resolve_user_name(obj.assigned_to)
     
     def get_assigned_by_name(self, obj):
-        from users.models import User
-        try:
-            user = User.objects.get(id=obj.assigned_by)
-            return user.name
-        except User.DoesNotExist:
-            return "Unknown"
+        return self.resolve_user_name(obj.assigned_by)
     
     class Meta:
         model = Task
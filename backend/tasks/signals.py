@@ -0,0 +1,36 @@
+# backend/tasks/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import cache_integration_settings, invalidate_integration_settings
+from .models import Task, TaskIntegrationSettings
+from .pagination import invalidate_task_counts
+
+
+@receiver(post_save, sender=TaskIntegrationSettings)
+def write_through_integration_settings(sender, instance, **kwargs):
+    # Publish only once the request transaction commits (ATOMIC_REQUESTS)
+    transaction.on_commit(lambda: cache_integration_settings(instance))
+
+
+@receiver(post_delete, sender=TaskIntegrationSettings)
+def drop_integration_settings(sender, instance, **kwargs):
+    company_id = instance.company_id
+    transaction.on_commit(lambda: invalidate_integration_settings(company_id))
+
+
+@receiver(post_save, sender=Task)
+def refresh_task_counts_on_save(sender, instance, created, **kwargs):
+    # Only creation and soft deletion change counts; other edits age out.
+    # Bump after commit so a concurrent request can't re-cache the old count
+    if created or instance.deleted_at is not None:
+        company_id = instance.company_id
+        transaction.on_commit(lambda: invalidate_task_counts(company_id))
+
+
+@receiver(post_delete, sender=Task)
+def refresh_task_counts_on_delete(sender, instance, **kwargs):
+    company_id = instance.company_id
+    transaction.on_commit(lambda: invalidate_task_counts(company_id))
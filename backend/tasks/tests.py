@@ -1,3 +1,347 @@
-from django.test import TestCase
+import io
+import uuid
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User as DjangoUser
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models.query import QuerySet
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks.cache import CacheStats, get_integration_settings, settings_cache_stats
+from tasks.management.commands.audit_task_indexes import find_seq_scans
+from tasks.models import Task, TaskIntegrationSettings
+from tasks.pagination import (
+    InvalidCursor,
+    decode_cursor,
+    get_approximate_count,
+    paginate_by_cursor,
+)
+from tasks.serializers import TaskListSerializer, build_user_name_map
+from users.models import User
+from users.testing import UsersTableTestCase
+
+
+class TaskListSerializerQueryTests(UsersTableTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company_id = uuid.uuid4()
+        cls.users = [
+            User.objects.create(
+                id=uuid.uuid4(),
+                email=f'user{i}@example.com',
+                name=f'User {i}',
+                company_id=cls.company_id,
+            )
+            for i in range(10)
+        ]
+        for i in range(40):
+            Task.objects.create(
+                company_id=cls.company_id,
+                title=f'Task {i}',
+                assigned_to=cls.users[i % 10].id,
+                assigned_by=cls.users[(i + 1) % 10].id,
+                due_date=date.today() + timedelta(days=1),
+            )
+
+    def _serialize_page(self, page_size):
+        tasks = list(Task.objects.filter(company_id=self.company_id)[:page_size])
+        serializer = TaskListSerializer(
+            tasks,
+            many=True,
+            context={'user_names': build_user_name_map(tasks)}
+        )
+        return serializer.data
+
+    def test_query_count_constant_as_page_grows(self):
+        # page query + one id__in lookup, regardless of page size
+        for page_size in (1, 5, 20, 40):
+            with self.assertNumQueries(2):
+                data = self._serialize_page(page_size)
+            self.assertEqual(len(data), page_size)
+
+    def test_names_resolved(self):
+        data = self._serialize_page(40)
+        names = {user.name for user in self.users}
+        for row in data:
+            self.assertIn(row['assigned_to_name'], names)
+            self.assertIn(row['assigned_by_name'], names)
+
+    def test_without_context_builds_map_once(self):
+        tasks = list(Task.objects.filter(company_id=self.company_id)[:20])
+        with self.assertNumQueries(1):
+            TaskListSerializer(tasks, many=True).data
+
+    def test_unknown_user(self):
+        task = Task.objects.create(
+            company_id=self.company_id,
+            title='Orphan',
+            assigned_to=uuid.uuid4(),
+            assigned_by=self.users[0].id,
+            due_date=date.today(),
+        )
+        data = TaskListSerializer(task).data
+        self.assertEqual(data['assigned_to_name'], 'Unknown')
+        self.assertEqual(data['assigned_by_name'], self.users[0].name)
+
+
+class IntegrationSettingsCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        settings_cache_stats.reset()
+        self.company_id = uuid.uuid4()
+
+    def test_repeated_lookups_hit_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TaskIntegrationSettings.objects.create(company_id=self.company_id)
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                get_integration_settings(self.company_id)
+        self.assertEqual(settings_cache_stats.misses, 1)
+        self.assertEqual(settings_cache_stats.hits, 2)
+
+    def test_hit_ratio_is_logged(self):
+        stats = CacheStats('example', log_every=4)
+        with self.assertLogs('tasks.cache', 'INFO') as logs:
+            for _ in range(3):
+                stats.hit()
+            stats.miss()
+        self.assertEqual(logs.output, ['INFO:tasks.cache:Cache example: 3 hits, 1 misses (hit ratio 0.75)'])
+
+    def test_missing_settings_cached(self):
+        with self.assertNumQueries(1):
+            for _ in range(2):
+                with self.assertRaises(TaskIntegrationSettings.DoesNotExist):
+                    get_integration_settings(self.company_id)
+
+    def test_save_writes_through(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            obj = TaskIntegrationSettings.objects.create(company_id=self.company_id)
+        self.assertFalse(get_integration_settings(self.company_id).allow_employee_task_creation)
+
+        obj.allow_employee_task_creation = True
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.save()
+        with self.assertNumQueries(0):
+            self.assertTrue(get_integration_settings(self.company_id).allow_employee_task_creation)
+
+
+class TaskCursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company_id = uuid.uuid4()
+        cls.user_id = uuid.uuid4()
+        tied = timezone.now()
+        for i in range(25):
+            task = Task.objects.create(
+                company_id=cls.company_id,
+                title=f'Task {i}',
+                assigned_to=cls.user_id,
+                assigned_by=cls.user_id,
+                due_date=date.today(),
+            )
+            # Several tasks share a timestamp so the id tiebreaker matters
+            if i % 3 == 0:
+                Task.objects.filter(id=task.id).update(created_at=tied)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_walks_all_tasks_once(self):
+        queryset = Task.objects.filter(company_id=self.company_id)
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = paginate_by_cursor(queryset, cursor, 7)
+            seen.extend(task.id for task in page)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        expected = list(queryset.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+    def test_approximate_count_cached_until_tasks_change(self):
+        class Manager:
+            role = 'manager'
+            company_id = self.company_id
+            id = self.user_id
+
+        queryset = Task.objects.filter(company_id=self.company_id)
+        self.assertEqual(get_approximate_count(Manager, queryset), 25)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_approximate_count(Manager, queryset), 25)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Task.objects.create(
+                company_id=self.company_id,
+                title='New',
+                assigned_to=self.user_id,
+                assigned_by=self.user_id,
+                due_date=date.today(),
+            )
+            # The count version is only bumped once the transaction commits
+            self.assertEqual(get_approximate_count(Manager, queryset), 25)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_approximate_count(Manager, queryset), 26)
+
+
+class TaskBulkCreateViewTests(UsersTableTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company_id = uuid.uuid4()
+        cls.auth_user = DjangoUser.objects.create_user(
+            username='manager@example.com', email='manager@example.com', password='x'
+        )
+        cls.manager = User.objects.create(
+            id=uuid.uuid4(),
+            email='manager@example.com',
+            name='Manager',
+            role='manager',
+            company_id=cls.company_id,
+        )
+        cls.employees = [
+            User.objects.create(
+                id=uuid.uuid4(),
+                email=f'employee{i}@example.com',
+                name=f'Employee {i}',
+                company_id=cls.company_id,
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.auth_user)
+        self.due_date = (date.today() + timedelta(days=7)).isoformat()
+
+    def test_multi_assignee_fan_out(self):
+        TaskIntegrationSettings.objects.create(
+            company_id=self.company_id, allow_multi_task_assignment=True
+        )
+        response = self.client.post('/api/tasks/bulk-create/', {
+            'title': 'Sprint task',
+            'due_date': self.due_date,
+            'tags': ['sprint'],
+            'assigned_to': [str(employee.id) for employee in self.employees],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 5)
+        tasks = Task.objects.filter(company_id=self.company_id)
+        self.assertEqual(tasks.count(), 5)
+        self.assertTrue(all(task.tags == ['sprint'] for task in tasks))
+
+    def test_multi_assignee_disabled(self):
+        response = self.client.post('/api/tasks/bulk-create/', {
+            'title': 'Sprint task',
+            'due_date': self.due_date,
+            'assigned_to': [str(employee.id) for employee in self.employees[:2]],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'][0]['error'], 'Multi-task assignment is disabled')
+        self.assertFalse(Task.objects.exists())
+
+    def test_per_item_errors(self):
+        response = self.client.post('/api/tasks/bulk-create/', {'tasks': [
+            {'title': 'Ok', 'due_date': self.due_date, 'assigned_to': str(self.employees[0].id)},
+            {'title': 'Ghost', 'due_date': self.due_date, 'assigned_to': str(uuid.uuid4())},
+            {'due_date': self.due_date, 'assigned_to': str(self.employees[1].id)},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual([result['index'] for result in results], [0, 1, 2])
+        self.assertTrue(results[0]['success'])
+        self.assertEqual(results[1]['error'], 'Assigned user not found')
+        self.assertIn('title', results[2]['errors'])
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_query_count_independent_of_batch_size(self):
+        def post(n):
+            return self.client.post('/api/tasks/bulk-create/', {'tasks': [
+                {'title': f'Task {i}', 'due_date': self.due_date,
+                 'assigned_to': str(self.employees[i % 5].id)}
+                for i in range(n)
+            ]}, format='json')
+
+        post(1)  # warm identity and settings caches
+        # assignee lookup + INSERT, plus savepoints
+        with self.assertNumQueries(6):
+            post(2)
+        with self.assertNumQueries(6):
+            post(40)
+
+
+POSTGRES_PLAN = """\
+Limit  (cost=0.42..8.61 rows=20 width=412)
+  ->  Nested Loop  (cost=0.42..1034.11 rows=2520 width=412)
+        ->  Index Scan using tasks_company_created_idx on tasks  (cost=0.42..602.15 rows=2520 width=412)
+              Index Cond: (company_id = '8f9c0f35-8a8e-4f5c-9d3b-2c1f4f1b6a11'::uuid)
+        ->  Seq Scan on task_checklists  (cost=0.00..1.12 rows=12 width=16)
+  ->  Parallel Seq Scan on task_comments  (cost=0.00..44.00 rows=2 width=16)
+        Filter: (task_id = '0b6d2f7e-4c1a-4a7e-9a55-0f4d1c2e3b44'::uuid)"""
+
+SQLITE_PLAN = """\
+3 0 0 SEARCH tasks USING INDEX tasks_company_created_idx (company_id=?)
+8 0 0 SCAN task_comments
+12 0 0 SCAN TABLE task_checklists
+15 0 0 SCAN task_attachments USING INDEX task_attachments_task_idx
+19 0 0 USE TEMP B-TREE FOR ORDER BY"""
+
+
+class SeqScanDetectionTests(SimpleTestCase):
+
+    def test_postgres_plan(self):
+        self.assertEqual(find_seq_scans(POSTGRES_PLAN, 'postgresql'), ['task_checklists', 'task_comments'])
+
+    def test_sqlite_plan(self):
+        self.assertEqual(find_seq_scans(SQLITE_PLAN, 'sqlite'), ['task_checklists', 'task_comments'])
+
+    def test_index_only_plans(self):
+        self.assertEqual(find_seq_scans('Index Only Scan using tasks_pkey on tasks', 'postgresql'), [])
+        self.assertEqual(find_seq_scans('SCAN tasks USING COVERING INDEX tasks_idx', 'sqlite'), [])
+
+
+class AuditTaskIndexesCommandTests(TestCase):
+
+    def _run(self, *args):
+        def explain(queryset, **options):
+            if queryset.model._meta.db_table == 'task_comments':
+                return '2 0 0 SCAN task_comments'
+            return '2 0 0 SEARCH tasks USING INDEX tasks_company_created_idx (company_id=?)'
+
+        out = io.StringIO()
+        with mock.patch.object(QuerySet, 'explain', autospec=True, side_effect=explain):
+            call_command('audit_task_indexes', '--company-id', str(uuid.uuid4()), *args, stdout=out)
+        return out.getvalue()
+
+    def test_reports_seq_scans(self):
+        output = self._run()
+        self.assertIn('[task comments] sequential scan on: task_comments', output)
+        self.assertIn('[manager page] index only', output)
+        self.assertIn('1 query with sequential scans', output)
+
+    def test_fail_on_seq_scan(self):
+        with self.assertRaisesMessage(CommandError, 'Sequential scans found'):
+            self._run('--fail-on-seq-scan')
+
+    def test_analyze_needs_postgres(self):
+        with self.assertRaisesMessage(CommandError, 'only supported on PostgreSQL'):
+            self._run('--analyze')
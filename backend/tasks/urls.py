@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     TaskListView,
     TaskCreateView,
+    TaskBulkCreateView,
     TaskIntegrationSettingsGetView,
     TaskIntegrationSettingsUpdateView,
 )
@@ -9,6 +10,7 @@ from .views import (
 urlpatterns = [
     path('', TaskListView.as_view(), name='task-list'),
     path('create/', TaskCreateView.as_view(), name='task-create'),
+    path('bulk-create/', TaskBulkCreateView.as_view(), name='task-bulk-create'),
     path('settings/get/', TaskIntegrationSettingsGetView.as_view(), name='task-settings-get'),
     path('settings/update/', TaskIntegrationSettingsUpdateView.as_view(), name='task-settings-update'),
 ]
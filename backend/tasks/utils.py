@@ -8,6 +8,8 @@ from django.db.models import Q
 
 from .models import Task, TaskIntegrationSettings
 
+from .cache import get_integration_settings
+
 from users.models import User
 
 from companies.models import Department
@@ -48,7 +50,7 @@ class TaskPermissionValidator:
 
 			try:
 
-				settings = TaskIntegrationSettings.objects.get(company_id=user.company_id)
+				settings = get_integration_settings(user.company_id)
 
 				if not settings.allow_employee_task_creation:
 
@@ -86,7 +88,7 @@ class TaskPermissionValidator:
 
 			try:
 
-				settings = TaskIntegrationSettings.objects.get(company_id=user.company_id)
+				settings = get_integration_settings(user.company_id)
 
 				# Team leads can assign within their department or cross-dept if allowed
 
@@ -106,7 +108,7 @@ class TaskPermissionValidator:
 
 			try:
 
-				settings = TaskIntegrationSettings.objects.get(company_id=user.company_id)
+				settings = get_integration_settings(user.company_id)
 
 				if not settings.allow_employee_task_assignment:
 
@@ -216,7 +218,7 @@ class TaskPermissionValidator:
 
 		try:
 
-			settings = TaskIntegrationSettings.objects.get(company_id=user.company_id)
+			settings = get_integration_settings(user.company_id)
 
 			if not settings.allow_timeline_priority_editing:
 
@@ -4,6 +4,8 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings as django_settings
+from django.db import transaction
 from django.utils import timezone
 from django.db.models import Q, Max
 import uuid
@@ -16,49 +18,19 @@ from tasks.serializers import (
     CreateTaskSerializer,
     UpdateTaskSerializer,
     TaskIntegrationSettingsSerializer,
+    build_user_name_map,
 )
 from tasks.utils import TaskPermissionValidator
+from tasks.pagination import (
+    InvalidCursor,
+    get_approximate_count,
+    invalidate_task_counts,
+    paginate_by_cursor,
+)
+from tasks.cache import get_integration_settings
 from notifications.utils import NotificationService
 from users.models import User as AppUser
-from companies.models import CompanyAdmin
-
-
-# ============================================
-# HELPER FUNCTION - Get User with Role
-# ============================================
-
-def get_user_with_role(auth_user):
-    """
-    Get user object with role.
-    Checks BOTH tables:
-    - CompanyAdmin (for company_admin role)
-    - AppUser / public.users (for hr, manager, team_lead, employee)
-    """
-    # Try CompanyAdmin first
-    try:
-        admin = CompanyAdmin.objects.get(user=auth_user)
-        
-        class AdminUserWrapper:
-            def __init__(self, admin_obj, auth_user_obj):
-                self.id = auth_user_obj.id
-                self.email = auth_user_obj.email
-                self.name = admin_obj.full_name
-                self.role = 'company_admin'
-                self.company_id = admin_obj.company.id
-                self.department_id = None
-                self.is_active = True
-        
-        return AdminUserWrapper(admin, auth_user)
-    
-    except CompanyAdmin.DoesNotExist:
-        pass
-    
-    # Try AppUser (public.users)
-    try:
-        return AppUser.objects.get(email=auth_user.email)
-    
-    except AppUser.DoesNotExist:
-        return None
+from users.identity import get_request_identity
 
 
 # ============================================
@@ -66,13 +38,27 @@ def get_user_with_role(auth_user):
 # ============================================
 
 class TaskListView(APIView):
-    """List tasks (role-filtered)"""
+    """
+    List tasks (role-filtered)
+    Page-number mode: ?page=&page_size=
+    Cursor mode: ?pagination=cursor&page_size= then ?cursor=<next_cursor>
+    ?count=approx serves the total from a cached per-company/per-role counter
+    """
     permission_classes = [IsAuthenticated]
 
+    @staticmethod
+    def _serialize(paginated_tasks):
+        # Resolve assignee/creator names for the whole page in one query
+        serializer = TaskListSerializer(
+            paginated_tasks,
+            many=True,
+            context={'user_names': build_user_name_map(paginated_tasks)}
+        )
+        return serializer.data
+
     def get(self, request):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -83,21 +69,41 @@ class TaskListView(APIView):
             # Get filtered tasks based on role
             tasks = TaskPermissionValidator.get_filtered_tasks(user)
             
-            # Apply pagination
-            page = int(request.query_params.get('page', 1))
             page_size = int(request.query_params.get('page_size', 20))
+            count_mode = request.query_params.get('count')
+            
+            # Cursor mode: ?pagination=cursor[&cursor=<next_cursor>]
+            cursor = request.query_params.get('cursor')
+            if cursor is not None or request.query_params.get('pagination') == 'cursor':
+                paginated_tasks, next_cursor = paginate_by_cursor(tasks, cursor, page_size)
+                response_data = {
+                    'success': True,
+                    'data': self._serialize(paginated_tasks),
+                    'next_cursor': next_cursor,
+                    'page_size': page_size,
+                }
+                # Counting is opt-in in cursor mode
+                if count_mode == 'approx':
+                    response_data['count'] = get_approximate_count(user, tasks)
+                elif count_mode == 'exact':
+                    response_data['count'] = tasks.count()
+                return Response(response_data, status=status.HTTP_200_OK)
+            
+            # Page-number mode (default, kept for compatibility)
+            page = int(request.query_params.get('page', 1))
             start_idx = (page - 1) * page_size
             end_idx = start_idx + page_size
             
-            total_count = tasks.count()
-            paginated_tasks = tasks[start_idx:end_idx]
-            
-            serializer = TaskListSerializer(paginated_tasks, many=True)
+            if count_mode == 'approx':
+                total_count = get_approximate_count(user, tasks)
+            else:
+                total_count = tasks.count()
+            paginated_tasks = list(tasks[start_idx:end_idx])
             
             return Response(
                 {
                     'success': True,
-                    'data': serializer.data,
+                    'data': self._serialize(paginated_tasks),
                     'count': total_count,
                     'page': page,
                     'page_size': page_size,
@@ -105,6 +111,11 @@ class TaskListView(APIView):
                 status=status.HTTP_200_OK
             )
         
+        except InvalidCursor as e:
+            return Response(
+                {'success': False, 'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             return Response(
                 {'success': False, 'error': str(e)},
@@ -122,8 +133,7 @@ class TaskCreateView(APIView):
 
     def post(self, request):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -187,9 +197,10 @@ class TaskCreateView(APIView):
                 task.tags = request.data['tags']
                 task.save()
             
-            # Create notification
-# Notification (method doesn't exist yet - will implement later)
-# NotificationService.notify_task_assigned(task, assigned_to_user, user)
+            # Notify assignee and assigner (delivered after commit)
+            NotificationService.create_task_assigned_notification(
+                task, assigned_to_user.id, user.id, user.company_id
+            )
             
             detail_serializer = TaskDetailSerializer(task)
             return Response(
@@ -214,6 +225,198 @@ class TaskCreateView(APIView):
             )
 
 
+# ============================================
+# TaskBulkCreateView
+# ============================================
+
+class TaskBulkCreateView(APIView):
+    """
+    Create many tasks in one request.
+    Body: {"tasks": [{...}, ...]} or a single task {..., "assigned_to": [id, id, ...]}
+    Each item takes the same fields as TaskCreateView; an item whose
+    assigned_to is a list fans out to one task per assignee.
+    Returns one result per created/failed task; valid items are inserted
+    with a single bulk_create.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            user = get_request_identity(request)
+            
+            if not user:
+                return Response(
+                    {'success': False, 'error': 'User profile not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            
+            items = request.data.get('tasks')
+            if items is None:
+                items = [request.data]
+            if not isinstance(items, list) or not items:
+                return Response(
+                    {'success': False, 'error': 'tasks must be a non-empty list'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Check permission to create tasks (once for the whole batch)
+            can_create, error_msg = TaskPermissionValidator.check_can_create_task(user)
+            if not can_create:
+                return Response(
+                    {'success': False, 'error': error_msg},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            
+            try:
+                settings = get_integration_settings(user.company_id)
+            except TaskIntegrationSettings.DoesNotExist:
+                settings = TaskIntegrationSettings(company_id=user.company_id)
+            
+            # Expand multi-assignee items into one entry per assignee
+            results = []
+            entries = []
+            for index, item in enumerate(items):
+                if not isinstance(item, dict):
+                    results.append({'index': index, 'success': False, 'error': 'Invalid task'})
+                    continue
+                
+                can_multi, error_msg = TaskPermissionValidator.validate_creation(user, item, settings)
+                if not can_multi:
+                    results.append({'index': index, 'success': False, 'error': error_msg})
+                    continue
+                
+                assignees = item.get('assigned_to')
+                if not isinstance(assignees, list):
+                    assignees = [assignees]
+                for assignee in assignees:
+                    entries.append((index, {**item, 'assigned_to': assignee}))
+            
+            max_tasks = getattr(django_settings, 'TASK_BULK_CREATE_MAX', 500)
+            if len(entries) > max_tasks:
+                return Response(
+                    {'success': False, 'error': f'At most {max_tasks} tasks per request'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Validate fields
+            validated = []
+            for index, data in entries:
+                serializer = CreateTaskSerializer(data=data)
+                if serializer.is_valid():
+                    validated.append((index, serializer.validated_data))
+                else:
+                    results.append({
+                        'index': index,
+                        'assigned_to': data.get('assigned_to'),
+                        'success': False,
+                        'error': 'Invalid data',
+                        'errors': serializer.errors,
+                    })
+            
+            # Load every assignee with one query
+            assignee_ids = {data['assigned_to'] for _, data in validated}
+            assignees = {
+                assignee.id: assignee
+                for assignee in AppUser.objects.filter(id__in=assignee_ids).only(
+                    'id', 'name', 'company_id', 'department_id'
+                )
+            }
+            
+            now = timezone.now()
+            to_create = []
+            for index, data in validated:
+                assigned_to_user = assignees.get(data['assigned_to'])
+                if assigned_to_user is None:
+                    results.append({
+                        'index': index,
+                        'assigned_to': str(data['assigned_to']),
+                        'success': False,
+                        'error': 'Assigned user not found',
+                    })
+                    continue
+                
+                can_assign, error_msg = TaskPermissionValidator.check_can_assign_to_user(user, assigned_to_user)
+                if not can_assign:
+                    results.append({
+                        'index': index,
+                        'assigned_to': str(data['assigned_to']),
+                        'success': False,
+                        'error': error_msg,
+                    })
+                    continue
+                
+                to_create.append((index, Task(
+                    id=uuid.uuid4(),
+                    company_id=user.company_id,
+                    title=data['title'],
+                    description=data.get('description', ''),
+                    status='pending',
+                    priority=data.get('priority', 'medium'),
+                    assigned_to=assigned_to_user.id,
+                    assigned_by=user.id,
+                    due_date=data['due_date'],
+                    start_date=data.get('start_date'),
+                    estimated_hours=data.get('estimated_hours'),
+                    progress_percentage=0,
+                    category=data.get('category', ''),
+                    tags=data.get('tags', []),
+                    created_at=now,
+                    updated_at=now,
+                )))
+            
+            if to_create:
+                with transaction.atomic():
+                    Task.objects.bulk_create([task for _, task in to_create])
+                # bulk_create skips post_save, so refresh cached counts here
+                invalidate_task_counts(user.company_id)
+                NotificationService.create_task_assigned_notifications(
+                    [task for _, task in to_create], user.id, user.company_id
+                )
+                
+                # Every name on the page is already loaded
+                user_names = {assignee_id: assignee.name for assignee_id, assignee in assignees.items()}
+                user_names[user.id] = user.name
+                task_data = TaskListSerializer(
+                    [task for _, task in to_create],
+                    many=True,
+                    context={'user_names': user_names}
+                ).data
+                for (index, task), data in zip(to_create, task_data):
+                    results.append({
+                        'index': index,
+                        'assigned_to': str(task.assigned_to),
+                        'success': True,
+                        'data': data,
+                    })
+            
+            results.sort(key=lambda result: result['index'])
+            created_count = len(to_create)
+            failed_count = len(results) - created_count
+            
+            if failed_count == 0:
+                response_status = status.HTTP_201_CREATED
+            elif created_count:
+                response_status = status.HTTP_207_MULTI_STATUS
+            else:
+                response_status = status.HTTP_400_BAD_REQUEST
+            
+            return Response(
+                {
+                    'success': failed_count == 0,
+                    'created': created_count,
+                    'failed': failed_count,
+                    'results': results,
+                },
+                status=response_status
+            )
+        
+        except Exception as e:
+            return Response(
+                {'success': False, 'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 # ============================================
 # TaskDetailView
 # ============================================
@@ -224,8 +427,7 @@ class TaskDetailView(APIView):
 
     def get(self, request, pk):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -271,8 +473,7 @@ class TaskUpdateView(APIView):
 
     def put(self, request, pk):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -299,6 +500,10 @@ class TaskUpdateView(APIView):
                         status=status.HTTP_403_FORBIDDEN
                     )
             
+            old_status = task.status
+            old_priority = task.priority
+            old_due_date = task.due_date
+            
             # Update fields
             if 'title' in request.data:
                 task.title = request.data['title']
@@ -324,12 +529,21 @@ class TaskUpdateView(APIView):
             task.updated_at = timezone.now()
             task.save()
             
-            # Send notification if status changed
-            if 'status' in request.data:
-# Notification (method doesn't exist yet - will implement later)
-# NotificationService.notify_task_status_changed(task, user)
+            # Send notifications for changed fields (delivered after commit)
+            if 'status' in request.data and task.status != old_status:
+                NotificationService.create_status_changed_notification(
+                    task, old_status, task.status, user.id, user.company_id
+                )
+            if 'priority' in request.data and task.priority != old_priority:
+                NotificationService.create_priority_updated_notification(
+                    task, old_priority, task.priority, user.id, user.company_id
+                )
+            if 'due_date' in request.data and str(task.due_date) != str(old_due_date):
+                NotificationService.create_timeline_updated_notification(
+                    task, old_due_date, task.due_date, user.id, user.company_id
+                )
             
-                serializer = TaskDetailSerializer(task)
+            serializer = TaskDetailSerializer(task)
             return Response(
                 {'success': True, 'data': serializer.data},
                 status=status.HTTP_200_OK
@@ -357,8 +571,7 @@ class TaskDeleteView(APIView):
 
     def delete(self, request, pk):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -403,8 +616,7 @@ class TaskCommentCreateView(APIView):
 
     def post(self, request, task_id):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -433,6 +645,10 @@ class TaskCommentCreateView(APIView):
                 updated_at=timezone.now(),
             )
             
+            NotificationService.create_comment_added_notification(
+                task, comment.id, user.id, user.company_id
+            )
+            
             serializer = TaskCommentSerializer(comment)
             return Response(
                 {'success': True, 'data': serializer.data},
@@ -461,8 +677,7 @@ class TaskChecklistCreateView(APIView):
 
     def post(self, request, task_id):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -518,8 +733,7 @@ class TaskIntegrationSettingsGetView(APIView):
 
     def get(self, request):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -561,8 +775,7 @@ class TaskIntegrationSettingsUpdateView(APIView):
 
     def put(self, request):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -622,8 +835,7 @@ class TaskIntegrationSettingsView(APIView):
 
     def get(self, request):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -648,8 +860,7 @@ class TaskIntegrationSettingsView(APIView):
 
     def post(self, request):
         try:
-            auth_user = request.user
-            user = get_user_with_role(auth_user)
+            user = get_request_identity(request)
             
             if not user:
                 return Response(
@@ -0,0 +1,20 @@
+# users/authentication.py
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from users.identity import resolve_identity
+
+
+class IdentityJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that also resolves the caller's role, company_id and
+    department_id once per request and exposes it as request.identity.
+    Resolution goes through the process-local identity cache.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, _ = result
+            request._request.identity = resolve_identity(user)
+        return result
@@ -0,0 +1,185 @@
+# users/identity.py - Per-request identity resolution with a process-local cache
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from companies.models import CompanyAdmin
+from users.models import User as AppUser
+
+
+class UserIdentity:
+    """
+    Resolved role/company/department for an authenticated Django user.
+    Checks BOTH tables:
+    - CompanyAdmin (for company_admin role)
+    - AppUser / public.users (for hr, manager, team_lead, employee)
+    A company admin who also has a users row keeps that profile as
+    `app_identity`, and its id as `app_user_id`.
+    """
+
+    __slots__ = (
+        'id', 'auth_user_id', 'app_user_id', 'email', 'name',
+        'role', 'company_id', 'department_id', 'is_active', 'app_identity',
+    )
+
+    def __init__(self, id, auth_user_id, email, name, role, company_id,
+                 department_id=None, app_user_id=None, is_active=True, app_identity=None):
+        self.id = id
+        self.auth_user_id = auth_user_id
+        self.app_user_id = app_user_id
+        self.email = email
+        self.name = name
+        self.role = role
+        self.company_id = company_id
+        self.department_id = department_id
+        self.is_active = is_active
+        self.app_identity = app_identity
+
+    def __repr__(self):
+        return f"<UserIdentity {self.email} ({self.role})>"
+
+    @classmethod
+    def from_company_admin(cls, admin, auth_user, app_user=None):
+        app_identity = cls.from_app_user(app_user, auth_user) if app_user is not None else None
+        return cls(
+            id=auth_user.id,
+            auth_user_id=auth_user.id,
+            app_user_id=app_user.id if app_user is not None else None,
+            email=auth_user.email,
+            name=admin.full_name,
+            role='company_admin',
+            company_id=admin.company_id,
+            app_identity=app_identity,
+        )
+
+    @classmethod
+    def from_app_user(cls, app_user, auth_user):
+        return cls(
+            id=app_user.id,
+            auth_user_id=auth_user.id,
+            app_user_id=app_user.id,
+            email=app_user.email,
+            name=app_user.name,
+            role=app_user.role,
+            company_id=app_user.company_id,
+            department_id=app_user.department_id,
+            is_active=app_user.is_active,
+        )
+
+
+class IdentityCache:
+    """
+    Thread-safe TTL + LRU cache of UserIdentity keyed by auth user id.
+    Process-local: other workers only see a change once their entry expires.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._app_user_index = {}
+        self._lock = threading.Lock()
+
+    def get(self, auth_user_id):
+        with self._lock:
+            entry = self._entries.get(auth_user_id)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(auth_user_id)
+                return None
+            self._entries.move_to_end(auth_user_id)
+            return identity
+
+    def set(self, auth_user_id, identity):
+        with self._lock:
+            self._remove(auth_user_id)
+            self._entries[auth_user_id] = (identity, time.monotonic() + self.ttl)
+            if identity.app_user_id is not None:
+                self._app_user_index[identity.app_user_id] = auth_user_id
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate(self, auth_user_id):
+        with self._lock:
+            self._remove(auth_user_id)
+
+    def invalidate_app_user(self, app_user_id):
+        with self._lock:
+            auth_user_id = self._app_user_index.get(app_user_id)
+            if auth_user_id is not None:
+                self._remove(auth_user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._app_user_index.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, auth_user_id):
+        entry = self._entries.pop(auth_user_id, None)
+        if entry is not None and entry[0].app_user_id is not None:
+            self._app_user_index.pop(entry[0].app_user_id, None)
+
+
+identity_cache = IdentityCache(
+    max_size=getattr(settings, 'IDENTITY_CACHE_MAX_SIZE', 1024),
+    ttl=getattr(settings, 'IDENTITY_CACHE_TTL', 60),
+)
+
+
+def _load_identity(auth_user):
+    # Both profiles, so an admin's users row is known too (notifications, app-user-first views)
+    admin = CompanyAdmin.objects.filter(user_id=auth_user.id).only('full_name', 'company_id').first()
+    app_user = AppUser.objects.filter(email=auth_user.email).only(
+        'id', 'email', 'name', 'role', 'company_id', 'department_id', 'is_active'
+    ).first()
+
+    # CompanyAdmin takes precedence
+    if admin is not None:
+        return UserIdentity.from_company_admin(admin, auth_user, app_user)
+    if app_user is not None:
+        return UserIdentity.from_app_user(app_user, auth_user)
+    return None
+
+
+def resolve_identity(auth_user):
+    """
+    Return the UserIdentity for an authenticated Django user, or None if the
+    user has no company admin or public.users profile. Misses are not cached.
+    """
+    if auth_user is None or not getattr(auth_user, 'is_authenticated', False):
+        return None
+
+    identity = identity_cache.get(auth_user.id)
+    if identity is not None:
+        return identity
+
+    identity = _load_identity(auth_user)
+    if identity is not None:
+        identity_cache.set(auth_user.id, identity)
+    return identity
+
+
+def get_request_identity(request, prefer_app_user=False):
+    """
+    Identity for the current request, resolved at most once per request.
+    IdentityJWTAuthentication attaches it lazily; other auth paths fall back
+    to resolving (and memoising) here.
+    With prefer_app_user, a company admin who also has a users row is
+    resolved as that users profile (the users table is checked first).
+    """
+    django_request = getattr(request, '_request', request)
+    if not hasattr(django_request, 'identity'):
+        django_request.identity = resolve_identity(request.user)
+    identity = django_request.identity
+    if prefer_app_user and identity is not None and identity.app_identity is not None:
+        return identity.app_identity
+    return identity
@@ -0,0 +1,30 @@
+# users/signals.py - Keep the identity cache in sync with profile changes
+
+from django.contrib.auth.models import User as DjangoUser
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from companies.models import CompanyAdmin, Department
+from users.identity import identity_cache
+from users.models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_app_user_identity(sender, instance, **kwargs):
+    identity_cache.invalidate_app_user(instance.id)
+
+
+@receiver([post_save, post_delete], sender=CompanyAdmin)
+def invalidate_company_admin_identity(sender, instance, **kwargs):
+    identity_cache.invalidate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=DjangoUser)
+def invalidate_auth_user_identity(sender, instance, **kwargs):
+    identity_cache.invalidate(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Department)
+def invalidate_department_identities(sender, instance, **kwargs):
+    # Department changes are rare; drop everything rather than track members
+    identity_cache.clear()
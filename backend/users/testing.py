@@ -0,0 +1,25 @@
+# users/testing.py - Shared test helpers
+
+from django.db import connection
+from django.test import TestCase
+
+from users.models import User
+
+
+class UsersTableTestCase(TestCase):
+    """
+    public.users is unmanaged, so the test database has no table for it.
+    Create it for the duration of the test class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as editor:
+            editor.create_model(User)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as editor:
+            editor.delete_model(User)
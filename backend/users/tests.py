@@ -1,3 +1,130 @@
-from django.test import TestCase
+import uuid
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User as DjangoUser
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase
+
+from companies.models import Company, CompanyAdmin, Department
+from users.identity import IdentityCache, UserIdentity, identity_cache, resolve_identity
+from users.models import User
+from users.testing import UsersTableTestCase
+
+
+def _identity(app_user_id=None):
+    return SimpleNamespace(app_user_id=app_user_id)
+
+
+class IdentityCacheTests(SimpleTestCase):
+
+    def test_hit_returns_cached_identity(self):
+        cache = IdentityCache(max_size=4, ttl=60)
+        identity = _identity()
+        cache.set(1, identity)
+        self.assertIs(cache.get(1), identity)
+        self.assertIsNone(cache.get(2))
+
+    def test_entries_expire_after_ttl(self):
+        cache = IdentityCache(max_size=4, ttl=60)
+        with mock.patch('users.identity.time.monotonic', return_value=1000.0):
+            cache.set(1, _identity())
+        with mock.patch('users.identity.time.monotonic', return_value=1059.0):
+            self.assertIsNotNone(cache.get(1))
+        with mock.patch('users.identity.time.monotonic', return_value=1060.0):
+            self.assertIsNone(cache.get(1))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = IdentityCache(max_size=2, ttl=60)
+        cache.set(1, _identity())
+        cache.set(2, _identity())
+        cache.get(1)
+        cache.set(3, _identity())
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(3))
+        self.assertEqual(len(cache), 2)
+
+    def test_invalidate_app_user(self):
+        cache = IdentityCache(max_size=4, ttl=60)
+        app_user_id = uuid.uuid4()
+        cache.set(1, _identity(app_user_id))
+        cache.set(2, _identity(uuid.uuid4()))
+        cache.invalidate_app_user(app_user_id)
+        self.assertIsNone(cache.get(1))
+        self.assertIsNotNone(cache.get(2))
+
+    def test_evicted_entry_leaves_app_user_index(self):
+        cache = IdentityCache(max_size=1, ttl=60)
+        app_user_id = uuid.uuid4()
+        cache.set(1, _identity(app_user_id))
+        cache.set(2, _identity())
+        self.assertNotIn(app_user_id, cache._app_user_index)
+
+
+class IdentityInvalidationTests(UsersTableTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Acme')
+        cls.admin_auth = DjangoUser.objects.create_user('admin', email='admin@example.com')
+        cls.employee_auth = DjangoUser.objects.create_user('employee', email='employee@example.com')
+        cls.employee = User.objects.create(
+            id=uuid.uuid4(), email='employee@example.com', name='Employee',
+            role='employee', company_id=cls.company.id,
+        )
+
+    def setUp(self):
+        identity_cache.clear()
+        self.addCleanup(identity_cache.clear)
+
+    def _cache_admin(self, app_user=None):
+        # company_admins in the migrated schema lags the model (old NOT NULL
+        # columns), so admins are built unsaved and their signals sent directly
+        admin = CompanyAdmin(user=self.admin_auth, company=self.company, full_name='Admin')
+        identity_cache.set(self.admin_auth.id, UserIdentity.from_company_admin(admin, self.admin_auth, app_user))
+        return admin
+
+    def test_identity_is_cached(self):
+        identity = resolve_identity(self.employee_auth)
+        self.assertEqual(identity.app_user_id, self.employee.id)
+        with self.assertNumQueries(0):
+            self.assertIs(resolve_identity(self.employee_auth), identity)
+
+    def test_saving_app_user_invalidates(self):
+        resolve_identity(self.employee_auth)
+        self.employee.role = 'manager'
+        self.employee.save()
+        self.assertIsNone(identity_cache.get(self.employee_auth.id))
+        self.assertEqual(resolve_identity(self.employee_auth).role, 'manager')
+
+    def test_saving_company_admin_invalidates(self):
+        admin = self._cache_admin()
+        post_save.send(sender=CompanyAdmin, instance=admin, created=False)
+        self.assertIsNone(identity_cache.get(self.admin_auth.id))
+
+    def test_saving_auth_user_invalidates(self):
+        resolve_identity(self.employee_auth)
+        self.employee_auth.save()
+        self.assertIsNone(identity_cache.get(self.employee_auth.id))
+
+    def test_saving_department_clears_cache(self):
+        resolve_identity(self.employee_auth)
+        self._cache_admin()
+        Department.objects.create(company=self.company, name='Backend')
+        self.assertEqual(len(identity_cache), 0)
+
+    def test_saving_admins_users_row_invalidates(self):
+        app_user = User.objects.create(
+            id=uuid.uuid4(), email='admin@example.com', name='Admin',
+            role='hr', company_id=self.company.id,
+        )
+        self._cache_admin(app_user)
+        identity = identity_cache.get(self.admin_auth.id)
+        self.assertEqual(identity.app_user_id, app_user.id)
+        self.assertEqual(identity.app_identity.role, 'hr')
+
+        app_user.role = 'manager'
+        app_user.save()
+        self.assertIsNone(identity_cache.get(self.admin_auth.id))
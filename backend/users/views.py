@@ -7,7 +7,8 @@ from .models import User
 import logging
 from django.db import transaction
 from django.contrib.auth.models import User as DjangoUser
-from companies.models import Department, CompanyAdmin
+from companies.models import Department
+from .identity import get_request_identity
 from .serializers import (
     AddDepartmentSerializer,
     AddEmployeeSerializer,
@@ -301,13 +302,11 @@ class UserViewSet(viewsets.ViewSet):
     def add_department(self, request):
         """Create new department"""
         try:
-            try:
-                company_admin = CompanyAdmin.objects.get(user=request.user)
-                company = company_admin.company
-                
-            except CompanyAdmin.DoesNotExist:
+            identity = get_request_identity(request)
+            if identity is None or identity.role != 'company_admin':
                 return Response({'success': False, 'error': 'Company admin not found'}, 
                               status=status.HTTP_404_NOT_FOUND)
+            company_id = identity.company_id
             
             serializer = AddDepartmentSerializer(data=request.data)
             if not serializer.is_valid():
@@ -318,7 +317,7 @@ class UserViewSet(viewsets.ViewSet):
 
             # ✅ Step 3: Check for duplicate code in this company
             if Department.objects.filter(
-                company_id=company.id, 
+                company_id=company_id, 
                 code=validated_data['code'].upper()  # Case-insensitive check
             ).exists():
                 return Response(
@@ -326,14 +325,14 @@ class UserViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST)
             
             # Check for duplicate code
-            if Department.objects.filter(company_id=company.id, code=validated_data['code']).exists():
+            if Department.objects.filter(company_id=company_id, code=validated_data['code']).exists():
                 return Response({'success': False, 'error': f"Code {validated_data['code']} already exists"},
                               status=status.HTTP_400_BAD_REQUEST)
             
             # Create department
             department = Department.objects.create(
                 id=uuid.uuid4(),
-                company_id=company.id,
+                company_id=company_id,
                 name=validated_data['name'],
                 code=validated_data['code'],
                 description=validated_data['description'],
@@ -351,23 +350,16 @@ class UserViewSet(viewsets.ViewSet):
     def list_departments(self, request):
         """List all departments for company - Works for all roles"""
         try:
-            # Try to get current user from custom users table first
-            try:
-                current_user = User.objects.get(email=request.user.email)
-                company_id = current_user.company_id
-                current_user_role = current_user.role
-                
-            except User.DoesNotExist:
-                # Fallback: Check if they're a company admin
-                try:
-                    company_admin = CompanyAdmin.objects.get(user=request.user)
-                    company_id = company_admin.company.id
-                    current_user_role = 'company_admin'
-                except CompanyAdmin.DoesNotExist:
-                    return Response(
-                        {'success': False, 'error': 'User not found in system'},
-                        status=status.HTTP_404_NOT_FOUND
-                    )
+            # Resolve role and company (cached per auth user); the users table
+            # takes precedence over CompanyAdmin here, as it always has
+            identity = get_request_identity(request, prefer_app_user=True)
+            if identity is None:
+                return Response(
+                    {'success': False, 'error': 'User not found in system'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            company_id = identity.company_id
+            current_user_role = identity.role
             
             # Permission check
             if current_user_role not in ['company_admin', 'hr', 'manager', 'team_lead']:
@@ -421,27 +413,18 @@ class UserViewSet(viewsets.ViewSet):
             company_id = None
             requester_name = 'Unknown'
             
-            # Check if CompanyAdmin
-            try:
-                admin = CompanyAdmin.objects.get(user=request.user)
-                user_role = 'company_admin'
-                company_id = admin.company.id
-                requester_name = admin.full_name
-                print(f"✓ CompanyAdmin found: {requester_name}")
-            except CompanyAdmin.DoesNotExist:
-                # Check if HR/Manager in users table ← THIS IS THE FIX
-                try:
-                    custom_user = User.objects.get(email=request.user.email)
-                    user_role = custom_user.role
-                    company_id = custom_user.company_id
-                    requester_name = custom_user.name
-                    print(f"✓ User found in users table: {requester_name} (role: {user_role})")
-                except User.DoesNotExist:
-                    print("❌ User not found in either table")
-                    return Response({
-                        'success': False,
-                        'error': 'User not found'
-                    }, status=status.HTTP_404_NOT_FOUND)
+            # CompanyAdmin or HR/Manager in users table (cached per auth user)
+            identity = get_request_identity(request)
+            if identity is None:
+                print("❌ User not found in either table")
+                return Response({
+                    'success': False,
+                    'error': 'User not found'
+                }, status=status.HTTP_404_NOT_FOUND)
+            user_role = identity.role
+            company_id = identity.company_id
+            requester_name = identity.name
+            print(f"✓ Requester found: {requester_name} (role: {user_role})")
             
             # ========== CHECK PERMISSION ==========
             
@@ -641,24 +624,16 @@ class UserViewSet(viewsets.ViewSet):
     def list_employees(self, request):
         """List employees based on user role"""
         try:
-            # Try to get current user from custom users table
-            try:
-                current_user = User.objects.get(email=request.user.email)
-            except User.DoesNotExist:
-                # If user not found, check if they're a company admin
-                try:
-                    company_admin = CompanyAdmin.objects.get(user=request.user)
-                    company_id = company_admin.company.id
-                    # Create a temporary admin context
-                    current_user_role = 'company_admin'
-                except CompanyAdmin.DoesNotExist:
-                    return Response(
-                        {'success': False, 'error': 'User not found in system'},
-                        status=status.HTTP_404_NOT_FOUND
-                    )
-            else:
-                company_id = current_user.company_id
-                current_user_role = current_user.role
+            # Resolve role and company (cached per auth user); the users table
+            # takes precedence over CompanyAdmin here, as it always has
+            current_user = get_request_identity(request, prefer_app_user=True)
+            if current_user is None:
+                return Response(
+                    {'success': False, 'error': 'User not found in system'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            company_id = current_user.company_id
+            current_user_role = current_user.role
             
             # Get company
             if not company_id:
@@ -756,25 +731,17 @@ class UserViewSet(viewsets.ViewSet):
             requester_role = 'unknown'
             requester_email = request.user.email
             
-            # Check if CompanyAdmin
-            try:
-                admin = CompanyAdmin.objects.get(user=request.user)
-                requester_role = 'company_admin'
-                company_id = admin.company.id
-                print(f"✓ Requester: CompanyAdmin ({admin.full_name})")
-            except CompanyAdmin.DoesNotExist:
-                # Check if HR in users table
-                try:
-                    custom_user = User.objects.get(email=requester_email)
-                    requester_role = custom_user.role
-                    company_id = custom_user.company_id
-                    print(f"✓ Requester: {requester_role} ({custom_user.name})")
-                except User.DoesNotExist:
-                    print("❌ Requester not found")
-                    return Response({
-                        'success': False,
-                        'error': 'User not found'
-                    }, status=status.HTTP_404_NOT_FOUND)
+            # CompanyAdmin or HR in users table (cached per auth user)
+            identity = get_request_identity(request)
+            if identity is None:
+                print("❌ Requester not found")
+                return Response({
+                    'success': False,
+                    'error': 'User not found'
+                }, status=status.HTTP_404_NOT_FOUND)
+            requester_role = identity.role
+            company_id = identity.company_id
+            print(f"✓ Requester: {requester_role} ({identity.name})")
             
             # ========== CHECK PERMISSION ==========
             
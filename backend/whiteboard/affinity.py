@@ -0,0 +1,362 @@
+# backend/whiteboard/affinity.py - One owning worker per active board, via leases
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+import redis
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .engine import InvalidOp, engine
+from .models import Whiteboard
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = 'whiteboard:owner:{board_id}'
+
+# Take the lease when free (or already ours) and extend it; return the holder
+ACQUIRE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current or current == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return ARGV[1]
+end
+return current
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class BoardUnavailable(Exception):
+    """No worker could apply ops to the board in time"""
+
+
+class OutcomeUnknown(BoardUnavailable):
+    """Ops were forwarded but no answer came back; they may or may not have been applied"""
+
+
+class BoardMoved(Exception):
+    """The worker asked to apply ops no longer owns the board"""
+
+
+def _lease_ttl():
+    return getattr(settings, 'WHITEBOARD_LEASE_TTL_SECONDS', 10)
+
+
+def _forward_timeout():
+    return getattr(settings, 'WHITEBOARD_FORWARD_TIMEOUT_SECONDS', 5)
+
+
+# ============================================
+# LEASE STORES
+# ============================================
+
+class RedisLeaseStore:
+    """
+    One key per board holding the owner's channel name, with a TTL the owner
+    keeps extending. When the owner dies the key expires and the next worker
+    to claim the board takes it over.
+    """
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._acquire = self.client.register_script(ACQUIRE_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+
+    def acquire(self, board_id, owner, ttl):
+        return self._acquire(keys=[LEASE_KEY.format(board_id=board_id)], args=[owner, int(ttl * 1000)])
+
+    def renew(self, board_ids, owner, ttl):
+        """Extend leases on board_ids; returns the ones another worker holds now"""
+        board_ids = list(board_ids)
+        pipe = self.client.pipeline(transaction=False)
+        for board_id in board_ids:
+            self._acquire(keys=[LEASE_KEY.format(board_id=board_id)], args=[owner, int(ttl * 1000)], client=pipe)
+        return {board_id for board_id, holder in zip(board_ids, pipe.execute()) if holder != owner}
+
+    def release(self, board_id, owner):
+        self._release(keys=[LEASE_KEY.format(board_id=board_id)], args=[owner])
+
+    def owner(self, board_id):
+        return self.client.get(LEASE_KEY.format(board_id=board_id))
+
+
+class MemoryLeaseStore:
+    """Process-local store with the same semantics, for tests and single-process dev"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases = {}
+
+    def _holder(self, board_id):
+        owner, expires = self._leases.get(board_id, (None, 0))
+        return owner if expires > time.time() else None
+
+    def acquire(self, board_id, owner, ttl):
+        with self._lock:
+            current = self._holder(board_id)
+            if current is None or current == owner:
+                self._leases[board_id] = (owner, time.time() + ttl)
+                return owner
+            return current
+
+    def renew(self, board_ids, owner, ttl):
+        return {board_id for board_id in board_ids if self.acquire(board_id, owner, ttl) != owner}
+
+    def release(self, board_id, owner):
+        with self._lock:
+            if self._holder(board_id) == owner:
+                del self._leases[board_id]
+
+    def owner(self, board_id):
+        with self._lock:
+            return self._holder(board_id)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_lease_store():
+    """Store selected by WHITEBOARD_AFFINITY_BACKEND ('redis' or 'memory')"""
+    backend = getattr(settings, 'WHITEBOARD_AFFINITY_BACKEND', 'redis')
+    with _stores_lock:
+        if backend not in _stores:
+            if backend == 'memory':
+                _stores[backend] = MemoryLeaseStore()
+            else:
+                _stores[backend] = RedisLeaseStore(
+                    getattr(settings, 'WHITEBOARD_AFFINITY_REDIS_URL', 'redis://127.0.0.1:6379/1')
+                )
+        return _stores[backend]
+
+
+# ============================================
+# ROUTER
+# ============================================
+
+class BoardRouter:
+    """
+    Board ownership for one worker process. Each active board is owned by the
+    worker holding its lease: only the owner keeps the board open in the
+    engine (in-memory state, compaction), and the other workers forward their
+    clients' ops to it as 'board.submit' messages on the owner's channel and
+    wait for the 'board.result'.
+
+    A worker claims a board when its first local client joins, or when it has
+    ops to submit and the lease is free. It releases the board, after
+    compacting it, when its last local client leaves. Leases are extended
+    every third of WHITEBOARD_LEASE_TTL_SECONDS; if an owner stops doing so
+    its lease expires and the next worker with ops for the board takes over.
+
+    Ownership is an optimisation, not what keeps the log consistent: REST
+    writes are applied by whichever process serves them, and a lease can
+    lapse while its old owner still runs. Every append is conditional on the
+    board's last_seq (see WhiteboardEngine), so a process whose state fell
+    behind reloads and retries instead of writing over newer ops.
+    """
+
+    def __init__(self, channel_layer=None, store=None):
+        self._channel_layer = channel_layer
+        self._store = store
+        self._reset(None)
+
+    @property
+    def channel_layer(self):
+        return self._channel_layer or get_channel_layer()
+
+    @property
+    def store(self):
+        return self._store or get_lease_store()
+
+    def _reset(self, loop):
+        # Tasks and futures belong to one event loop
+        self._loop = loop
+        self._ready = None
+        self._tasks = []
+        self.channel = None
+        self.local = {}
+        self.owned = set()
+        self.pending = {}
+
+    async def start(self):
+        """Open this worker's channel and start listening on it (once per event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._reset(loop)
+        if self._ready is None:
+            self._ready = asyncio.ensure_future(self._open())
+        await asyncio.shield(self._ready)
+
+    async def _open(self):
+        self.channel = await self.channel_layer.new_channel('whiteboard.worker')
+        self._tasks = [asyncio.ensure_future(self._listen()), asyncio.ensure_future(self._renew())]
+
+    async def stop(self):
+        """Release every owned board and stop listening"""
+        for board_id in list(self.owned):
+            await self._drop(board_id, release=True)
+        for task in self._tasks:
+            task.cancel()
+        self._reset(asyncio.get_running_loop())
+
+    # ---------- ownership ----------
+
+    async def join(self, board_id):
+        """A local client opened the board; claim it if nobody owns it"""
+        await self.start()
+        self.local[board_id] = self.local.get(board_id, 0) + 1
+        await self.claim(board_id)
+
+    async def leave(self, board_id):
+        count = self.local.get(board_id, 0) - 1
+        if count > 0:
+            self.local[board_id] = count
+            return
+        self.local.pop(board_id, None)
+        if board_id in self.owned:
+            await self._drop(board_id, release=True)
+
+    async def claim(self, board_id):
+        """The board owner's channel, taking the lease when it is free"""
+        if board_id in self.owned:
+            return self.channel
+        owner = await sync_to_async(self.store.acquire)(board_id, self.channel, _lease_ttl())
+        if owner == self.channel and board_id not in self.owned:
+            self.owned.add(board_id)
+            await database_sync_to_async(engine.open)(board_id)
+        return owner
+
+    async def _drop(self, board_id, release):
+        self.owned.discard(board_id)
+        try:
+            # Compacts, so the next owner starts from a fresh snapshot
+            await database_sync_to_async(engine.close)(board_id)
+        except Exception:
+            logger.exception("Failed to close whiteboard %s", board_id)
+        if release:
+            await sync_to_async(self.store.release)(board_id, self.channel)
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(_lease_ttl() / 3)
+            if not self.owned:
+                continue
+            try:
+                lost = await sync_to_async(self.store.renew)(list(self.owned), self.channel, _lease_ttl())
+            except Exception:
+                logger.exception("Failed to renew whiteboard leases")
+                continue
+            for board_id in lost:
+                logger.warning("Lost ownership of whiteboard %s", board_id)
+                await self._drop(board_id, release=False)
+
+    # ---------- ops ----------
+
+    async def submit(self, board_id, ops, author_id=None):
+        """
+        Apply ops on the board's owner: here, or forwarded to the worker that
+        owns it. Retries while the asked worker answers that it no longer owns
+        the board, up to one lease lifetime. A forward that gets no answer in
+        WHITEBOARD_FORWARD_TIMEOUT_SECONDS is not sent again, since the owner
+        may have applied it: that raises OutcomeUnknown, and the caller should
+        resync from the log. Later submits take the board over once the
+        silent owner's lease expires.
+        Raises InvalidOp, Whiteboard.DoesNotExist or BoardUnavailable.
+        """
+        await self.start()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + _lease_ttl() + _forward_timeout()
+        while True:
+            owner = await self.claim(board_id)
+            if owner == self.channel:
+                return await database_sync_to_async(engine.submit)(board_id, ops, author_id, fresh=False)
+            try:
+                return await self._forward(owner, board_id, ops, author_id)
+            except BoardMoved:
+                await asyncio.sleep(0.05)
+            except asyncio.TimeoutError:
+                logger.warning("Whiteboard %s owner %s did not answer", board_id, owner)
+                raise OutcomeUnknown(f"No answer from the owner of whiteboard {board_id}")
+            if loop.time() >= deadline:
+                raise BoardUnavailable(f"Whiteboard {board_id} has no reachable owner")
+
+    async def _forward(self, owner, board_id, ops, author_id):
+        request = uuid.uuid4().hex
+        future = self.pending[request] = asyncio.get_running_loop().create_future()
+        try:
+            await self.channel_layer.send(owner, {
+                'type': 'board.submit',
+                'request': request,
+                'reply_to': self.channel,
+                'board_id': board_id,
+                'ops': ops,
+                'author_id': author_id,
+            })
+            result = await asyncio.wait_for(future, _forward_timeout())
+        finally:
+            self.pending.pop(request, None)
+
+        error = result.get('error')
+        if error == 'invalid':
+            raise InvalidOp(result.get('detail'))
+        if error == 'missing':
+            raise Whiteboard.DoesNotExist(f"Whiteboard {board_id} no longer exists")
+        if error == 'moved':
+            raise BoardMoved()
+        if error:
+            raise BoardUnavailable(result.get('detail') or error)
+        return result['ops']
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self.channel_layer.receive(self.channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Whiteboard worker channel receive failed")
+                await asyncio.sleep(1)
+                continue
+            kind = message.get('type')
+            if kind == 'board.submit':
+                asyncio.ensure_future(self._serve(message))
+            elif kind == 'board.result':
+                future = self.pending.get(message.get('request'))
+                if future is not None and not future.done():
+                    future.set_result(message)
+
+    async def _serve(self, message):
+        board_id = message['board_id']
+        reply = {'type': 'board.result', 'request': message['request']}
+        if board_id not in self.owned:
+            reply['error'] = 'moved'
+        else:
+            try:
+                reply['ops'] = await database_sync_to_async(engine.submit)(
+                    board_id, message['ops'], message.get('author_id'), fresh=False,
+                )
+            except InvalidOp as e:
+                reply.update(error='invalid', detail=str(e))
+            except Whiteboard.DoesNotExist:
+                reply['error'] = 'missing'
+            except Exception:
+                logger.exception("Failed to apply forwarded ops to whiteboard %s", board_id)
+                reply['error'] = 'failed'
+        try:
+            await self.channel_layer.send(message['reply_to'], reply)
+        except Exception:
+            logger.exception("Failed to answer forwarded ops for whiteboard %s", board_id)
+
+
+router = BoardRouter()
@@ -0,0 +1,185 @@
+# backend/whiteboard/broadcast.py - Batched, frame-rate limited board broadcasts
+
+import asyncio
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Client actions relayed to the other clients; every other action name is
+# the server's (ops, sync, ack, ...) and is never relayed
+RELAYED_ACTIONS = ('cursor', 'selection', 'preview')
+# Relayed actions only editors may send (strokes being drawn)
+EDITOR_ACTIONS = ('preview',)
+# Relayed actions where only the latest event per sender (and shape) matters
+EPHEMERAL_ACTIONS = ('cursor', 'preview')
+
+
+def _tick():
+    return 1.0 / getattr(settings, 'WHITEBOARD_BROADCAST_HZ', 30)
+
+
+def _coalesce_key(event):
+    if event['action'] not in EPHEMERAL_ACTIONS:
+        return None
+    payload = event.get('payload')
+    shape_id = payload.get('id') if isinstance(payload, dict) else None
+    return event.get('sender_channel'), event['action'], shape_id
+
+
+class EventBuffer:
+    """
+    Events waiting to go out: ops (all kept, sent in seq order), relayed
+    messages (kept in order) and ephemeral events (latest per key only,
+    so a newer cursor position replaces the one still waiting).
+    """
+
+    def __init__(self):
+        self.ops = []
+        self.messages = []
+        self.latest = {}
+
+    def __len__(self):
+        return len(self.ops) + len(self.messages) + len(self.latest)
+
+    def add_ops(self, sender_channel, ops):
+        self.ops.extend((sender_channel, op) for op in ops)
+
+    def add_event(self, event):
+        key = _coalesce_key(event)
+        if key is None:
+            self.messages.append(event)
+        else:
+            # Re-insert so the dict keeps the latest arrival last
+            self.latest.pop(key, None)
+            self.latest[key] = event
+
+    def drain(self):
+        """(ops as [(sender_channel, op)] by seq, events) and empty the buffer"""
+        ops = sorted(self.ops, key=lambda pair: pair[1]['seq'])
+        events = self.messages + list(self.latest.values())
+        self.ops, self.messages, self.latest = [], [], {}
+        return ops, events
+
+
+class BoardBroadcaster:
+    """
+    Collects what this process's connections publish on one board and sends
+    it as a single 'board.batch' group message per tick
+    (WHITEBOARD_BROADCAST_HZ), instead of one group_send per pointer event.
+    Ticks are only scheduled while there is something to send.
+    """
+
+    def __init__(self, channel_layer, group_name):
+        self.channel_layer = channel_layer
+        self.group_name = group_name
+        self.buffer = EventBuffer()
+        self.connections = 0
+        self._handle = None
+
+    def publish_ops(self, sender_channel, ops):
+        self.buffer.add_ops(sender_channel, ops)
+        self._schedule()
+
+    def publish(self, sender_channel, action, payload):
+        self.buffer.add_event({'action': action, 'payload': payload, 'sender_channel': sender_channel})
+        self._schedule()
+
+    def _schedule(self):
+        if self._handle is None:
+            loop = asyncio.get_running_loop()
+            self._handle = loop.call_later(_tick(), lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        ops, events = self.buffer.drain()
+        if not (ops or events):
+            return
+        try:
+            await self.channel_layer.group_send(self.group_name, {
+                'type': 'board.batch',
+                'ops': [[sender_channel, op] for sender_channel, op in ops],
+                'events': events,
+            })
+        except Exception:
+            logger.exception("Failed to broadcast batch to %s", self.group_name)
+
+
+_broadcasters = {}
+
+
+def acquire_broadcaster(channel_layer, group_name):
+    """The process-wide broadcaster for a board group, shared by its local connections"""
+    broadcaster = _broadcasters.get(group_name)
+    if broadcaster is None:
+        broadcaster = _broadcasters[group_name] = BoardBroadcaster(channel_layer, group_name)
+    broadcaster.connections += 1
+    return broadcaster
+
+
+async def release_broadcaster(broadcaster):
+    broadcaster.connections -= 1
+    if broadcaster.connections <= 0:
+        if _broadcasters.get(broadcaster.group_name) is broadcaster:
+            del _broadcasters[broadcaster.group_name]
+        await broadcaster.flush()
+
+
+class ClientOutbox:
+    """
+    Per-connection send queue. Incoming batches are buffered and written by
+    one writer task, each pass as a single frame, so when the client's socket
+    is slow, waiting events pile up here and are coalesced: superseded
+    cursors and previews are replaced, relayed messages beyond
+    WHITEBOARD_CLIENT_MAX_PENDING are dropped oldest first, and if that many
+    ops are waiting they are dropped and the client is resynced from the op
+    log instead.
+    """
+
+    def __init__(self, send, resync, max_pending=None):
+        self.send = send
+        self.resync = resync
+        self.max_pending = max_pending or getattr(settings, 'WHITEBOARD_CLIENT_MAX_PENDING', 1000)
+        self.buffer = EventBuffer()
+        self.resync_since = None
+        self._writer = None
+
+    def push(self, ops=(), events=()):
+        buffer = self.buffer
+        buffer.ops.extend(ops)
+        for event in events:
+            buffer.add_event(event)
+
+        if len(buffer.ops) > self.max_pending:
+            first = min(op['seq'] for _, op in buffer.ops)
+            self.resync_since = first - 1 if self.resync_since is None else min(self.resync_since, first - 1)
+            buffer.ops = []
+        if len(buffer.messages) > self.max_pending:
+            del buffer.messages[:-self.max_pending]
+
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.ensure_future(self._write())
+
+    async def _write(self):
+        try:
+            while len(self.buffer) or self.resync_since is not None:
+                if self.resync_since is not None:
+                    since, self.resync_since = self.resync_since, None
+                    await self.resync(since)
+                    continue
+                ops, events = self.buffer.drain()
+                frame = []
+                if ops:
+                    frame.append({'action': 'ops', 'payload': {'ops': [op for _, op in ops]}})
+                frame.extend({'action': event['action'], 'payload': event['payload']} for event in events)
+                await self.send({'action': 'batch', 'payload': {'events': frame}})
+        except Exception:
+            logger.exception("Failed to write whiteboard batch")
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
@@ -1,53 +1,195 @@
 # whiteboard/consumers.py
 import json
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from chat.presence import ConnectionPresence
+from .affinity import BoardUnavailable, OutcomeUnknown, router
+from .broadcast import EDITOR_ACTIONS, RELAYED_ACTIONS, ClientOutbox, acquire_broadcaster, release_broadcaster
+from .engine import InvalidOp, ops_since
+from .models import Whiteboard
 
 class WhiteboardConsumer(AsyncJsonWebsocketConsumer):
     """
-    Simple broadcast consumer:
-      - Clients join group "whiteboard_<board_id>"
-      - Clients send JSON messages {action: "...", payload: {...}}
-      - Server rebroadcasts to group so all connected clients receive updates
-    You can extend with auth checks, rate limiting, and persistence hooks.
+    Board consumer, speaking a delta protocol:
+      - Clients join group "whiteboard_<board_id>" and first receive
+        {action: "sync", payload: {snapshot, snapshot_seq, ops, seq}}.
+        Reconnecting with ?since=<seq> sends only the ops after it when the
+        log still has them ({ops, seq}, no snapshot).
+      - {action: "op", payload: {"ref": ..., "ops": [...]}} (or a single op as
+        the payload) is applied by the whiteboard engine (owner/staff only).
+        Ops are {"op": "add", "shape": {...}}, {"op": "update", "id", "fields": {...}},
+        {"op": "update", "id", "patch": [{"op": "add"|"replace"|"remove", "path", "value"}]}
+        or {"op": "delete", "id"}.
+      - The sender gets {action: "ack", payload: {ref, ops: [{seq, id}]}};
+        everyone else gets the ops in the next batch.
+      - {action: "cursor" | "selection" | "preview", payload} is relayed to the
+        other clients as-is ("preview" from editors only); for "cursor" and
+        "preview" only the latest per sender (and payload id) is kept. Nothing
+        is echoed back to its sender. Other actions get an "error".
+      - Outgoing traffic is batched: the board's ops and relays are sent as
+        {action: "batch", payload: {events: [{action: "ops", payload: {ops}}, {action, payload}, ...]}}
+        at most WHITEBOARD_BROADCAST_HZ times a second (see whiteboard.broadcast).
+        A client too slow to keep up is sent a "sync" instead of the ops it missed.
+      - Sequence numbers are contiguous per board; clients drop seqs they
+        already have. One that sees a gap that does not fill shortly sends
+        {action: "resync", payload: {"since": <last seq>}}.
+      - Each active board is owned by one worker process (see
+        whiteboard.affinity); ops sent to a connection on another worker are
+        forwarded to the owner, so the board's state lives in one place.
     """
     async def connect(self):
-        # expected URL: ws/whiteboard/<board_id>/
-        self.board_id = self.scope["url_route"]["kwargs"].get("board_id")
+        # expected URL: ws/whiteboard/<board_id>/ (routed as room_id)
+        kwargs = self.scope["url_route"]["kwargs"]
+        self.board_id = kwargs.get("board_id") or kwargs.get("room_id")
         self.group_name = f"whiteboard_{self.board_id}"
-        # Optional: you can check user auth in scope["user"] here
+        self.presence = None
+        self.joined = False
+
+        user = self.scope.get("user")
+        board = await self.get_board()
+        if board is None or not board.can_view(user):
+            await self.close(code=4403)
+            return
+        self.board_id = board.id
+        self.can_edit = board.can_edit(user)
+
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        self.broadcaster = acquire_broadcaster(self.channel_layer, self.group_name)
+        self.outbox = ClientOutbox(self.send_json, self.send_sync)
+
+        # Claim the board for this worker unless another one owns it, and send the late-joiner state
+        await router.join(self.board_id)
+        self.joined = True
+        await self.send_sync(self.since_from_query())
+
+        # Track who is on the board (authenticated users only)
+        if user is not None and user.is_authenticated:
+            self.presence = ConnectionPresence(user.id, self.channel_name)
+            self.presence.start()
+            await self.presence.join(f"whiteboard:{self.board_id}")
 
     async def disconnect(self, code):
+        if getattr(self, "presence", None) is not None:
+            await self.presence.stop()
+        if getattr(self, "broadcaster", None) is not None:
+            self.outbox.close()
+            await release_broadcaster(self.broadcaster)
+            self.broadcaster = None
+        if getattr(self, "joined", False):
+            self.joined = False
+            await router.leave(self.board_id)
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
     async def receive_json(self, content, **kwargs):
         """
         Handle incoming JSON from a client and broadcast to group.
-        content should be: {"action":"update_canvas","payload":{...}}
+        content should be: {"action":"op","payload":{...}}, a resync or a relayed {"action", "payload"}
         """
         action = content.get("action")
         payload = content.get("payload")
-        # You might validate content here or persist to DB
-        await self.channel_layer.group_send(
-            self.group_name,
-            {
-                "type": "board.message",
-                "action": action,
-                "payload": payload,
-                "sender_channel": self.channel_name,
-            }
+        if action == "op":
+            await self.submit_ops(payload)
+            return
+        if action == "resync":
+            await self.send_sync(self.parse_seq((payload or {}).get("since") if isinstance(payload, dict) else None))
+            return
+
+        if action not in RELAYED_ACTIONS or (action in EDITOR_ACTIONS and not self.can_edit):
+            await self.send_error(f"Unsupported action {action!r}")
+            return
+        self.broadcaster.publish(self.channel_name, action, payload)
+
+    async def submit_ops(self, payload):
+        if not self.can_edit:
+            await self.send_error("You cannot edit this board")
+            return
+        ref = None
+        if isinstance(payload, dict) and "ops" in payload:
+            ref = payload.get("ref")
+            ops = payload["ops"] if isinstance(payload["ops"], list) else [payload["ops"]]
+        else:
+            ops = [payload]
+
+        try:
+            applied = await router.submit(self.board_id, ops, self.scope["user"].id)
+        except InvalidOp as e:
+            await self.send_error(str(e), ref=ref)
+            return
+        except OutcomeUnknown:
+            # The ops may have been applied; the client reconciles from the log
+            await self.send_error("Board did not answer, resyncing", ref=ref)
+            await self.send_sync()
+            return
+        except BoardUnavailable:
+            await self.send_error("Board is busy, try again", ref=ref)
+            return
+        except Whiteboard.DoesNotExist:
+            await self.close(code=4404)
+            return
+
+        await self.send_json({
+            "action": "ack",
+            "payload": {"ref": ref, "ops": [{"seq": op["seq"], "id": op.get("id")} for op in applied]},
+        })
+        self.broadcaster.publish_ops(self.channel_name, applied)
+
+    async def send_error(self, detail, ref=None):
+        await self.send_json({"action": "error", "payload": {"detail": detail, "ref": ref}})
+
+    async def send_sync(self, since=None):
+        try:
+            payload = await database_sync_to_async(ops_since)(self.board_id, since)
+        except Whiteboard.DoesNotExist:
+            await self.close(code=4404)
+            return
+        await self.send_json({"action": "sync", "payload": payload})
+
+    def since_from_query(self):
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        return self.parse_seq((query.get("since") or [None])[0])
+
+    @staticmethod
+    def parse_seq(value):
+        try:
+            return int(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    @database_sync_to_async
+    def get_board(self):
+        try:
+            return Whiteboard.objects.only("id", "owner_id", "is_public").get(id=self.board_id)
+        except (Whiteboard.DoesNotExist, ValueError):
+            return None
+
+    async def presence_diff(self, event):
+        await self.send_json({
+            "action": "presence_diff",
+            "payload": {
+                "joined": event.get("joined"),
+                "left": event.get("left"),
+            },
+        })
+
+    async def board_batch(self, event):
+        """
+        One tick of a board broadcaster. Drop this connection's own events
+        (ops are acked separately) and queue the rest for the client.
+        """
+        self.outbox.push(
+            ops=[(sender, op) for sender, op in event.get("ops", []) if sender != self.channel_name],
+            events=[e for e in event.get("events", []) if e.get("sender_channel") != self.channel_name],
         )
 
     async def board_message(self, event):
         """
-        Handler for messages sent to the group.
-        We forward to WebSocket clients. We attach 'action' and 'payload'.
+        Handler for single messages sent to the group (ops applied over REST).
         """
-        # Optionally avoid echoing back to sender (if you want)
-        # if event.get("sender_channel") == self.channel_name:
-        #     return
-        await self.send_json({
-            "action": event.get("action"),
-            "payload": event.get("payload"),
-        })
+        if event.get("sender_channel") == self.channel_name:
+            return
+        if event.get("action") == "ops":
+            self.outbox.push(ops=[(None, op) for op in event["payload"]["ops"]])
+        else:
+            self.outbox.push(events=[event])
@@ -0,0 +1,87 @@
+# backend/whiteboard/encoding.py - Compact binary canvas format
+
+import json
+import zlib
+
+from django.conf import settings
+
+CANVAS_JSON = 'json'
+CANVAS_PACKED = 'packed'
+CANVAS_FORMATS = (CANVAS_JSON, CANVAS_PACKED)
+
+# Model fields that together hold a board's canvas
+CANVAS_FIELDS = ('canvas_format', 'canvas_json', 'canvas_packed')
+
+MAGIC = b'WB\x01'
+COMPRESSION_LEVEL = 6
+# Shape table schema for entries that are not objects
+RAW_SCHEMA = -1
+
+
+class InvalidCanvasData(ValueError):
+    """Bytes that are not a packed canvas"""
+
+
+def default_format():
+    fmt = getattr(settings, 'WHITEBOARD_CANVAS_FORMAT', CANVAS_JSON)
+    if fmt not in CANVAS_FORMATS:
+        raise ValueError(f"WHITEBOARD_CANVAS_FORMAT must be one of {', '.join(CANVAS_FORMATS)}")
+    return fmt
+
+
+def pack_canvas(canvas):
+    """
+    Canvas -> zlib-compressed shape table. Shapes sharing a set of keys share
+    one schema row, so each shape stores only its values:
+    {'meta': {...}, 'keys': [[key, ...], ...], 'rows': [[schema, value, ...], ...]}.
+    Key order, shape order and non-object entries survive the round trip.
+    """
+    meta = dict(canvas or {})
+    shapes = meta.pop('shapes', None)
+    if shapes is not None and not isinstance(shapes, list):
+        # Nothing to tabulate; keep it as it came
+        meta['shapes'] = shapes
+        shapes = None
+
+    schemas, keys, rows = {}, [], []
+    for shape in shapes or []:
+        if not isinstance(shape, dict):
+            rows.append([RAW_SCHEMA, shape])
+            continue
+        schema = tuple(shape)
+        index = schemas.get(schema)
+        if index is None:
+            index = schemas[schema] = len(keys)
+            keys.append(list(schema))
+        rows.append([index, *shape.values()])
+
+    table = {'meta': meta, 'keys': keys, 'rows': rows if shapes is not None else None}
+    body = json.dumps(table, separators=(',', ':'), ensure_ascii=False).encode()
+    return MAGIC + zlib.compress(body, COMPRESSION_LEVEL)
+
+
+def unpack_canvas(data):
+    """Inverse of pack_canvas"""
+    data = bytes(data)
+    if not data.startswith(MAGIC):
+        raise InvalidCanvasData("unknown canvas encoding")
+    try:
+        table = json.loads(zlib.decompress(data[len(MAGIC):]))
+        canvas = dict(table['meta'])
+        if table['rows'] is not None:
+            keys = table['keys']
+            canvas['shapes'] = [
+                row[1] if row[0] == RAW_SCHEMA else dict(zip(keys[row[0]], row[1:]))
+                for row in table['rows']
+            ]
+    except (zlib.error, ValueError, KeyError, IndexError, TypeError) as exc:
+        raise InvalidCanvasData(f"corrupt packed canvas: {exc}") from exc
+    return canvas
+
+
+def canvas_fields(canvas, fmt=None):
+    """Values of CANVAS_FIELDS storing canvas in fmt (default WHITEBOARD_CANVAS_FORMAT)"""
+    fmt = fmt or default_format()
+    if fmt == CANVAS_PACKED:
+        return {'canvas_format': CANVAS_PACKED, 'canvas_json': {}, 'canvas_packed': pack_canvas(canvas)}
+    return {'canvas_format': CANVAS_JSON, 'canvas_json': canvas, 'canvas_packed': None}
@@ -0,0 +1,674 @@
+# backend/whiteboard/engine.py - Server-side board state, op log and snapshots
+
+import copy
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .encoding import CANVAS_FIELDS, canvas_fields
+from .models import Whiteboard, WhiteboardOp
+from .spatial import SpatialIndex, query_viewport
+from .thumbnails import schedule_thumbnail
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+MAX_SHAPE_ID_LENGTH = 64
+PATCH_OPS = ('add', 'replace', 'remove')
+
+# Op kind -> key carrying its data, in both client and server payloads
+OP_DATA_KEYS = {
+    'add': 'shape',
+    'update': 'fields',
+    'reset': 'canvas',
+}
+
+
+class InvalidOp(ValueError):
+    """An operation the board cannot apply"""
+
+
+class StaleState(Exception):
+    """The board moved past the in-memory state an append was based on"""
+
+
+def _compact_every():
+    return getattr(settings, 'WHITEBOARD_COMPACT_EVERY', 200)
+
+
+def split_canvas(canvas):
+    """
+    Stored canvas -> (meta, shapes by id). Legacy shapes without an id get one
+    from their position, so every reader of the same snapshot agrees on it.
+    """
+    meta = dict(canvas or {})
+    shapes = {}
+    for index, shape in enumerate(meta.pop('shapes', None) or []):
+        shape = dict(shape) if isinstance(shape, dict) else {'value': shape}
+        shape['id'] = str(shape.get('id') or f's{index}')
+        shapes[shape['id']] = shape
+    return meta, shapes
+
+
+def join_canvas(meta, shapes):
+    return {**meta, 'shapes': list(shapes.values())}
+
+
+def canvas_stats(canvas):
+    """Listing stats stored on the board alongside a canvas"""
+    shapes = canvas.get('shapes') if isinstance(canvas, dict) else None
+    return {
+        'shape_count': len(shapes or []),
+        'canvas_bytes': len(json.dumps(canvas, separators=(',', ':')).encode()),
+    }
+
+
+# ============================================
+# FIELD UPDATES
+# ============================================
+
+def _pointer(path):
+    """JSON pointer ('/style/color', '/points/-') -> tokens"""
+    if not isinstance(path, str) or not path.startswith('/'):
+        raise InvalidOp(f"invalid patch path {path!r}")
+    tokens = [token.replace('~1', '/').replace('~0', '~') for token in path[1:].split('/')]
+    if tokens[0] == 'id':
+        raise InvalidOp("shape ids cannot be changed")
+    return tokens
+
+
+def _index(container, token, allow_end=False):
+    if allow_end and token == '-':
+        return len(container)
+    if not token.isdigit():
+        raise InvalidOp(f"invalid list index {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise InvalidOp(f"list index {index} out of range")
+    return index
+
+
+def _child(container, token):
+    if isinstance(container, dict):
+        if token not in container:
+            raise InvalidOp(f"no field {token!r}")
+        return container[token]
+    if isinstance(container, list):
+        return container[_index(container, token)]
+    raise InvalidOp(f"cannot descend into {token!r}")
+
+
+def validate_patch(patch):
+    if not isinstance(patch, list) or not patch:
+        raise InvalidOp("patch must be a non-empty list")
+    for operation in patch:
+        if not isinstance(operation, dict) or operation.get('op') not in PATCH_OPS:
+            raise InvalidOp(f"patch ops must be one of {', '.join(PATCH_OPS)}")
+        _pointer(operation.get('path'))
+        if operation['op'] != 'remove' and 'value' not in operation:
+            raise InvalidOp(f"patch {operation['op']} requires a value")
+
+
+def apply_patch(shape, patch):
+    """Apply JSON-patch-style add/replace/remove operations to a shape in place"""
+    for operation in patch:
+        tokens = _pointer(operation['path'])
+        parent = shape
+        for token in tokens[:-1]:
+            parent = _child(parent, token)
+        token, kind = tokens[-1], operation['op']
+
+        if isinstance(parent, dict):
+            if kind != 'add' and token not in parent:
+                raise InvalidOp(f"no field {token!r}")
+            if kind == 'remove':
+                del parent[token]
+            else:
+                parent[token] = copy.deepcopy(operation['value'])
+        elif isinstance(parent, list):
+            index = _index(parent, token, allow_end=kind == 'add')
+            if kind == 'add':
+                parent.insert(index, copy.deepcopy(operation['value']))
+            elif kind == 'replace':
+                parent[index] = copy.deepcopy(operation['value'])
+            else:
+                del parent[index]
+        else:
+            raise InvalidOp(f"cannot update {operation['path']!r}")
+    return shape
+
+
+def update_shape(shape, data):
+    """
+    Apply an update op's data to a shape in place: a list is a patch, a dict
+    is merged field by field (a null value removes the field).
+    """
+    if isinstance(data, list):
+        return apply_patch(shape, data)
+    for field, value in data.items():
+        if value is None:
+            shape.pop(field, None)
+        else:
+            shape[field] = copy.deepcopy(value)
+    return shape
+
+
+def normalize_op(op):
+    """Validate a client op and return (kind, shape_id, data)"""
+    if not isinstance(op, dict):
+        raise InvalidOp("op must be an object")
+    kind = op.get('op')
+    if kind not in ('add', 'update', 'delete', 'reset'):
+        raise InvalidOp(f"unknown op {kind!r}")
+
+    data = op.get(OP_DATA_KEYS.get(kind, ''))
+    if kind == 'reset':
+        if not isinstance(data, dict):
+            raise InvalidOp("reset requires a canvas object")
+        return kind, '', data
+
+    if kind == 'add':
+        if not isinstance(data, dict):
+            raise InvalidOp("add requires a shape object")
+        shape_id = str(data.get('id') or op.get('id') or uuid.uuid4().hex)
+        data = {**data, 'id': shape_id}
+    else:
+        shape_id = str(op.get('id') or '')
+        if not shape_id:
+            raise InvalidOp(f"{kind} requires a shape id")
+        if kind == 'update' and 'patch' in op:
+            data = op['patch']
+            validate_patch(data)
+        elif kind == 'update':
+            if not isinstance(data, dict) or not data:
+                raise InvalidOp("update requires a fields object or a patch list")
+            if 'id' in data:
+                raise InvalidOp("shape ids cannot be changed")
+
+    if len(shape_id) > MAX_SHAPE_ID_LENGTH:
+        raise InvalidOp("shape id too long")
+    return kind, shape_id, data
+
+
+def op_payload(kind, seq, shape_id=None, data=None, author_id=None):
+    """Wire form of an applied op, the same shape clients send plus seq/author"""
+    payload = {'seq': seq, 'op': kind}
+    if shape_id:
+        payload['id'] = shape_id
+    if kind == 'update' and isinstance(data, list):
+        payload['patch'] = data
+    elif kind in OP_DATA_KEYS:
+        payload[OP_DATA_KEYS[kind]] = data
+    payload['author'] = author_id
+    return payload
+
+
+def _row_payload(row):
+    return op_payload(row.kind, row.seq, row.shape_id, row.data, row.author_id)
+
+
+def _tail(board_id, after_seq):
+    return WhiteboardOp.objects.filter(board_id=board_id, seq__gt=after_seq).order_by('seq')
+
+
+class BoardState:
+    """A board's shapes in memory, as of op `seq`"""
+
+    def __init__(self, board_id, canvas, seq):
+        self.board_id = board_id
+        self.meta, self.shapes = split_canvas(canvas)
+        self.seq = seq
+        self.snapshot_seq = seq
+        self.connections = 0
+        self.index = None
+        self.lock = threading.RLock()
+        # (connection, on_commit hook) of a transaction whose uncommitted ops are applied here
+        self.pending = None
+
+    def spatial(self):
+        """The shapes' spatial index, built on first use and then kept current"""
+        if self.index is None:
+            self.index = SpatialIndex(self.shapes)
+        return self.index
+
+    def apply(self, kind, shape_id, data):
+        self._apply(kind, shape_id, data)
+        if self.index is None:
+            return
+        if kind == 'reset':
+            self.index = None
+        elif shape_id not in self.shapes:
+            self.index.remove(shape_id)
+        elif kind == 'add':
+            self.index.add(shape_id, self.shapes[shape_id])
+        else:
+            self.index.update(shape_id, self.shapes[shape_id])
+
+    def _apply(self, kind, shape_id, data):
+        if kind == 'add':
+            self.shapes[shape_id] = copy.deepcopy(data)
+        elif kind == 'update':
+            shape = self.shapes.get(shape_id)
+            if shape is None:
+                return
+            try:
+                update_shape(shape, data)
+            except InvalidOp as e:
+                # Checked when written, so only a log edited out of band gets here
+                logger.warning("Skipping update of shape %s on board %s: %s", shape_id, self.board_id, e)
+        elif kind == 'delete':
+            self.shapes.pop(shape_id, None)
+        elif kind == 'reset':
+            self.meta, self.shapes = split_canvas(copy.deepcopy(data))
+
+    def replay(self, rows):
+        replayed = 0
+        for row in rows:
+            self.apply(row.kind, row.shape_id, row.data)
+            self.seq = row.seq
+            replayed += 1
+        return replayed
+
+    def catch_up(self):
+        """
+        Replay ops other processes appended since `seq`; returns how many.
+        If some were already compacted away, reload from the snapshot.
+        """
+        snapshot_seq, last_seq = Whiteboard.objects.filter(id=self.board_id).values_list(
+            'snapshot_seq', 'last_seq',
+        ).get()
+        if last_seq == self.seq:
+            return 0
+        if snapshot_seq > self.seq or last_seq < self.seq:
+            # Compacted past us, or holding ops that were never stored
+            return self.reload()
+        rows = list(_tail(self.board_id, self.seq))
+        if rows and rows[0].seq != self.seq + 1:
+            return self.reload()
+        return self.replay(rows)
+
+    def track(self):
+        """
+        After appending inside a transaction that is still open (e.g. a
+        request under ATOMIC_REQUESTS), remember it: if it rolls back, its
+        on_commit hook is dropped without running and settle() reloads.
+        """
+        conn = transaction.get_connection()
+        if not conn.in_atomic_block:
+            return
+
+        def committed():
+            with self.lock:
+                if self.pending is not None and self.pending[1] is committed:
+                    self.pending = None
+
+        self.pending = (conn, committed)
+        transaction.on_commit(committed)
+
+    def settle(self):
+        """
+        Reload if the state holds ops of a transaction that rolled back.
+        Returns False while they belong to a transaction still open on
+        another connection, i.e. the state is not safe to write back yet.
+        """
+        with self.lock:
+            if self.pending is None:
+                return True
+            conn, committed = self.pending
+            if any(hook is committed for _, hook, _ in conn.run_on_commit):
+                return conn is transaction.get_connection()
+            logger.info("Whiteboard %s ops were rolled back, reloading", self.board_id)
+            self.pending = None
+            self.reload()
+            # What this transaction wrote before a rolled-back savepoint is still uncommitted
+            self.track()
+            return True
+
+    def reload(self):
+        """Replace the shapes with the stored snapshot and tail; returns how many ops that moved"""
+        fresh = load_state(self.board_id)
+        moved = fresh.seq - self.seq
+        self.meta, self.shapes, self.seq, self.snapshot_seq = fresh.meta, fresh.shapes, fresh.seq, fresh.snapshot_seq
+        self.index = None
+        return moved
+
+    def check(self, ops):
+        """
+        Reject ops that do not fit the current shapes, in batch order.
+        Updates are dry-run on copies of the shapes they touch only.
+        Returns the number of shapes once the ops are applied.
+        """
+        shapes, pending = self.shapes, {}
+        for kind, shape_id, data in ops:
+            if kind == 'reset':
+                shapes, pending = split_canvas(data)[1], {}
+                continue
+            current = pending[shape_id] if shape_id in pending else shapes.get(shape_id)
+            if kind == 'add':
+                if current is not None:
+                    raise InvalidOp(f"shape {shape_id} already exists")
+                pending[shape_id] = data
+            elif current is None:
+                raise InvalidOp(f"unknown shape {shape_id}")
+            elif kind == 'delete':
+                pending[shape_id] = None
+            else:
+                pending[shape_id] = update_shape(copy.deepcopy(current), data)
+        return len(shapes) + sum((shape is not None) - (shape_id in shapes) for shape_id, shape in pending.items())
+
+    def canvas(self):
+        return join_canvas(self.meta, self.shapes)
+
+
+def load_state(board_id):
+    """Board snapshot plus its op tail, replayed"""
+    board = Whiteboard.objects.only('id', 'snapshot_seq', *CANVAS_FIELDS).get(id=board_id)
+    state = BoardState(board.id, board.canvas, board.snapshot_seq)
+    state.replay(_tail(board.id, board.snapshot_seq))
+    return state
+
+
+def snapshot_and_tail(board_id):
+    """
+    What a late joiner needs: the last compacted canvas and the ops after it.
+    Retries if a compaction lands between the two reads and leaves a gap.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        board = Whiteboard.objects.only('id', 'snapshot_seq', *CANVAS_FIELDS).get(id=board_id)
+        rows = list(_tail(board.id, board.snapshot_seq))
+        if not rows or rows[0].seq == board.snapshot_seq + 1:
+            break
+    return {
+        'snapshot': join_canvas(*split_canvas(board.canvas)),
+        'snapshot_seq': board.snapshot_seq,
+        'ops': [_row_payload(row) for row in rows],
+        'seq': rows[-1].seq if rows else board.snapshot_seq,
+    }
+
+
+def ops_since(board_id, since):
+    """
+    Resync for a client whose last seen op is `since`: just the ops after it
+    while they are still in the log, otherwise the full snapshot and tail.
+    """
+    if since is not None:
+        snapshot_seq = Whiteboard.objects.filter(id=board_id).values_list('snapshot_seq', flat=True).get()
+        if since >= snapshot_seq:
+            rows = list(_tail(board_id, since))
+            if not rows or rows[0].seq == since + 1:
+                return {
+                    'ops': [_row_payload(row) for row in rows],
+                    'seq': rows[-1].seq if rows else since,
+                }
+    return snapshot_and_tail(board_id)
+
+
+def materialize(boards):
+    """Bring the canvas of board instances up to date with their op tails, one query"""
+    boards = list(boards)
+    if not boards:
+        return boards
+    after = {board.id: board.snapshot_seq for board in boards}
+    tails = {}
+    for row in WhiteboardOp.objects.filter(board_id__in=after).order_by('board_id', 'seq'):
+        if row.seq > after[row.board_id]:
+            tails.setdefault(row.board_id, []).append(row)
+    for board in boards:
+        state = BoardState(board.id, board.canvas, board.snapshot_seq)
+        state.replay(tails.get(board.id, []))
+        board.canvas = state.canvas()
+    return boards
+
+
+def _send_ops(board_id, ops):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(f"whiteboard_{board_id}", {
+            'type': 'board.message',
+            'action': 'ops',
+            'payload': {'ops': ops},
+            'sender_channel': None,
+        })
+    except Exception:
+        logger.exception("Failed to broadcast ops for whiteboard %s", board_id)
+
+
+def broadcast_ops(board_id, ops):
+    """Send ops applied outside a websocket (REST) to the board's connections, after commit"""
+    if ops:
+        transaction.on_commit(lambda: _send_ops(board_id, ops))
+
+
+class WhiteboardEngine:
+    """
+    Keeps the state of boards with open connections in memory. Each submitted
+    op is one WhiteboardOp row; every WHITEBOARD_COMPACT_EVERY ops, and when
+    the last local connection closes, the state is written back to the
+    board's canvas and the folded ops are dropped.
+
+    Appends are conditional on the board's last_seq still being the state's
+    seq, so a process whose state fell behind another one's writes (even
+    ones already compacted away) gets StaleState, catches up and retries.
+
+    Ops are applied to the state once their rows are written. Inside an
+    enclosing transaction (REST requests under ATOMIC_REQUESTS) the state
+    remembers it: it is reloaded if that transaction rolls back, and other
+    connections do not compact it until it commits.
+
+    The last WHITEBOARD_IDLE_BOARDS boards used without a connection (REST
+    writes, viewport queries) stay cached too, and catch up from the log
+    before each use.
+    """
+
+    def __init__(self):
+        self._boards = {}
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, board_id):
+        with self._lock:
+            state, cached = self._hold(board_id)
+        if state is None:
+            # Load without the engine lock so other boards are not held up;
+            # if another open registered the board meanwhile, that state wins
+            loaded = load_state(board_id)
+            with self._lock:
+                state, cached = self._hold(board_id, loaded)
+        if cached:
+            with state.lock:
+                state.settle()
+                state.catch_up()
+        return state
+
+    def _hold(self, board_id, loaded=None):
+        """
+        Count a connection on the board's state, moving it from the idle cache
+        or registering `loaded` if needed. Call with _lock held.
+        Returns (state or None, whether it came from the idle cache).
+        """
+        state = self._boards.get(board_id)
+        cached = False
+        if state is None:
+            state = self._idle.pop(board_id, None)
+            cached = state is not None
+            state = state or loaded
+            if state is None:
+                return None, False
+            self._boards[board_id] = state
+        state.connections += 1
+        return state, cached
+
+    def close(self, board_id):
+        with self._lock:
+            state = self._boards.get(board_id)
+            if state is None:
+                return
+            state.connections -= 1
+            if state.connections > 0:
+                return
+            del self._boards[board_id]
+        self._compact(state)
+        self._keep_idle(state)
+
+    def active(self, board_id):
+        return self._boards.get(board_id)
+
+    def state_for(self, board_id, fresh=True):
+        """
+        The board's state: active, cached or freshly loaded. Unless `fresh` is
+        false, a held state first catches up with writes from other processes
+        (REST requests, workers that do not own the board).
+        """
+        state = self.active(board_id)
+        if state is None:
+            with self._lock:
+                state = self._idle.get(board_id)
+                if state is not None:
+                    self._idle.move_to_end(board_id)
+        if state is not None:
+            with state.lock:
+                state.settle()
+                if fresh:
+                    state.catch_up()
+            return state
+        state = load_state(board_id)
+        self._keep_idle(state)
+        return state
+
+    def _keep_idle(self, state):
+        evicted = []
+        with self._lock:
+            if state.board_id in self._boards:
+                return
+            self._idle[state.board_id] = state
+            self._idle.move_to_end(state.board_id)
+            while len(self._idle) > getattr(settings, 'WHITEBOARD_IDLE_BOARDS', 16):
+                evicted.append(self._idle.popitem(last=False)[1])
+        for old in evicted:
+            self._compact(old)
+
+    def evict(self, board_id):
+        """Drop a cached idle state, e.g. after its board was deleted"""
+        with self._lock:
+            self._idle.pop(board_id, None)
+
+    def viewport(self, board_id, rect, **options):
+        """Shapes intersecting rect, see whiteboard.spatial.query_viewport"""
+        state = self.state_for(board_id)
+        with state.lock:
+            return query_viewport(state, rect, **options)
+
+    def submit(self, board_id, ops, author_id=None, compact=False, fresh=True):
+        """
+        Apply ops to the board and append them to the log.
+        Returns their wire payloads with server sequence numbers.
+        The board's owner (see whiteboard.affinity) passes fresh=False to skip
+        the catch-up read; a state that did fall behind is reloaded anyway.
+        Raises InvalidOp (nothing applied) or Whiteboard.DoesNotExist.
+        """
+        ops = [normalize_op(op) for op in ops]
+        if not ops:
+            return []
+
+        for attempt in range(MAX_ATTEMPTS):
+            state = self.state_for(board_id, fresh=fresh and attempt == 0)
+            with state.lock:
+                try:
+                    applied = self._append(state, ops, author_id)
+                except InvalidOp:
+                    # The shapes may only be unknown to a state that fell behind
+                    if attempt == MAX_ATTEMPTS - 1 or not state.catch_up():
+                        raise
+                    continue
+                except (StaleState, IntegrityError):
+                    if attempt == MAX_ATTEMPTS - 1:
+                        raise
+                    logger.info("Whiteboard %s moved on elsewhere, reloading", board_id)
+                    state.reload()
+                    continue
+                if compact or state.seq - state.snapshot_seq >= _compact_every():
+                    self._compact(state)
+                return applied
+
+    def _append(self, state, ops, author_id):
+        shape_count = state.check(ops)
+        rows = [
+            WhiteboardOp(
+                board_id=state.board_id, seq=state.seq + i, kind=kind,
+                shape_id=shape_id, data=data, author_id=author_id,
+            )
+            for i, (kind, shape_id, data) in enumerate(ops, start=1)
+        ]
+        with transaction.atomic():
+            # Moving last_seq first also locks the board row until commit
+            updated = Whiteboard.objects.filter(id=state.board_id, last_seq=state.seq).update(
+                last_seq=rows[-1].seq, updated_at=timezone.now(), shape_count=shape_count,
+            )
+            if not updated:
+                if not Whiteboard.objects.filter(id=state.board_id).exists():
+                    raise Whiteboard.DoesNotExist(f"Whiteboard {state.board_id} no longer exists")
+                raise StaleState(f"Whiteboard {state.board_id} is past seq {state.seq}")
+            WhiteboardOp.objects.bulk_create(rows)
+
+        for row in rows:
+            state.apply(row.kind, row.shape_id, row.data)
+        state.seq = rows[-1].seq
+        state.track()
+        return [_row_payload(row) for row in rows]
+
+    def _compact(self, state):
+        """Write the state to the board's canvas and drop the ops it covers"""
+        with state.lock:
+            try:
+                if not state.settle():
+                    return False
+            except Whiteboard.DoesNotExist:
+                return False
+            seq = state.seq
+            if seq <= state.snapshot_seq:
+                return False
+            with transaction.atomic():
+                # Another process may already have compacted further
+                canvas = state.canvas()
+                Whiteboard.objects.filter(id=state.board_id, snapshot_seq__lt=seq).update(
+                    snapshot_seq=seq, **canvas_fields(canvas), **canvas_stats(canvas),
+                )
+                WhiteboardOp.objects.filter(board_id=state.board_id, seq__lte=seq).delete()
+            state.snapshot_seq = seq
+        schedule_thumbnail(state.board_id)
+        return True
+
+    def compact_all(self):
+        """
+        Compact every held board. The server entry points (workos.asgi,
+        workos.wsgi) run this at interpreter exit; it is skipped if the
+        database can no longer be reached by then.
+        """
+        with self._lock:
+            states = list(self._boards.values()) + list(self._idle.values())
+        if not states:
+            return
+        close_old_connections()
+        try:
+            connection.ensure_connection()
+        except DatabaseError:
+            logger.warning("Database unavailable, not compacting %d whiteboard(s)", len(states))
+            return
+        for state in states:
+            try:
+                self._compact(state)
+            except Exception:
+                logger.exception("Failed to compact whiteboard %s", state.board_id)
+
+
+engine = WhiteboardEngine()
@@ -0,0 +1,51 @@
+# backend/whiteboard/management/commands/convert_whiteboard_canvases.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from whiteboard.encoding import CANVAS_FIELDS, CANVAS_FORMATS, canvas_fields, default_format
+from whiteboard.models import Whiteboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite stored whiteboard canvases in another format ('packed': zlib-compressed "
+        "shape table in canvas_packed, 'json': plain canvas_json). Op tails are untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to', choices=CANVAS_FORMATS, help='Target format (default: WHITEBOARD_CANVAS_FORMAT)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Boards loaded per query')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many boards would be converted')
+
+    def handle(self, *args, **options):
+        target = options['to'] or default_format()
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+        boards = Whiteboard.objects.exclude(canvas_format=target)
+
+        if options['dry_run']:
+            self.stdout.write(f"{boards.count()} board(s) would be converted to {target}")
+            return
+
+        converted = skipped = before = after = 0
+        for board in boards.only('id', 'snapshot_seq', *CANVAS_FIELDS).iterator(chunk_size=options['batch_size']):
+            fields = canvas_fields(board.canvas, target)
+            # A compaction that landed since the read has already written a newer canvas
+            if not Whiteboard.objects.filter(id=board.id, snapshot_seq=board.snapshot_seq).update(**fields):
+                skipped += 1
+                continue
+            converted += 1
+            before += _stored_size(board.canvas_json, board.canvas_packed)
+            after += _stored_size(fields['canvas_json'], fields['canvas_packed'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{converted} board(s) converted to {target} ({before} -> {after} bytes), {skipped} skipped"
+        ))
+
+
+def _stored_size(canvas_json, canvas_packed):
+    if canvas_packed is not None:
+        return len(canvas_packed)
+    return len(json.dumps(canvas_json, separators=(',', ':')).encode())
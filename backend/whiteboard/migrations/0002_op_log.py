@@ -0,0 +1,42 @@
+# Generated by Django 4.2.8 on 2026-10-17 06:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('whiteboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whiteboard',
+            name='snapshot_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='WhiteboardOp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('add', 'Add'), ('update', 'Update'), ('delete', 'Delete'), ('reset', 'Reset')], max_length=10)),
+                ('shape_id', models.CharField(blank=True, default='', max_length=64)),
+                ('data', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('board', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ops', to='whiteboard.whiteboard')),
+            ],
+            options={
+                'db_table': 'whiteboard_ops',
+                'ordering': ['board', 'seq'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='whiteboardop',
+            constraint=models.UniqueConstraint(fields=('board', 'seq'), name='whiteboard_op_board_seq_uniq'),
+        ),
+    ]
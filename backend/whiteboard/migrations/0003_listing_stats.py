@@ -0,0 +1,49 @@
+# Generated by Django 4.2.8 on 2026-10-17 06:58
+
+import json
+
+from django.db import migrations, models
+
+
+def backfill_stats(apps, schema_editor):
+    Whiteboard = apps.get_model('whiteboard', 'Whiteboard')
+    for board in Whiteboard.objects.only('id', 'canvas_json').iterator(chunk_size=200):
+        canvas = board.canvas_json if isinstance(board.canvas_json, dict) else {}
+        Whiteboard.objects.filter(id=board.id).update(
+            shape_count=len(canvas.get('shapes') or []),
+            canvas_bytes=len(json.dumps(board.canvas_json, separators=(',', ':')).encode()),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whiteboard', '0002_op_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whiteboard',
+            name='canvas_bytes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='whiteboard',
+            name='shape_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='whiteboard',
+            name='thumbnail',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='whiteboard',
+            index=models.Index(fields=['owner', '-updated_at', '-id'], name='whiteboard_owner_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whiteboard',
+            index=models.Index(fields=['is_public', '-updated_at', '-id'], name='whiteboard_public_updated_idx'),
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-17 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whiteboard', '0003_listing_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whiteboard',
+            name='canvas_format',
+            field=models.CharField(choices=[('json', 'JSON'), ('packed', 'Packed')], default='json', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='whiteboard',
+            name='canvas_packed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.8 on 2026-10-17 07:13
+
+from django.db import migrations, models
+
+
+def backfill_last_seq(apps, schema_editor):
+    Whiteboard = apps.get_model('whiteboard', 'Whiteboard')
+    WhiteboardOp = apps.get_model('whiteboard', 'WhiteboardOp')
+    Whiteboard.objects.update(last_seq=models.F('snapshot_seq'))
+    for row in WhiteboardOp.objects.order_by().values('board_id').annotate(last=models.Max('seq')):
+        Whiteboard.objects.filter(id=row['board_id'], last_seq__lt=row['last']).update(last_seq=row['last'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whiteboard', '0004_packed_canvas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whiteboard',
+            name='last_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_last_seq, migrations.RunPython.noop),
+    ]
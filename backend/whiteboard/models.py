@@ -1,13 +1,93 @@
 from django.db import models
 from django.conf import settings
 
+from .encoding import CANVAS_JSON, CANVAS_PACKED, canvas_fields, unpack_canvas
+
 class Whiteboard(models.Model):
     title = models.CharField(max_length=255, default="Untitled board")
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="whiteboards")
+    FORMAT_CHOICES = [
+        (CANVAS_JSON, "JSON"),
+        (CANVAS_PACKED, "Packed"),
+    ]
+
     canvas_json = models.JSONField(default=dict, blank=True)  # stores shapes, notes, meta
+    # With the packed format the canvas lives zlib-compressed in canvas_packed
+    # and canvas_json stays empty; read and write it through `canvas`
+    canvas_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=CANVAS_JSON)
+    canvas_packed = models.BinaryField(null=True, blank=True)
+    # Last op folded into canvas_json; ops after it live in WhiteboardOp
+    snapshot_seq = models.BigIntegerField(default=0)
+    # Seq of the newest op; appends only succeed from a state at this seq
+    last_seq = models.BigIntegerField(default=0)
+    # Listing stats, so pickers never need canvas_json
+    shape_count = models.PositiveIntegerField(default=0)
+    canvas_bytes = models.PositiveIntegerField(default=0)
+    thumbnail = models.CharField(max_length=255, blank=True, default="")  # path in default storage
     is_public = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "-updated_at", "-id"], name="whiteboard_owner_updated_idx"),
+            models.Index(fields=["is_public", "-updated_at", "-id"], name="whiteboard_public_updated_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.owner})"
+
+    @property
+    def canvas(self):
+        if self.canvas_format != CANVAS_PACKED:
+            return self.canvas_json
+        cached = self.__dict__.get("_canvas_cache")
+        if cached is None or cached[0] is not self.canvas_packed:
+            cached = self._canvas_cache = (self.canvas_packed, unpack_canvas(self.canvas_packed))
+        return cached[1]
+
+    @canvas.setter
+    def canvas(self, value):
+        # Stored in WHITEBOARD_CANVAS_FORMAT
+        for name, field_value in canvas_fields(value).items():
+            setattr(self, name, field_value)
+        self._canvas_cache = (self.canvas_packed, value)
+
+    def can_view(self, user):
+        return self.is_public or self.can_edit(user)
+
+    def can_edit(self, user):
+        if user is None or not user.is_authenticated:
+            return False
+        return self.owner_id == user.id or user.is_staff
+
+
+class WhiteboardOp(models.Model):
+    """
+    One operation on a board, in server order. Rows up to the board's
+    snapshot_seq are removed when the engine compacts them into canvas_json.
+    """
+    KIND_CHOICES = [
+        ("add", "Add"),
+        ("update", "Update"),
+        ("delete", "Delete"),
+        ("reset", "Reset"),
+    ]
+
+    board = models.ForeignKey(Whiteboard, on_delete=models.CASCADE, related_name="ops")
+    seq = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    shape_id = models.CharField(max_length=64, blank=True, default="")
+    data = models.JSONField(null=True, blank=True)
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "whiteboard_ops"
+        ordering = ["board", "seq"]
+        constraints = [
+            models.UniqueConstraint(fields=["board", "seq"], name="whiteboard_op_board_seq_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.seq} on board {self.board_id}"
@@ -0,0 +1,52 @@
+# backend/whiteboard/pagination.py - Keyset pagination for board listings
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(board):
+    """Opaque cursor for the (updated_at, id) position of a board"""
+    raw = f"{board.updated_at.isoformat()}|{board.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        updated_at, board_id = raw.split('|', 1)
+        return datetime.fromisoformat(updated_at), int(board_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def paginate_boards(querysets, cursor=None, limit=20):
+    """
+    Keyset pagination over (updated_at, id), most recently updated first.
+
+    Takes one or more querysets (e.g. "owned by me" and "public", each served
+    by its own index) and merges their pages in Python instead of running an
+    OR filter with DISTINCT. Returns (boards, next_cursor).
+    """
+    if cursor:
+        updated_at, board_id = decode_cursor(cursor)
+        after = Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=board_id)
+        querysets = [queryset.filter(after) for queryset in querysets]
+
+    # Fetch one extra row per source to know whether another page exists
+    boards = {}
+    for queryset in querysets:
+        for board in queryset.order_by('-updated_at', '-id')[:limit + 1]:
+            boards[board.id] = board
+
+    boards = sorted(boards.values(), key=lambda board: (board.updated_at, board.id), reverse=True)
+    has_more = len(boards) > limit
+    boards = boards[:limit]
+    return boards, encode_cursor(boards[-1]) if has_more else None
@@ -1,9 +1,43 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
+from .encoding import CANVAS_FIELDS
 from .models import Whiteboard
 
 class WhiteboardSerializer(serializers.ModelSerializer):
     owner_username = serializers.ReadOnlyField(source="owner.username")
+    # Plain JSON to clients whichever format the board is stored in
+    canvas_json = serializers.JSONField(source="canvas", required=False)
+
     class Meta:
         model = Whiteboard
         fields = ["id", "title", "owner", "owner_username", "canvas_json", "is_public", "created_at", "updated_at"]
         read_only_fields = ["owner", "created_at", "updated_at"]
+
+    def update(self, instance, validated_data):
+        # Write only the fields sent: the instance may be older than the canvas,
+        # snapshot_seq and stats the engine wrote since it was loaded
+        update_fields = ["updated_at"]
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+            update_fields += CANVAS_FIELDS if attr == "canvas" else [attr]
+        instance.save(update_fields=update_fields)
+        return instance
+
+
+class WhiteboardSummarySerializer(serializers.ModelSerializer):
+    """Board picker entry: stats and thumbnail instead of the canvas"""
+    owner_username = serializers.ReadOnlyField(source="owner.username")
+    thumbnail_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Whiteboard
+        fields = ["id", "title", "owner", "owner_username", "is_public", "shape_count", "canvas_bytes",
+                  "thumbnail_url", "created_at", "updated_at"]
+        read_only_fields = fields
+
+    def get_thumbnail_url(self, obj):
+        if not obj.thumbnail:
+            return None
+        url = default_storage.url(obj.thumbnail)
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request is not None else url
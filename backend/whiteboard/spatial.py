@@ -0,0 +1,287 @@
+# backend/whiteboard/spatial.py - Quadtree over shape bounds, for viewport queries
+
+from django.conf import settings
+
+DEFAULT_ROOT = (-1024.0, -1024.0, 1024.0, 1024.0)
+LOD_LEVELS = ('full', 'simplified', 'bounds')
+
+_MISSING = object()
+
+
+def _num(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def _vertices(points):
+    """[[x, y], ...], [{'x', 'y'}, ...] or a flat [x, y, x, y, ...] list -> (x, y) pairs"""
+    if not isinstance(points, list) or not points:
+        return []
+    if _num(points[0]) is not None:
+        coords = [_num(value) for value in points]
+        pairs = zip(coords[0::2], coords[1::2])
+    elif isinstance(points[0], dict):
+        pairs = ((_num(p.get('x')), _num(p.get('y'))) for p in points if isinstance(p, dict))
+    else:
+        pairs = ((_num(p[0]), _num(p[1])) for p in points if isinstance(p, (list, tuple)) and len(p) >= 2)
+    return [(x, y) for x, y in pairs if x is not None and y is not None]
+
+
+def shape_points(shape):
+    """A shape's `points` as absolute (x, y) pairs, relative to x/y when it has both"""
+    x, y = _num(shape.get('x')), _num(shape.get('y'))
+    origin_x, origin_y = (x, y) if x is not None and y is not None else (0.0, 0.0)
+    return [(origin_x + px, origin_y + py) for px, py in _vertices(shape.get('points'))]
+
+
+def shape_bounds(shape):
+    """
+    (min_x, min_y, max_x, max_y) of a shape, or None when it has no geometry.
+    Understands x/y with width/height (or w/h) or radius (r), x1/y1/x2/y2 and
+    points, which are taken relative to x/y when the shape has both.
+    """
+    xs, ys = [], []
+    x, y = _num(shape.get('x')), _num(shape.get('y'))
+    if x is not None and y is not None:
+        radius = _num(shape.get('radius', shape.get('r')))
+        if radius is not None:
+            xs += [x - radius, x + radius]
+            ys += [y - radius, y + radius]
+        else:
+            xs += [x, x + (_num(shape.get('width', shape.get('w'))) or 0)]
+            ys += [y, y + (_num(shape.get('height', shape.get('h'))) or 0)]
+    for x_key, y_key in (('x1', 'y1'), ('x2', 'y2')):
+        px, py = _num(shape.get(x_key)), _num(shape.get(y_key))
+        if px is not None and py is not None:
+            xs.append(px)
+            ys.append(py)
+
+    for px, py in shape_points(shape):
+        xs.append(px)
+        ys.append(py)
+
+    if not xs:
+        return None
+    pad = (_num(shape.get('strokeWidth')) or 0) / 2
+    return min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad
+
+
+def _intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+class _Node:
+    __slots__ = ('bounds', 'depth', 'items', 'children')
+
+    def __init__(self, bounds, depth):
+        self.bounds = bounds
+        self.depth = depth
+        self.items = {}
+        self.children = None
+
+    def split(self):
+        min_x, min_y, max_x, max_y = self.bounds
+        mid_x, mid_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+        self.children = [
+            _Node(bounds, self.depth + 1) for bounds in (
+                (min_x, min_y, mid_x, mid_y), (mid_x, min_y, max_x, mid_y),
+                (min_x, mid_y, mid_x, max_y), (mid_x, mid_y, max_x, max_y),
+            )
+        ]
+
+    def child_for(self, box):
+        for child in self.children:
+            if _contains(child.bounds, box):
+                return child
+        return None
+
+
+class QuadTree:
+    """
+    Region quadtree of bounding boxes. A box lives in the deepest node that
+    wholly contains it; boxes outside the root go to an overflow list that
+    queries scan linearly.
+    """
+
+    def __init__(self, bounds, capacity=16, max_depth=12):
+        self.root = _Node(bounds, 0)
+        self.capacity = capacity
+        self.max_depth = max_depth
+        self.where = {}
+        self.overflow = {}
+
+    def __len__(self):
+        return len(self.where)
+
+    def insert(self, item_id, box):
+        self.remove(item_id)
+        if not _contains(self.root.bounds, box):
+            self.overflow[item_id] = box
+            self.where[item_id] = None
+            return
+
+        node = self.root
+        while node.children is not None:
+            child = node.child_for(box)
+            if child is None:
+                break
+            node = child
+        node.items[item_id] = box
+        self.where[item_id] = node
+        if node.children is None and len(node.items) > self.capacity and node.depth < self.max_depth:
+            self._split(node)
+
+    def _split(self, node):
+        node.split()
+        items, node.items = node.items, {}
+        for item_id, box in items.items():
+            target = node.child_for(box) or node
+            target.items[item_id] = box
+            self.where[item_id] = target
+        for child in node.children:
+            if len(child.items) > self.capacity and child.depth < self.max_depth:
+                self._split(child)
+
+    def remove(self, item_id):
+        node = self.where.pop(item_id, _MISSING)
+        if node is _MISSING:
+            return
+        (self.overflow if node is None else node.items).pop(item_id, None)
+
+    def query(self, rect):
+        found = [item_id for item_id, box in self.overflow.items() if _intersects(box, rect)]
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not _intersects(node.bounds, rect):
+                continue
+            found.extend(item_id for item_id, box in node.items.items() if _intersects(box, rect))
+            if node.children is not None:
+                stack.extend(node.children)
+        return found
+
+
+class SpatialIndex:
+    """
+    A board's shapes by bounding box, plus their draw order. Shapes without
+    geometry are kept apart and match every viewport. Kept up to date by
+    BoardState as ops are applied.
+    """
+
+    def __init__(self, shapes):
+        self.boxes = {}
+        self.order = {}
+        self.unbounded = set()
+        self._next = 0
+        self.tree = QuadTree(self._root_for(shape_bounds(shape) for shape in shapes.values()))
+        for shape_id, shape in shapes.items():
+            self.add(shape_id, shape)
+
+    @staticmethod
+    def _root_for(boxes):
+        boxes = [box for box in boxes if box is not None]
+        if not boxes:
+            return DEFAULT_ROOT
+        min_x, min_y = min(b[0] for b in boxes), min(b[1] for b in boxes)
+        max_x, max_y = max(b[2] for b in boxes), max(b[3] for b in boxes)
+        # Square, with room around the current content for new shapes
+        half = max(max_x - min_x, max_y - min_y, DEFAULT_ROOT[2])
+        mid_x, mid_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+        return mid_x - half, mid_y - half, mid_x + half, mid_y + half
+
+    def add(self, shape_id, shape):
+        if shape_id not in self.order:
+            self.order[shape_id] = self._next
+            self._next += 1
+        self.update(shape_id, shape)
+
+    def update(self, shape_id, shape):
+        box = shape_bounds(shape)
+        if box is None:
+            self.tree.remove(shape_id)
+            self.boxes.pop(shape_id, None)
+            self.unbounded.add(shape_id)
+            return
+        self.unbounded.discard(shape_id)
+        self.boxes[shape_id] = box
+        self.tree.insert(shape_id, box)
+        if len(self.tree.overflow) > max(64, len(self.tree) // 10):
+            self._rebuild()
+
+    def remove(self, shape_id):
+        self.tree.remove(shape_id)
+        self.boxes.pop(shape_id, None)
+        self.unbounded.discard(shape_id)
+        self.order.pop(shape_id, None)
+
+    def _rebuild(self):
+        # Content has moved well outside the root; re-root around it
+        tree = QuadTree(self._root_for(self.boxes.values()), self.tree.capacity, self.tree.max_depth)
+        for shape_id, box in self.boxes.items():
+            tree.insert(shape_id, box)
+        self.tree = tree
+
+    def query(self, rect):
+        """Ids of shapes intersecting rect (and unbounded ones), in draw order"""
+        return sorted(set(self.tree.query(rect)) | self.unbounded, key=self.order.__getitem__)
+
+
+def decimate(points, max_points):
+    """Keep at most max_points vertices, evenly spaced, always keeping the ends"""
+    flat = bool(points) and _num(points[0]) is not None
+    vertices = [points[i:i + 2] for i in range(0, len(points) - 1, 2)] if flat else points
+    max_points = max(max_points, 2)
+    if len(vertices) <= max_points:
+        return points
+    step = (len(vertices) - 1) / (max_points - 1)
+    kept = [vertices[round(i * step)] for i in range(max_points)]
+    return [value for vertex in kept for value in vertex] if flat else kept
+
+
+def level_of_detail(shape, lod, min_size, max_points):
+    """
+    'full' returns the shape as stored. 'simplified' thins long point lists
+    and reduces shapes smaller than min_size to their bounds; 'bounds'
+    reduces every shape to {id, type, bounds}.
+    """
+    if lod == 'full':
+        return shape
+    box = shape_bounds(shape)
+    if lod == 'bounds' or (box is not None and max(box[2] - box[0], box[3] - box[1]) < min_size):
+        return {'id': shape['id'], 'type': shape.get('type'), 'bounds': list(box) if box else None, 'lod': 'bounds'}
+    points = shape.get('points')
+    if isinstance(points, list):
+        thinned = decimate(points, max_points)
+        if thinned is not points:
+            return {**shape, 'points': thinned, 'lod': 'simplified'}
+    return shape
+
+
+def query_viewport(state, rect, lod='full', limit=None, offset=0, resolution=None):
+    """
+    Shapes of a BoardState intersecting rect = (min_x, min_y, max_x, max_y),
+    in draw order, at the requested level of detail. `limit`/`offset` page
+    through the matches so large viewports can load progressively;
+    `resolution` is the client's width in pixels for the viewport, below
+    one pixel a shape is sent as bounds only ('simplified').
+    """
+    if lod not in LOD_LEVELS:
+        raise ValueError(f"lod must be one of {', '.join(LOD_LEVELS)}")
+    resolution = resolution or getattr(settings, 'WHITEBOARD_LOD_RESOLUTION', 1024)
+    max_points = getattr(settings, 'WHITEBOARD_LOD_MAX_POINTS', 64)
+    min_size = max(rect[2] - rect[0], rect[3] - rect[1]) / resolution
+
+    ids = state.spatial().query(rect)
+    page = ids[offset:offset + limit] if limit else ids[offset:]
+    next_offset = offset + len(page)
+    return {
+        'seq': state.seq,
+        'total': len(ids),
+        'shapes': [level_of_detail(state.shapes[shape_id], lod, min_size, max_points) for shape_id in page],
+        'next_offset': next_offset if next_offset < len(ids) else None,
+    }
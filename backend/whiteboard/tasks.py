@@ -0,0 +1,10 @@
+# backend/whiteboard/tasks.py - Celery tasks for whiteboard previews
+
+from celery import shared_task
+
+from .thumbnails import run_thumbnail_job
+
+
+@shared_task(name='whiteboard.generate_thumbnail', ignore_result=True)
+def generate_thumbnail_task(board_id):
+    run_thumbnail_job(board_id)
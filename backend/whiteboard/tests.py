@@ -1,3 +1,725 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import random
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from workos.routing import websocket_urlpatterns
+
+from .affinity import BoardRouter, MemoryLeaseStore, OutcomeUnknown
+from .broadcast import BoardBroadcaster, ClientOutbox, EventBuffer
+from .encoding import InvalidCanvasData, pack_canvas, unpack_canvas
+from .engine import InvalidOp, WhiteboardEngine, engine, apply_patch, load_state, ops_since, snapshot_and_tail
+from .models import Whiteboard, WhiteboardOp
+from .serializers import WhiteboardSerializer
+from .spatial import QuadTree, level_of_detail, shape_bounds
+from .thumbnails import render_thumbnail, schedule_thumbnail
+
+
+def isolate_engine(test):
+    """
+    Start and end a test with the process-wide engine empty: board ids are
+    reused once each test rolls back, and held states must not outlive it.
+    """
+    engine._boards.clear()
+    engine._idle.clear()
+    test.addCleanup(engine._idle.clear)
+    test.addCleanup(engine._boards.clear)
+
+
+@override_settings(WHITEBOARD_COMPACT_EVERY=5)
+class WhiteboardEngineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='x')
+        cls.other = User.objects.create_user(username='other', password='x')
+
+    def setUp(self):
+        self.engine = WhiteboardEngine()
+        # Legacy canvas: shapes without ids
+        self.board = Whiteboard.objects.create(
+            owner=self.owner, canvas_json={'background': 'grid', 'shapes': [{'type': 'rect'}]}
+        )
+
+    def test_ops_are_logged_not_rewritten(self):
+        applied = self.engine.submit(self.board.id, [
+            {'op': 'add', 'shape': {'id': 'a', 'type': 'circle', 'r': 2}},
+            {'op': 'update', 'id': 'a', 'fields': {'r': 3}},
+            {'op': 'update', 'id': 's0', 'fields': {'type': None, 'kind': 'note'}},
+        ], self.owner.id)
+
+        self.assertEqual([op['seq'] for op in applied], [1, 2, 3])
+        self.assertEqual(WhiteboardOp.objects.filter(board=self.board).count(), 3)
+        self.board.refresh_from_db()
+        self.assertEqual(self.board.canvas_json['shapes'], [{'type': 'rect'}])
+
+        state = load_state(self.board.id)
+        self.assertEqual(state.seq, 3)
+        self.assertEqual(state.canvas(), {
+            'background': 'grid',
+            'shapes': [{'id': 's0', 'kind': 'note'}, {'id': 'a', 'type': 'circle', 'r': 3}],
+        })
+
+    def test_invalid_batch_applies_nothing(self):
+        with self.assertRaises(InvalidOp):
+            self.engine.submit(self.board.id, [
+                {'op': 'add', 'shape': {'id': 'a'}},
+                {'op': 'delete', 'id': 'a'},
+                {'op': 'update', 'id': 'a', 'fields': {'x': 1}},
+            ])
+        self.assertFalse(WhiteboardOp.objects.exists())
+
+    def test_compaction_and_late_joiner(self):
+        self.engine.open(self.board.id)
+        for i in range(7):
+            self.engine.submit(self.board.id, [{'op': 'add', 'shape': {'id': f'n{i}'}}])
+
+        # Five ops folded into the snapshot, two left in the tail
+        sync = snapshot_and_tail(self.board.id)
+        self.assertEqual(sync['snapshot_seq'], 5)
+        self.assertEqual(len(sync['snapshot']['shapes']), 6)
+        self.assertEqual([op['seq'] for op in sync['ops']], [6, 7])
+        self.assertEqual(sync['ops'][0], {'seq': 6, 'op': 'add', 'id': 'n5', 'shape': {'id': 'n5'}, 'author': None})
+
+        self.engine.close(self.board.id)
+        self.board.refresh_from_db()
+        self.assertEqual(self.board.snapshot_seq, 7)
+        self.assertEqual(len(self.board.canvas_json['shapes']), 8)
+        self.assertFalse(WhiteboardOp.objects.exists())
+
+    def test_open_loads_outside_the_engine_lock(self):
+        seen = []
+
+        def slow_load(board_id):
+            # Other boards stay usable, and a racing open may register first
+            free = self.engine._lock.acquire(blocking=False)
+            seen.append(free)
+            if free:
+                self.engine._lock.release()
+                if len(seen) == 1:
+                    self.engine.open(board_id)
+            return load_state(board_id)
+
+        with mock.patch('whiteboard.engine.load_state', side_effect=slow_load):
+            state = self.engine.open(self.board.id)
+        self.assertEqual(seen, [True, True])
+        self.assertIs(self.engine.active(self.board.id), state)
+        self.assertEqual(state.connections, 2)
+
+    def test_rolled_back_ops_are_not_compacted(self):
+        self.engine.open(self.board.id)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.engine.submit(self.board.id, [{'op': 'add', 'shape': {'id': 'ghost'}}])
+                raise RuntimeError('request failed')
+
+        self.engine.close(self.board.id)
+        self.board.refresh_from_db()
+        self.assertEqual((self.board.snapshot_seq, self.board.last_seq), (0, 0))
+        self.assertEqual(self.board.canvas_json['shapes'], [{'type': 'rect'}])
+
+        applied = self.engine.submit(self.board.id, [{'op': 'add', 'shape': {'id': 'a'}}])
+        self.assertEqual(applied[0]['seq'], 1)
+        self.assertEqual(list(self.engine.state_for(self.board.id, fresh=False).shapes), ['s0', 'a'])
+
+    def test_stale_process_catches_up(self):
+        self.engine.open(self.board.id)
+        # Another process appends to the same board
+        WhiteboardEngine().submit(self.board.id, [{'op': 'add', 'shape': {'id': 'elsewhere'}}])
+
+        applied = self.engine.submit(self.board.id, [{'op': 'delete', 'id': 'elsewhere'}])
+        self.assertEqual(applied[0]['seq'], 2)
+        self.assertEqual(list(self.engine.active(self.board.id).shapes), ['s0'])
+
+    def test_stale_process_after_compaction(self):
+        self.engine.submit(self.board.id, [{'op': 'add', 'shape': {'id': 'a'}}])
+        # Another process appends and compacts, leaving no rows behind
+        WhiteboardEngine().submit(self.board.id, [{'op': 'add', 'shape': {'id': f'b{i}'}} for i in range(5)], compact=True)
+        self.assertFalse(WhiteboardOp.objects.filter(board=self.board).exists())
+
+        applied = self.engine.submit(self.board.id, [{'op': 'add', 'shape': {'id': 'c'}}])
+        self.assertEqual(applied[0]['seq'], 7)
+        state = load_state(self.board.id)
+        self.assertEqual(state.seq, 7)
+        self.assertEqual(list(state.shapes), ['s0', 'a', 'b0', 'b1', 'b2', 'b3', 'b4', 'c'])
+
+
+class WhiteboardDeltaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='x')
+
+    def setUp(self):
+        self.engine = WhiteboardEngine()
+        self.board = Whiteboard.objects.create(owner=self.owner)
+        self.engine.submit(self.board.id, [
+            {'op': 'add', 'shape': {'id': 'p', 'style': {'color': 'red'}, 'points': [[0, 0]]}},
+        ])
+
+    def test_patch_fields(self):
+        applied = self.engine.submit(self.board.id, [{'op': 'update', 'id': 'p', 'patch': [
+            {'op': 'replace', 'path': '/style/color', 'value': 'blue'},
+            {'op': 'add', 'path': '/points/-', 'value': [1, 1]},
+            {'op': 'add', 'path': '/label', 'value': 'a/b'},
+        ]}])
+        self.assertEqual(applied[0]['patch'][0]['path'], '/style/color')
+        self.assertEqual(load_state(self.board.id).shapes['p'], {
+            'id': 'p', 'style': {'color': 'blue'}, 'points': [[0, 0], [1, 1]], 'label': 'a/b',
+        })
+
+    def test_bad_patch_is_rejected(self):
+        for patch in (
+            [{'op': 'replace', 'path': '/missing', 'value': 1}],
+            [{'op': 'remove', 'path': '/points/3'}],
+            [{'op': 'replace', 'path': '/id', 'value': 'q'}],
+            [{'op': 'move', 'path': '/style'}],
+        ):
+            with self.subTest(patch=patch), self.assertRaises(InvalidOp):
+                self.engine.submit(self.board.id, [{'op': 'update', 'id': 'p', 'patch': patch}])
+        self.assertEqual(WhiteboardOp.objects.count(), 1)
+
+    def test_pointer_escapes(self):
+        shape = apply_patch({'a/b': 1, 'c~d': 2}, [
+            {'op': 'remove', 'path': '/a~1b'}, {'op': 'replace', 'path': '/c~0d', 'value': 3},
+        ])
+        self.assertEqual(shape, {'c~d': 3})
+
+    @override_settings(WHITEBOARD_COMPACT_EVERY=3)
+    def test_resync_since(self):
+        self.engine.submit(self.board.id, [{'op': 'add', 'shape': {'id': 'q'}}])
+        self.assertEqual([op['seq'] for op in ops_since(self.board.id, 1)['ops']], [2])
+        self.assertNotIn('snapshot', ops_since(self.board.id, 2))
+
+        # Once compacted, a client that far behind gets the snapshot
+        self.engine.submit(self.board.id, [{'op': 'delete', 'id': 'q'}])
+        resync = ops_since(self.board.id, 1)
+        self.assertEqual(resync['snapshot_seq'], 3)
+        self.assertEqual(resync['ops'], [])
+
+
+class WhiteboardApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='x')
+        cls.board = Whiteboard.objects.create(owner=cls.owner, canvas_json={'shapes': []})
+
+    def setUp(self):
+        isolate_engine(self)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/whiteboard/whiteboards/{self.board.id}/'
+
+    def test_append_shape_is_one_op(self):
+        response = self.client.post(f'{self.url}append_shape/', {'shape': {'id': 'x', 'type': 'line'}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['canvas_json'], {'shapes': [{'id': 'x', 'type': 'line'}]})
+        self.assertEqual(WhiteboardOp.objects.get(board=self.board).seq, 1)
+
+        # Reads include the op tail before it is compacted
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['canvas_json'], {'shapes': [{'id': 'x', 'type': 'line'}]})
+        self.assertEqual(Whiteboard.objects.get(id=self.board.id).canvas_json, {'shapes': []})
+
+    def test_full_canvas_update_is_a_reset(self):
+        self.client.post(f'{self.url}append_shape/', {'shape': {'id': 'x'}}, format='json')
+        response = self.client.patch(self.url, {'canvas_json': {'content': 'hi', 'stickies': []}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['canvas_json'], {'content': 'hi', 'stickies': [], 'shapes': []})
+        self.assertFalse(WhiteboardOp.objects.exists())
+
+    def test_metadata_update_keeps_newer_canvas(self):
+        loaded = Whiteboard.objects.get(id=self.board.id)
+        # A compaction lands between loading the board and saving the title
+        engine.submit(self.board.id, [{'op': 'add', 'shape': {'id': 'x'}}], compact=True)
+        serializer = WhiteboardSerializer(loaded, data={'title': 'Renamed'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        board = Whiteboard.objects.get(id=self.board.id)
+        self.assertEqual((board.title, board.snapshot_seq, board.shape_count), ('Renamed', 1, 1))
+        self.assertEqual(board.canvas_json, {'shapes': [{'id': 'x'}]})
+
+    def test_post_ops(self):
+        url = f'{self.url}ops/'
+        response = self.client.post(url, {'ops': [
+            {'op': 'add', 'shape': {'id': 'x', 'w': 1}},
+            {'op': 'update', 'id': 'x', 'fields': {'w': 2}},
+        ]}, format='json')
+        self.assertEqual([op['seq'] for op in response.data['ops']], [1, 2])
+        self.assertEqual(self.client.get(url, {'since': 1}).data['ops'][0]['fields'], {'w': 2})
+        response = self.client.post(url, {'ops': [{'op': 'delete', 'id': 'nope'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_viewport(self):
+        self.client.post(f'{self.url}ops/', {'ops': [
+            {'op': 'add', 'shape': {'id': 'a', 'x': 0, 'y': 0, 'w': 10, 'h': 10}},
+            {'op': 'add', 'shape': {'id': 'b', 'x': 500, 'y': 500, 'w': 10, 'h': 10}},
+        ]}, format='json')
+        response = self.client.get(f'{self.url}viewport/', {'x': -5, 'y': -5, 'w': 20, 'h': 20, 'lod': 'bounds'})
+        self.assertEqual(response.data['shapes'], [{'id': 'a', 'type': None, 'bounds': [0, 0, 10, 10], 'lod': 'bounds'}])
+        self.assertEqual(self.client.get(f'{self.url}viewport/', {'x': 0, 'y': 0}).status_code, 400)
+
+
+
+class WhiteboardSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='me', password='x')
+        cls.other = User.objects.create_user(username='other', password='x')
+        big = {'shapes': [{'id': f's{i}', 'x': i} for i in range(50)]}
+        cls.mine = [Whiteboard.objects.create(owner=cls.user, title=f'Mine {i}', canvas_json=big) for i in range(5)]
+        cls.public = [
+            Whiteboard.objects.create(owner=cls.other, title=f'Public {i}', is_public=True) for i in range(4)
+        ]
+        Whiteboard.objects.create(owner=cls.other, title='Private')
+        # My own public board must be listed once
+        Whiteboard.objects.filter(id=cls.mine[0].id).update(is_public=True)
+
+    def setUp(self):
+        isolate_engine(self)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_without_canvas(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 4, **({'cursor': cursor} if cursor else {})}
+            # mine + public sources inside the savepoint pair
+            with self.assertNumQueries(4):
+                response = self.client.get('/api/whiteboard/whiteboards/summary/', params)
+            self.assertNotIn('canvas_json', response.data['results'][0])
+            seen += [board['title'] for board in response.data['results']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(len(seen), 9)
+        self.assertEqual(len(set(seen)), 9)
+        self.assertNotIn('Private', seen)
+
+    def test_list_summary_view(self):
+        # count, page and the savepoint pair; no canvas columns or op tails
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/whiteboard/whiteboards/', {'view': 'summary'})
+        self.assertEqual(response.data['count'], 9)
+        entry = response.data['results'][0]
+        self.assertNotIn('canvas_json', entry)
+        self.assertIn('thumbnail_url', entry)
+
+        self.assertIn('canvas_json', self.client.get('/api/whiteboard/whiteboards/').data['results'][0])
+        self.assertEqual(self.client.get('/api/whiteboard/whiteboards/', {'view': 'tiny'}).status_code, 400)
+
+    def test_stats_follow_ops(self):
+        board = self.mine[1]
+        engine.submit(board.id, [{'op': 'delete', 'id': 's0'}, {'op': 'add', 'shape': {'id': 'n'}}, {'op': 'delete', 'id': 's1'}])
+        response = self.client.get('/api/whiteboard/whiteboards/summary/', {'scope': 'mine', 'limit': 1})
+        entry = response.data['results'][0]
+        self.assertEqual((entry['id'], entry['shape_count'], entry['thumbnail_url']), (board.id, 49, None))
+
+        response = self.client.post('/api/whiteboard/whiteboards/', {'title': 'New', 'canvas_json': {'shapes': [{'id': 'a'}]}}, format='json')
+        created = Whiteboard.objects.get(id=response.data['id'])
+        self.assertEqual((created.shape_count, created.canvas_bytes), (1, len('{"shapes":[{"id":"a"}]}')))
+
+
+@override_settings(WHITEBOARD_THUMBNAIL_BACKEND='sync', WHITEBOARD_THUMBNAIL_FORMAT='PNG')
+class ThumbnailTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='x')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        cache.clear()
+        isolate_engine(self)
+        self.board = Whiteboard.objects.create(owner=self.owner, canvas_json={'shapes': [
+            {'id': 'r', 'type': 'rect', 'x': 0, 'y': 0, 'w': 100, 'h': 60, 'fill': '#ff0000'},
+            {'id': 'c', 'type': 'circle', 'x': 150, 'y': 30, 'r': 20, 'stroke': 'blue'},
+            {'id': 'p', 'type': 'pen', 'points': [[0, 100], [50, 120], [200, 90]], 'strokeWidth': 3},
+        ]})
+
+    def test_render_is_deterministic(self):
+        data, ext = render_thumbnail(self.board.canvas_json, width=160, height=100)
+        self.assertEqual(ext, 'png')
+        self.assertEqual(render_thumbnail(self.board.canvas_json, width=160, height=100)[0], data)
+        image = Image.open(io.BytesIO(data))
+        self.assertEqual(image.size, (160, 100))
+        self.assertEqual(image.getpixel((20, 20)), (255, 0, 0))
+
+    def test_debounced_and_content_addressed(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertTrue(schedule_thumbnail(self.board.id))
+            self.assertFalse(schedule_thumbnail(self.board.id))
+        self.assertEqual(len(callbacks), 1)
+
+        self.board.refresh_from_db()
+        first = self.board.thumbnail
+        self.assertRegex(first, rf'^whiteboards/thumbnails/{self.board.id}-[0-9a-f]{{16}}\.png$')
+        self.assertTrue(default_storage.exists(first))
+
+        # Compaction schedules the next one; the old file goes away
+        with self.captureOnCommitCallbacks(execute=True):
+            engine.submit(self.board.id, [{'op': 'delete', 'id': 'c'}], compact=True)
+        self.board.refresh_from_db()
+        self.assertNotEqual(self.board.thumbnail, first)
+        self.assertTrue(default_storage.exists(self.board.thumbnail))
+        self.assertFalse(default_storage.exists(first))
+
+@override_settings(WHITEBOARD_CANVAS_FORMAT='packed', WHITEBOARD_COMPACT_EVERY=5)
+class PackedCanvasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='x')
+
+    def setUp(self):
+        isolate_engine(self)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_round_trip(self):
+        canvas = {
+            'background': 'grid',
+            'shapes': [
+                {'id': 'a', 'type': 'rect', 'x': 1, 'y': 2.5, 'w': 3, 'h': 4},
+                {'type': 'text', 'text': 'héllo', 'style': {'bold': True}},
+                'legacy',
+                {'id': 'b', 'type': 'rect', 'x': 5, 'y': 6, 'w': 7, 'h': None},
+            ],
+        }
+        self.assertEqual(unpack_canvas(pack_canvas(canvas)), canvas)
+        self.assertEqual(unpack_canvas(pack_canvas({'content': 'hi'})), {'content': 'hi'})
+        with self.assertRaises(InvalidCanvasData):
+            unpack_canvas(b'{"shapes": []}')
+
+        many = {'shapes': [{'id': f's{i}', 'type': 'rect', 'x': i, 'y': i * 2, 'w': 10, 'h': 10} for i in range(500)]}
+        self.assertLess(len(pack_canvas(many)), len(json.dumps(many, separators=(',', ':'))) // 4)
+
+    def test_stored_packed_and_served_as_json(self):
+        response = self.client.post('/api/whiteboard/whiteboards/', {'canvas_json': {'shapes': [{'id': 'a'}]}}, format='json')
+        board = Whiteboard.objects.get(id=response.data['id'])
+        self.assertEqual((board.canvas_format, board.canvas_json), ('packed', {}))
+        self.assertEqual(board.canvas, {'shapes': [{'id': 'a'}]})
+
+        # Compaction writes the packed form too
+        engine.submit(board.id, [{'op': 'add', 'shape': {'id': f'n{i}'}} for i in range(5)])
+        board.refresh_from_db()
+        self.assertEqual(board.snapshot_seq, 5)
+        self.assertEqual(len(unpack_canvas(board.canvas_packed)['shapes']), 6)
+
+        url = f'/api/whiteboard/whiteboards/{board.id}/'
+        self.client.post(f'{url}append_shape/', {'shape': {'id': 'z'}}, format='json')
+        self.assertEqual(self.client.get(url).data['canvas_json']['shapes'][-1], {'id': 'z'})
+        response = self.client.patch(url, {'canvas_json': {'content': 'hi'}}, format='json')
+        self.assertEqual(response.data['canvas_json'], {'content': 'hi', 'shapes': []})
+
+    def test_convert_command(self):
+        with override_settings(WHITEBOARD_CANVAS_FORMAT='json'):
+            boards = [Whiteboard.objects.create(owner=self.owner, canvas={'shapes': [{'id': 'a', 'x': i}]}) for i in range(3)]
+        self.assertEqual(Whiteboard.objects.filter(canvas_format='packed').count(), 0)
+
+        out = io.StringIO()
+        call_command('convert_whiteboard_canvases', stdout=out)
+        self.assertIn('3 board(s) converted to packed', out.getvalue())
+        for i, board in enumerate(boards):
+            board.refresh_from_db()
+            self.assertEqual((board.canvas_format, board.canvas_json), ('packed', {}))
+            self.assertEqual(board.canvas, {'shapes': [{'id': 'a', 'x': i}]})
+
+        call_command('convert_whiteboard_canvases', to='json', stdout=out)
+        boards[0].refresh_from_db()
+        self.assertEqual((boards[0].canvas_json, boards[0].canvas_packed), ({'shapes': [{'id': 'a', 'x': 0}]}, None))
+
+
+class SpatialIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='x')
+
+    def test_quadtree_matches_brute_force(self):
+        rng = random.Random(7)
+        boxes = {}
+        tree = QuadTree((0, 0, 1000, 1000), capacity=4)
+        for i in range(500):
+            x, y = rng.uniform(-100, 1000), rng.uniform(-100, 1000)
+            boxes[i] = (x, y, x + rng.uniform(0, 80), y + rng.uniform(0, 80))
+            tree.insert(i, boxes[i])
+        for i in range(0, 500, 3):
+            tree.remove(i)
+            del boxes[i]
+
+        for _ in range(50):
+            x, y = rng.uniform(0, 900), rng.uniform(0, 900)
+            rect = (x, y, x + 150, y + 100)
+            expected = {i for i, b in boxes.items() if b[0] <= rect[2] and rect[0] <= b[2] and b[1] <= rect[3] and rect[1] <= b[3]}
+            self.assertEqual(set(tree.query(rect)), expected)
+
+    def test_bounds(self):
+        self.assertEqual(shape_bounds({'x': 10, 'y': 20, 'width': 5, 'height': -4}), (10, 16, 15, 20))
+        self.assertEqual(shape_bounds({'x': 0, 'y': 0, 'r': 2, 'strokeWidth': 2}), (-3, -3, 3, 3))
+        self.assertEqual(shape_bounds({'x': 5, 'y': 5, 'points': [0, 0, 10, -2]}), (5, 3, 15, 5))
+        self.assertIsNone(shape_bounds({'text': 'note'}))
+
+    def test_viewport_tracks_ops(self):
+        board = Whiteboard.objects.create(owner=self.owner, canvas_json={'shapes': [
+            {'id': f'r{i}', 'x': i * 100, 'y': 0, 'w': 50, 'h': 50} for i in range(100)
+        ] + [{'id': 'note', 'text': 'everywhere'}]})
+        boards = WhiteboardEngine()
+        view = (0, 0, 250, 60)
+        self.assertEqual([s['id'] for s in boards.viewport(board.id, view)['shapes']], ['r0', 'r1', 'r2', 'note'])
+
+        boards.submit(board.id, [
+            {'op': 'update', 'id': 'r1', 'fields': {'y': 500}},
+            {'op': 'delete', 'id': 'r2'},
+            {'op': 'add', 'shape': {'id': 'new', 'x': 240, 'y': 10, 'w': 1, 'h': 1}},
+            {'op': 'update', 'id': 'r99', 'fields': {'x': 100}},
+        ])
+        result = boards.viewport(board.id, view, limit=2)
+        self.assertEqual([s['id'] for s in result['shapes']], ['r0', 'r99'])
+        self.assertEqual((result['total'], result['next_offset']), (4, 2))
+
+    def test_cached_state_sees_compaction(self):
+        board = Whiteboard.objects.create(owner=self.owner, canvas_json={'shapes': [{'id': 'a', 'x': 0, 'y': 0, 'w': 5, 'h': 5}]})
+        boards = WhiteboardEngine()
+        view = (0, 0, 100, 100)
+        self.assertEqual([s['id'] for s in boards.viewport(board.id, view)['shapes']], ['a'])
+
+        # Another process edits and compacts; no op rows are left to replay
+        WhiteboardEngine().submit(board.id, [{'op': 'add', 'shape': {'id': 'b', 'x': 10, 'y': 10, 'w': 5, 'h': 5}}], compact=True)
+        result = boards.viewport(board.id, view)
+        self.assertEqual(([s['id'] for s in result['shapes']], result['seq']), (['a', 'b'], 1))
+
+    def test_level_of_detail(self):
+        stroke = {'id': 's', 'type': 'line', 'points': [[i, i % 7] for i in range(1000)]}
+        simplified = level_of_detail(stroke, 'simplified', min_size=1, max_points=10)
+        self.assertEqual(len(simplified['points']), 10)
+        self.assertEqual((simplified['points'][0], simplified['points'][-1]), ([0, 0], [999, 5]))
+
+        dot = {'id': 'd', 'type': 'rect', 'x': 0, 'y': 0, 'w': 0.5, 'h': 0.5}
+        self.assertEqual(level_of_detail(dot, 'simplified', min_size=1, max_points=10)['lod'], 'bounds')
+        self.assertIs(level_of_detail(dot, 'full', min_size=1, max_points=10), dot)
+
+
+@override_settings(WHITEBOARD_LEASE_TTL_SECONDS=0.3, WHITEBOARD_FORWARD_TIMEOUT_SECONDS=0.1)
+class BoardAffinityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='x')
+
+    def setUp(self):
+        isolate_engine(self)
+        self.board = Whiteboard.objects.create(owner=self.owner, canvas_json={'shapes': []})
+        self.layer = InMemoryChannelLayer()
+        self.store = MemoryLeaseStore()
+
+    def test_ops_are_forwarded_to_the_owner(self):
+        first = BoardRouter(self.layer, self.store)
+        second = BoardRouter(self.layer, self.store)
+
+        async def scenario():
+            await first.join(self.board.id)
+            await second.join(self.board.id)
+            applied = await second.submit(self.board.id, [{'op': 'add', 'shape': {'id': 'a'}}], self.owner.id)
+            with self.assertRaises(InvalidOp):
+                await second.submit(self.board.id, [{'op': 'delete', 'id': 'nope'}])
+            owned = (set(first.owned), set(second.owned))
+
+            # The last local client leaving hands the board back
+            await first.leave(self.board.id)
+            await second.submit(self.board.id, [{'op': 'delete', 'id': 'a'}])
+            await first.stop()
+            await second.stop()
+            return applied, owned
+
+        applied, owned = async_to_sync(scenario)()
+        self.assertEqual([(op['seq'], op['id']) for op in applied], [(1, 'a')])
+        self.assertEqual(owned, ({self.board.id}, set()))
+        self.assertEqual(self.store.owner(self.board.id), None)
+        self.assertEqual(Whiteboard.objects.get(id=self.board.id).snapshot_seq, 2)
+
+    def test_owner_sees_writes_from_other_processes(self):
+        owner = BoardRouter(self.layer, self.store)
+
+        async def scenario():
+            await owner.join(self.board.id)
+            # A REST request served by another process, which compacts
+            await database_sync_to_async(WhiteboardEngine().submit)(
+                self.board.id, [{'op': 'add', 'shape': {'id': 'rest'}}], compact=True,
+            )
+            applied = await owner.submit(self.board.id, [{'op': 'update', 'id': 'rest', 'fields': {'w': 1}}])
+            shapes = dict(engine.active(self.board.id).shapes)
+            await owner.stop()
+            return applied, shapes
+
+        applied, shapes = async_to_sync(scenario)()
+        self.assertEqual(applied[0]['seq'], 2)
+        self.assertEqual(shapes, {'rest': {'id': 'rest', 'w': 1}})
+        self.assertEqual(load_state(self.board.id).shapes, shapes)
+
+    def test_lease_fails_over(self):
+        first = BoardRouter(self.layer, self.store)
+        second = BoardRouter(self.layer, self.store)
+
+        async def scenario():
+            await first.join(self.board.id)
+            await second.join(self.board.id)
+            # The owner's process stops answering and renewing
+            for task in first._tasks:
+                task.cancel()
+            # Not resent elsewhere: the silent owner may have applied it
+            with self.assertRaises(OutcomeUnknown):
+                await second.submit(self.board.id, [{'op': 'add', 'shape': {'id': 'a'}}])
+
+            await asyncio.sleep(0.3)
+            applied = await second.submit(self.board.id, [{'op': 'add', 'shape': {'id': 'b'}}])
+            took_over = self.store.owner(self.board.id) == second.channel
+            await second.stop()
+            return applied, took_over
+
+        applied, took_over = async_to_sync(scenario)()
+        self.assertEqual((applied[0]['seq'], applied[0]['id']), (1, 'b'))
+        self.assertTrue(took_over)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    PRESENCE_BACKEND='memory', PRESENCE_DIFF_INTERVAL_SECONDS=0.01,
+    WHITEBOARD_AFFINITY_BACKEND='memory', WHITEBOARD_BROADCAST_HZ=100,
+)
+class WhiteboardConsumerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='x')
+        cls.board = Whiteboard.objects.create(owner=cls.owner, is_public=True)
+
+    def setUp(self):
+        isolate_engine(self)
+
+    async def _connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/whiteboard/{self.board.id}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['action'], 'sync')
+        return communicator
+
+    async def _next(self, communicator, action):
+        while True:
+            frame = await communicator.receive_json_from(timeout=1)
+            if frame['action'] == action:
+                return frame
+
+    def test_viewer_cannot_inject_server_actions(self):
+        async def scenario():
+            editor = await self._connect(self.owner)
+            viewer = await self._connect(AnonymousUser())
+            errors = []
+            for action in ('ops', 'sync', 'ack', 'preview'):
+                await viewer.send_json_to({'action': action, 'payload': {'ops': [{'seq': 1, 'op': 'reset', 'canvas': {}}]}})
+                errors.append((await viewer.receive_json_from())['action'])
+            await viewer.send_json_to({'action': 'cursor', 'payload': {'x': 1}})
+            batch = await self._next(editor, 'batch')
+            await viewer.disconnect()
+            await editor.disconnect()
+            return errors, batch
+
+        errors, batch = async_to_sync(scenario)()
+        self.assertEqual(errors, ['error'] * 4)
+        self.assertEqual(batch['payload']['events'], [{'action': 'cursor', 'payload': {'x': 1}}])
+
+
+class FakeLayer:
+
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append(message)
+
+
+@override_settings(WHITEBOARD_BROADCAST_HZ=100)
+class BroadcastTests(SimpleTestCase):
+
+    def _op(self, seq):
+        return {'seq': seq, 'op': 'delete', 'id': f's{seq}'}
+
+    def test_tick_batches_and_coalesces(self):
+        layer = FakeLayer()
+        broadcaster = BoardBroadcaster(layer, 'whiteboard_1')
+
+        async def draw():
+            for x in range(50):
+                broadcaster.publish('a', 'cursor', {'x': x})
+                broadcaster.publish('b', 'cursor', {'x': -x})
+            broadcaster.publish_ops('a', [self._op(2)])
+            broadcaster.publish_ops('b', [self._op(1)])
+            broadcaster.publish('a', 'note', {'text': 'hi'})
+            await asyncio.sleep(0.05)
+
+        async_to_sync(draw)()
+        self.assertEqual(len(layer.sent), 1)
+        batch = layer.sent[0]
+        self.assertEqual([op['seq'] for _, op in batch['ops']], [1, 2])
+        self.assertEqual(
+            [(e['action'], e['payload']) for e in batch['events']],
+            [('note', {'text': 'hi'}), ('cursor', {'x': 49}), ('cursor', {'x': -49})],
+        )
+
+    def test_previews_merge_per_stroke(self):
+        buffer = EventBuffer()
+        for stroke, points in (('s1', 1), ('s2', 1), ('s1', 2)):
+            buffer.add_event({'action': 'preview', 'payload': {'id': stroke, 'points': points}, 'sender_channel': 'a'})
+        self.assertEqual([e['payload'] for e in buffer.drain()[1]], [
+            {'id': 's2', 'points': 1}, {'id': 's1', 'points': 2},
+        ])
+
+    def test_slow_client_is_resynced(self):
+        sent, resyncs = [], []
+        gate = asyncio.Event()
+
+        async def send(frame):
+            await gate.wait()
+            sent.append(frame)
+
+        async def resync(since):
+            resyncs.append(since)
+
+        async def scenario():
+            outbox = ClientOutbox(send, resync, max_pending=5)
+            outbox.push(ops=[(None, self._op(1))])
+            await asyncio.sleep(0)
+            # The socket is stuck on the first frame while more arrives
+            outbox.push(ops=[(None, self._op(seq)) for seq in range(2, 9)])
+            for x in range(20):
+                outbox.push(events=[{'action': 'cursor', 'payload': {'x': x}, 'sender_channel': 'b'}])
+            gate.set()
+            await asyncio.sleep(0.01)
+
+        async_to_sync(scenario)()
+        self.assertEqual(resyncs, [1])
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(sent[1]['payload']['events'], [{'action': 'cursor', 'payload': {'x': 19}}])
@@ -0,0 +1,211 @@
+# backend/whiteboard/thumbnails.py - Board previews rendered with Pillow, off the request path
+
+import hashlib
+import io
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageColor, ImageDraw, features
+
+from .models import Whiteboard
+from .spatial import shape_bounds, shape_points
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'whiteboards/thumbnails'
+PENDING_KEY = 'whiteboard:thumbnail-pending:{board_id}'
+PADDING = 8
+
+DEFAULT_STROKE = (55, 65, 81)
+NOTE_FILL = (254, 240, 138)
+NOTE_TYPES = ('note', 'sticky', 'sticky_note')
+
+
+def _debounce():
+    return getattr(settings, 'WHITEBOARD_THUMBNAIL_DEBOUNCE_SECONDS', 5)
+
+
+def _format():
+    fmt = getattr(settings, 'WHITEBOARD_THUMBNAIL_FORMAT', 'WEBP').upper()
+    if fmt == 'WEBP' and not features.check('webp'):
+        return 'PNG'
+    return fmt
+
+
+def _color(value, default=None):
+    if not isinstance(value, str) or value in ('', 'transparent', 'none'):
+        return default
+    try:
+        return ImageColor.getrgb(value)[:3]
+    except ValueError:
+        return default
+
+
+# ============================================
+# RENDERING
+# ============================================
+
+def _canvas_shapes(canvas):
+    shapes = [shape for shape in canvas.get('shapes') or [] if isinstance(shape, dict)]
+    # Sticky notes from the plain board editor
+    stickies = canvas.get('stickies')
+    if isinstance(stickies, list):
+        shapes += [{'type': 'note', **sticky} for sticky in stickies if isinstance(sticky, dict)]
+    return shapes
+
+
+def _draw_shape(draw, shape, box, to_px, scale):
+    kind = str(shape.get('type') or '').lower()
+    stroke = _color(shape.get('stroke') or shape.get('color'), DEFAULT_STROKE)
+    fill = _color(shape.get('fill'), NOTE_FILL if kind in NOTE_TYPES else None)
+    stroke_width = shape.get('strokeWidth')
+    width = max(1, round(stroke_width * scale)) if isinstance(stroke_width, (int, float)) else 1
+
+    points = [to_px(x, y) for x, y in shape_points(shape)]
+    if len(points) >= 2:
+        draw.line(points, fill=stroke, width=width, joint='curve')
+        return
+    if kind in ('line', 'arrow') and all(isinstance(shape.get(key), (int, float)) for key in ('x1', 'y1', 'x2', 'y2')):
+        draw.line([to_px(shape['x1'], shape['y1']), to_px(shape['x2'], shape['y2'])], fill=stroke, width=width)
+        return
+
+    corners = [*to_px(box[0], box[1]), *to_px(box[2], box[3])]
+    if kind in ('circle', 'ellipse'):
+        draw.ellipse(corners, fill=fill, outline=stroke, width=width)
+    else:
+        draw.rectangle(corners, fill=fill, outline=stroke, width=width)
+
+
+def render_thumbnail(canvas, width=None, height=None, fmt=None):
+    """
+    Rasterize a canvas to image bytes, fitting all shapes with geometry into
+    width x height. Rendering is deterministic, so equal canvases give equal
+    bytes (and equal content-hash filenames).
+    """
+    width = width or getattr(settings, 'WHITEBOARD_THUMBNAIL_WIDTH', 320)
+    height = height or getattr(settings, 'WHITEBOARD_THUMBNAIL_HEIGHT', 200)
+    fmt = fmt or _format()
+    canvas = canvas if isinstance(canvas, dict) else {}
+
+    image = Image.new('RGB', (width, height), _color(canvas.get('background'), (255, 255, 255)))
+    draw = ImageDraw.Draw(image)
+
+    boxed = [(shape, box) for shape in _canvas_shapes(canvas) for box in [shape_bounds(shape)] if box is not None]
+    if boxed:
+        min_x = min(box[0] for _, box in boxed)
+        min_y = min(box[1] for _, box in boxed)
+        span_x = max(max(box[2] for _, box in boxed) - min_x, 1.0)
+        span_y = max(max(box[3] for _, box in boxed) - min_y, 1.0)
+        scale = min((width - 2 * PADDING) / span_x, (height - 2 * PADDING) / span_y)
+        offset_x = (width - span_x * scale) / 2
+        offset_y = (height - span_y * scale) / 2
+
+        def to_px(x, y):
+            return round(offset_x + (x - min_x) * scale, 2), round(offset_y + (y - min_y) * scale, 2)
+
+        for shape, box in boxed:
+            _draw_shape(draw, shape, box, to_px, scale)
+
+    out = io.BytesIO()
+    if fmt == 'WEBP':
+        image.save(out, format='WEBP', quality=80, method=4)
+    else:
+        image.save(out, format='PNG', optimize=True)
+    return out.getvalue(), fmt.lower()
+
+
+def generate_thumbnail(board_id):
+    """
+    Render the board's current state and store it as
+    whiteboards/thumbnails/<board>-<content hash>.<ext> in default storage.
+    Unchanged previews are not rewritten; a replaced one is deleted.
+    Returns the stored path.
+    """
+    from .engine import load_state
+
+    board = Whiteboard.objects.only('id', 'thumbnail').get(id=board_id)
+    # Read fresh, not through the engine's cache: job processes are not
+    # told when other processes change the board
+    data, ext = render_thumbnail(load_state(board.id).canvas())
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    name = f"{THUMBNAIL_DIR}/{board.id}-{digest}.{ext}"
+    if name == board.thumbnail:
+        return name
+
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    Whiteboard.objects.filter(id=board.id).update(thumbnail=name)
+    if board.thumbnail:
+        try:
+            default_storage.delete(board.thumbnail)
+        except Exception:
+            logger.warning("Could not delete old thumbnail %s", board.thumbnail)
+    return name
+
+
+# ============================================
+# DISPATCH
+# ============================================
+
+def run_thumbnail_job(board_id):
+    # Edits from here on schedule a fresh job
+    cache.delete(PENDING_KEY.format(board_id=board_id))
+    try:
+        return generate_thumbnail(board_id)
+    except Whiteboard.DoesNotExist:
+        return None
+
+
+def _run_in_thread(board_id):
+    close_old_connections()
+    try:
+        run_thumbnail_job(board_id)
+    except Exception:
+        logger.exception("Error generating thumbnail for whiteboard %s", board_id)
+    finally:
+        close_old_connections()
+
+
+def _submit(board_id):
+    backend = getattr(settings, 'WHITEBOARD_THUMBNAIL_BACKEND', 'thread')
+    delay = _debounce()
+
+    if backend == 'celery':
+        try:
+            from .tasks import generate_thumbnail_task
+            generate_thumbnail_task.apply_async((board_id,), countdown=delay)
+            return
+        except Exception:
+            logger.exception("Celery unavailable, generating thumbnail in-process")
+        backend = 'thread'
+
+    if backend == 'thread':
+        timer = threading.Timer(delay, _run_in_thread, args=(board_id,))
+        timer.daemon = True
+        timer.start()
+        return
+
+    # 'sync': render inline (tests, management commands)
+    try:
+        run_thumbnail_job(board_id)
+    except Exception:
+        logger.exception("Error generating thumbnail for whiteboard %s", board_id)
+
+
+def schedule_thumbnail(board_id):
+    """
+    Regenerate the board's thumbnail WHITEBOARD_THUMBNAIL_DEBOUNCE_SECONDS
+    after the current transaction commits (WHITEBOARD_THUMBNAIL_BACKEND:
+    'celery', 'thread' or 'sync'). Calls while a job is pending fold into it,
+    since the job renders whatever the board looks like when it runs.
+    Returns whether a new job was scheduled.
+    """
+    if not cache.add(PENDING_KEY.format(board_id=board_id), True, timeout=_debounce() + 300):
+        return False
+    transaction.on_commit(lambda: _submit(board_id))
+    return True
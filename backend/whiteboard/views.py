@@ -1,18 +1,29 @@
 from django.shortcuts import render
 
 # Create your views here.
+from django.db import models
 from rest_framework import viewsets, permissions
+from .encoding import CANVAS_FIELDS
+from .engine import InvalidOp, broadcast_ops, canvas_stats, engine, materialize, ops_since
 from .models import Whiteboard
-from .serializers import WhiteboardSerializer
+from .pagination import InvalidCursor, paginate_boards
+from .serializers import WhiteboardSerializer, WhiteboardSummarySerializer
+from .thumbnails import schedule_thumbnail
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
+# Columns a board picker entry needs (WhiteboardSummarySerializer), without the canvas
+SUMMARY_FIELDS = (
+    "id", "title", "owner", "owner__username", "is_public", "shape_count", "canvas_bytes",
+    "thumbnail", "created_at", "updated_at",
+)
+
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # Read: allow public or owner, Write: only owner or staff
         if request.method in permissions.SAFE_METHODS:
-            return obj.is_public or obj.owner == request.user or request.user.is_staff
-        return obj.owner == request.user or request.user.is_staff
+            return obj.can_view(request.user)
+        return obj.can_edit(request.user)
 
 class WhiteboardViewSet(viewsets.ModelViewSet):
     queryset = Whiteboard.objects.all().order_by("-updated_at")
@@ -20,30 +31,162 @@ class WhiteboardViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        board = serializer.save(owner=self.request.user, **canvas_stats(serializer.validated_data.get("canvas") or {}))
+        if board.shape_count or board.canvas:
+            schedule_thumbnail(board.id)
+
+    def perform_update(self, serializer):
+        # A full canvas goes through the engine as a reset op, so boards open
+        # elsewhere pick it up from the log instead of overwriting it later
+        canvas = serializer.validated_data.pop("canvas", None)
+        board = serializer.save()
+        if canvas is not None:
+            applied = engine.submit(board.id, [{"op": "reset", "canvas": canvas}], self.request.user.id, compact=True)
+            broadcast_ops(board.id, applied)
+            board.refresh_from_db(fields=["snapshot_seq", *CANVAS_FIELDS])
+
+    def perform_destroy(self, instance):
+        board_id = instance.id
+        instance.delete()
+        engine.evict(board_id)
 
     def get_queryset(self):
         # staff sees all; regular users see their own + public boards
         user = self.request.user
         if user.is_staff:
             return super().get_queryset()
-        return Whiteboard.objects.filter(models.Q(owner=user) | models.Q(is_public=True)).distinct()
+        return Whiteboard.objects.filter(models.Q(owner=user) | models.Q(is_public=True))
+
+    def list(self, request, *args, **kwargs):
+        """
+        Query: view=full (default, boards with their canvas) or view=summary
+        (picker entries as in summary/, but with this listing's pagination).
+        """
+        view = request.query_params.get("view", "full")
+        if view not in ("full", "summary"):
+            return Response({"detail": "view must be full or summary"}, status=400)
+        queryset = self.filter_queryset(self.get_queryset())
+        if view == "summary":
+            queryset = queryset.select_related("owner").only(*SUMMARY_FIELDS)
+        page = self.paginate_queryset(queryset)
+        boards = page if page is not None else queryset
+        if view == "summary":
+            serializer = WhiteboardSummarySerializer(boards, many=True, context=self.get_serializer_context())
+        else:
+            serializer = self.get_serializer(materialize(boards), many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        """
+        Lightweight listing for board pickers: no canvas, just stats and a thumbnail URL.
+        Query: scope=all|mine|public, limit (max 100), cursor (from next_cursor).
+        """
+        user = request.user
+        scope = request.query_params.get("scope", "all")
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 20)), 100))
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=400)
+
+        boards = Whiteboard.objects.select_related("owner").only(*SUMMARY_FIELDS)
+        # One query per index-backed source rather than OR + DISTINCT
+        if scope == "mine":
+            sources = [boards.filter(owner=user)]
+        elif scope == "public":
+            sources = [boards.filter(is_public=True)]
+        elif scope == "all" and user.is_staff:
+            sources = [boards]
+        elif scope == "all":
+            sources = [boards.filter(owner=user), boards.filter(is_public=True)]
+        else:
+            return Response({"detail": "scope must be all, mine or public"}, status=400)
+
+        try:
+            page, next_cursor = paginate_boards(sources, request.query_params.get("cursor"), limit)
+        except InvalidCursor as e:
+            return Response({"detail": str(e)}, status=400)
+        return Response({
+            "results": WhiteboardSummarySerializer(page, many=True, context={"request": request}).data,
+            "next_cursor": next_cursor,
+        })
+
+    def retrieve(self, request, *args, **kwargs):
+        board = materialize([self.get_object()])[0]
+        return Response(self.get_serializer(board).data)
 
     @action(detail=True, methods=["post"])
     def append_shape(self, request, pk=None):
         """
-        Example helper to append a shape to the canvas_json.shapes list.
+        Append a shape to the board as one op; the canvas is not rewritten.
         Request body: {"shape": {...}}
+        Response: the serialized board (POST ops/ returns the applied ops with their seq)
         """
         board = self.get_object()
         self.check_object_permissions(request, board)
         shape = request.data.get("shape")
         if shape is None:
             return Response({"detail":"shape required"}, status=400)
-        canvas = board.canvas_json or {}
-        shapes = canvas.get("shapes", [])
-        shapes.append(shape)
-        canvas["shapes"] = shapes
-        board.canvas_json = canvas
-        board.save()
-        return Response(self.get_serializer(board).data)
+        try:
+            applied = engine.submit(board.id, [{"op": "add", "shape": shape}], request.user.id)
+        except InvalidOp as e:
+            return Response({"detail": str(e)}, status=400)
+        broadcast_ops(board.id, applied)
+        board.refresh_from_db()
+        return Response(self.get_serializer(materialize([board])[0]).data)
+
+    @action(detail=True, methods=["get", "post"])
+    def ops(self, request, pk=None):
+        """
+        GET ?since=<seq>: ops after seq (or the snapshot and tail if they were compacted).
+        POST {"ops": [...]}: apply delta ops, same format as the websocket.
+        """
+        board = self.get_object()
+        if request.method == "GET":
+            since = request.query_params.get("since")
+            try:
+                since = int(since) if since is not None else None
+            except ValueError:
+                return Response({"detail": "since must be an integer"}, status=400)
+            return Response(ops_since(board.id, since))
+
+        ops = request.data.get("ops")
+        if not isinstance(ops, list) or not ops:
+            return Response({"detail": "ops required"}, status=400)
+        try:
+            applied = engine.submit(board.id, ops, request.user.id)
+        except InvalidOp as e:
+            return Response({"detail": str(e)}, status=400)
+        broadcast_ops(board.id, applied)
+        return Response({"ops": applied})
+
+    @action(detail=True, methods=["get"])
+    def viewport(self, request, pk=None):
+        """
+        Shapes intersecting a rectangle, from the board's spatial index.
+        Query: x, y, w, h (required); lod=full|simplified|bounds;
+        resolution (client pixels across the viewport); limit, offset.
+        Response: {"seq", "total", "shapes", "next_offset"}
+        """
+        board = self.get_object()
+        params = request.query_params
+        try:
+            x, y, w, h = (float(params[key]) for key in ("x", "y", "w", "h"))
+            limit = int(params["limit"]) if "limit" in params else None
+            offset = int(params.get("offset", 0))
+            resolution = float(params["resolution"]) if "resolution" in params else None
+        except (KeyError, ValueError):
+            return Response({"detail": "x, y, w and h are required numbers"}, status=400)
+        if w <= 0 or h <= 0 or offset < 0 or (limit is not None and limit <= 0) or (resolution is not None and resolution <= 0):
+            return Response({"detail": "w, h, limit and resolution must be positive"}, status=400)
+
+        try:
+            result = engine.viewport(
+                board.id, (x, y, x + w, y + h), lod=params.get("lod", "full"),
+                limit=limit, offset=offset, resolution=resolution,
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+        return Response(result)
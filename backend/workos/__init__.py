@@ -1,5 +1,9 @@
 from django.apps import AppConfig
 
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
+
 class CompaniesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'companies'
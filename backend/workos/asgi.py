@@ -1,3 +1,4 @@
+import atexit
 import os
 from django.core.asgi import get_asgi_application
 
@@ -9,6 +10,10 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from workos.jwt_auth_middleware import JwtAuthMiddlewareStack
 import workos.routing
+from whiteboard.engine import engine
+
+# Write open boards back to their canvases when the server process exits
+atexit.register(engine.compact_all)
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
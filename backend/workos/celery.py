@@ -0,0 +1,10 @@
+# workos/celery.py
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "workos.settings")
+
+app = Celery("workos")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
@@ -29,26 +29,19 @@ class JwtAuthMiddleware:
     def __init__(self, inner):
         self.inner = inner
 
-    def __call__(self, scope):
-        return JwtAuthMiddlewareInstance(scope, self.inner)
-
-class JwtAuthMiddlewareInstance:
-    def __init__(self, scope, inner):
-        self.scope = dict(scope)
-        self.inner = inner
-
-    async def __call__(self, receive, send):
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
         token = None
 
         # 1) check query string
-        query_string = self.scope.get("query_string", b"").decode()
+        query_string = scope.get("query_string", b"").decode()
         qs = parse_qs(query_string)
         if "token" in qs:
             token = qs["token"][0]
 
         # 2) check headers
         if not token:
-            headers = {k.decode(): v.decode() for k, v in self.scope.get("headers", [])}
+            headers = {k.decode(): v.decode() for k, v in scope.get("headers", [])}
             auth = headers.get("authorization") or headers.get("Authorization")
             if auth and auth.lower().startswith("bearer "):
                 token = auth.split(" ", 1)[1]
@@ -68,12 +61,11 @@ class JwtAuthMiddlewareInstance:
                 user = None
 
         if user:
-            self.scope["user"] = user
+            scope["user"] = user
         else:
-            self.scope["user"] = AnonymousUser()
+            scope["user"] = AnonymousUser()
 
-        inner = self.inner(self.scope)
-        return await inner(receive, send)
+        return await self.inner(scope, receive, send)
 
 
 def JwtAuthMiddlewareStack(inner):
@@ -1,8 +1,10 @@
 from django.urls import re_path
 from whiteboard.consumers import WhiteboardConsumer
 from chat.consumers import ChatConsumer
+from notifications.consumers import NotificationConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/whiteboard/(?P<room_id>\d+)/?$", WhiteboardConsumer.as_asgi()),
     re_path(r"ws/chat/(?P<room_id>[-0-9a-fA-F]+)/?$", ChatConsumer.as_asgi()),
+    re_path(r"ws/notifications/?$", NotificationConsumer.as_asgi()),
 ]
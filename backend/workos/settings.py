@@ -153,7 +153,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.IdentityJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -170,6 +170,27 @@ REST_FRAMEWORK = {
     'EXCEPTION_HANDLER': 'workos.middleware.custom_exception_handler',
 }
 
+# Cache (locmem by default; set CACHE_BACKEND/CACHE_LOCATION for Redis, e.g.
+# django.core.cache.backends.redis.RedisCache + redis://127.0.0.1:6379/1)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='workos-default'),
+    }
+}
+
+# Task integration settings cache (tasks/cache.py)
+TASK_SETTINGS_CACHE_ALIAS = 'default'
+TASK_SETTINGS_CACHE_TIMEOUT = config('TASK_SETTINGS_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+# Log the settings cache hit ratio every N lookups per process (0: never)
+TASK_SETTINGS_CACHE_LOG_EVERY = config('TASK_SETTINGS_CACHE_LOG_EVERY', default=1000, cast=int)
+TASK_COUNT_CACHE_TIMEOUT = config('TASK_COUNT_CACHE_TIMEOUT', default=60, cast=int)  # seconds
+TASK_BULK_CREATE_MAX = config('TASK_BULK_CREATE_MAX', default=500, cast=int)  # tasks per request
+
+# Identity resolution cache (users/identity.py)
+IDENTITY_CACHE_TTL = config('IDENTITY_CACHE_TTL', default=60, cast=int)  # seconds
+IDENTITY_CACHE_MAX_SIZE = config('IDENTITY_CACHE_MAX_SIZE', default=1024, cast=int)
+
 # JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=24),
@@ -219,6 +240,101 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Chat read markers from a websocket are buffered and written at most this often
+CHAT_READ_MARKER_FLUSH_SECONDS = config('CHAT_READ_MARKER_FLUSH_SECONDS', default=2.0, cast=float)
+
+# Write-behind chat persistence: broadcast first, bulk insert every N messages or M ms
+CHAT_WRITE_BEHIND = config('CHAT_WRITE_BEHIND', default=False, cast=bool)
+CHAT_WRITE_BEHIND_BATCH_SIZE = config('CHAT_WRITE_BEHIND_BATCH_SIZE', default=100, cast=int)
+CHAT_WRITE_BEHIND_FLUSH_MS = config('CHAT_WRITE_BEHIND_FLUSH_MS', default=200, cast=int)
+
+# Per-connection token buckets for inbound websocket actions: (tokens per second, burst);
+# 'default' covers actions without their own entry
+CHAT_RATE_LIMITS = {
+    'default': (5.0, 10),
+    'send_message': (2.0, 10),
+    'typing': (4.0, 8),
+    'mark_read': (10.0, 20),
+}
+# Typing indicators: at most one refresh per interval; auto-stop after the timeout
+CHAT_TYPING_REFRESH_SECONDS = config('CHAT_TYPING_REFRESH_SECONDS', default=3.0, cast=float)
+CHAT_TYPING_TIMEOUT_SECONDS = config('CHAT_TYPING_TIMEOUT_SECONDS', default=6.0, cast=float)
+
+# Presence: connections live in Redis sorted sets ('redis') or in-process ('memory')
+PRESENCE_BACKEND = config('PRESENCE_BACKEND', default='redis')
+PRESENCE_REDIS_URL = config('PRESENCE_REDIS_URL', default='redis://127.0.0.1:6379/1')
+PRESENCE_TTL_SECONDS = config('PRESENCE_TTL_SECONDS', default=60, cast=int)
+PRESENCE_HEARTBEAT_SECONDS = config('PRESENCE_HEARTBEAT_SECONDS', default=20, cast=int)
+PRESENCE_DIFF_INTERVAL_SECONDS = config('PRESENCE_DIFF_INTERVAL_SECONDS', default=1.0, cast=float)
+
+# Whiteboards: ops are logged one row each and folded into canvas_json every N ops
+WHITEBOARD_COMPACT_EVERY = config('WHITEBOARD_COMPACT_EVERY', default=200, cast=int)
+# Canvas storage: 'json' (canvas_json) or 'packed' (zlib shape table in canvas_packed),
+# applied on write; convert_whiteboard_canvases rewrites existing boards
+WHITEBOARD_CANVAS_FORMAT = config('WHITEBOARD_CANVAS_FORMAT', default='json')
+# Board broadcasts go out as one batch per tick; a client this far behind is resynced
+WHITEBOARD_BROADCAST_HZ = config('WHITEBOARD_BROADCAST_HZ', default=30, cast=int)
+WHITEBOARD_CLIENT_MAX_PENDING = config('WHITEBOARD_CLIENT_MAX_PENDING', default=1000, cast=int)
+# Boards used without a connection (REST, viewport queries) kept in memory per process
+WHITEBOARD_IDLE_BOARDS = config('WHITEBOARD_IDLE_BOARDS', default=16, cast=int)
+# Board ownership: one worker per active board holds a lease in Redis ('redis') or in-process
+# ('memory'), renewed every third of the TTL; other workers forward ops to it
+WHITEBOARD_AFFINITY_BACKEND = config('WHITEBOARD_AFFINITY_BACKEND', default='redis')
+WHITEBOARD_AFFINITY_REDIS_URL = config('WHITEBOARD_AFFINITY_REDIS_URL', default='redis://127.0.0.1:6379/1')
+WHITEBOARD_LEASE_TTL_SECONDS = config('WHITEBOARD_LEASE_TTL_SECONDS', default=10.0, cast=float)
+WHITEBOARD_FORWARD_TIMEOUT_SECONDS = config('WHITEBOARD_FORWARD_TIMEOUT_SECONDS', default=5.0, cast=float)
+# Viewport level of detail: vertices kept per simplified stroke, pixels across the viewport
+WHITEBOARD_LOD_MAX_POINTS = config('WHITEBOARD_LOD_MAX_POINTS', default=64, cast=int)
+WHITEBOARD_LOD_RESOLUTION = config('WHITEBOARD_LOD_RESOLUTION', default=1024, cast=int)
+# Thumbnails: rendered after saves/compaction, at most once per debounce window per board
+# ('celery', 'thread' or 'sync'), stored under MEDIA_ROOT with content-hash names
+WHITEBOARD_THUMBNAIL_BACKEND = config('WHITEBOARD_THUMBNAIL_BACKEND', default='thread')
+WHITEBOARD_THUMBNAIL_DEBOUNCE_SECONDS = config('WHITEBOARD_THUMBNAIL_DEBOUNCE_SECONDS', default=5.0, cast=float)
+WHITEBOARD_THUMBNAIL_FORMAT = config('WHITEBOARD_THUMBNAIL_FORMAT', default='WEBP')
+WHITEBOARD_THUMBNAIL_WIDTH = config('WHITEBOARD_THUMBNAIL_WIDTH', default=320, cast=int)
+WHITEBOARD_THUMBNAIL_HEIGHT = config('WHITEBOARD_THUMBNAIL_HEIGHT', default=200, cast=int)
+
+
+# ============================================
+# BACKGROUND WORK (Celery)
+# ============================================
+
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://127.0.0.1:6379/0')
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TIMEZONE = TIME_ZONE
+
+# Notification delivery: 'celery', 'thread' (in-process pool) or 'sync'
+NOTIFICATION_BACKEND = config('NOTIFICATION_BACKEND', default='thread')
+NOTIFICATION_THREAD_WORKERS = config('NOTIFICATION_THREAD_WORKERS', default=2, cast=int)
+
+# Unread counters are maintained incrementally; this job repairs any drift
+NOTIFICATION_COUNTER_RECONCILE_INTERVAL = config('NOTIFICATION_COUNTER_RECONCILE_INTERVAL', default=3600, cast=int)
+
+# Retention: read / soft-deleted notifications older than these move to notifications_archive
+NOTIFICATION_RETENTION_READ_DAYS = config('NOTIFICATION_RETENTION_READ_DAYS', default=90, cast=int)
+NOTIFICATION_RETENTION_DELETED_DAYS = config('NOTIFICATION_RETENTION_DELETED_DAYS', default=30, cast=int)
+NOTIFICATION_ARCHIVE_BATCH_SIZE = config('NOTIFICATION_ARCHIVE_BATCH_SIZE', default=1000, cast=int)
+NOTIFICATION_ARCHIVE_INTERVAL = config('NOTIFICATION_ARCHIVE_INTERVAL', default=86400, cast=int)
+# Monthly archive partitions created ahead of time (PostgreSQL, after notification_partitions --convert)
+NOTIFICATION_ARCHIVE_PARTITIONS_AHEAD = config('NOTIFICATION_ARCHIVE_PARTITIONS_AHEAD', default=3, cast=int)
+
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-notification-counters': {
+        'task': 'notifications.reconcile_counters',
+        'schedule': NOTIFICATION_COUNTER_RECONCILE_INTERVAL,
+    },
+    'archive-notifications': {
+        'task': 'notifications.archive_notifications',
+        'schedule': NOTIFICATION_ARCHIVE_INTERVAL,
+    },
+    # Publishes 'left' diffs for connections whose process died
+    'sweep-presence': {
+        'task': 'chat.sweep_presence',
+        'schedule': PRESENCE_TTL_SECONDS,
+    },
+}
+
 
 # ============================================
 # EMAIL CONFIGURATION (Gmail SMTP)
@@ -67,6 +67,7 @@ urlpatterns = [
     # NEW: tasks and notifications routes
     path('api/tasks/', include('tasks.urls')),
     path('api/notifications/', include('notifications.urls')),
+    path('', include('whiteboard.urls')),  # mounts /api/whiteboard/
 
     path('', include(router.urls)),  # keep the router root for browsable api if desired
 ]
@@ -7,6 +7,7 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 """
 
+import atexit
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -14,3 +15,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'workos.settings')
 
 application = get_wsgi_application()
+
+from whiteboard.engine import engine  # noqa: E402
+
+# Write boards cached by REST requests back to their canvases at exit
+atexit.register(engine.compact_all)